@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# SED benchmark suite — synthetic PK/WM + org-chart data and timings of the real code paths
+# Run: python SED_bench.py                       (SQLite files in a temp dir, sizes 1k,100k,1m)
+#      python SED_bench.py --sizes 1k,100k --out bench.json --compare old.json
+#      python SED_bench.py --backend mysql --database sed_bench   (uses host/user from config.json)
+# No display needed: CrudFrame.refresh is timed with a hidden window when Tk can open one,
+# otherwise its data path (change head + first page + row mapping) is timed headless.
+
+import os, sys, json, time, random, argparse, platform, statistics, subprocess, tempfile, shutil
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import SED_monolith_v2 as sed
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+INSERT_BATCH = 10_000
+PDF_MAX_ROWS = 100_000     # larger PDF reports take minutes; skipped unless --pdf-max-rows is raised
+LIST_MAX_ROWS = 1_000_000  # full-table list benchmarks above this are skipped
+
+# Distributions: Malay/Chinese/Indian given names with bin/binti patronymics, Zipf-like unit sizes
+_MALE = ["Ahmad", "Muhammad", "Mohd", "Ali", "Hassan", "Ismail", "Azman", "Faizal", "Hafiz", "Rizal", "Zulkifli", "Ibrahim",
+         "Kamal", "Nazri", "Syafiq", "Amir", "Roslan", "Shahrul", "Wei Ming", "Chee Keong", "Kumar", "Rajesh", "Suresh", "Jason"]
+_FEMALE = ["Nur", "Siti", "Aisyah", "Farah", "Nurul", "Aminah", "Zarina", "Hidayah", "Syazwani", "Liyana", "Mei Ling",
+           "Hui Min", "Priya", "Kavitha", "Sarah", "Nadia"]
+_FATHER = ["Abdullah", "Ahmad", "Ismail", "Hassan", "Osman", "Yusof", "Razak", "Salleh", "Hamid", "Omar", "Rahman", "Sulaiman"]
+_SURNAME = ["Tan", "Lim", "Lee", "Wong", "Ng", "Raj", "Pillai", "Singh"]
+_PANGKAT = ["Konstabel", "Lans Koperal", "Koperal", "Sarjan", "Sarjan Mejar", "Inspektor", "ASP", "DSP", "Supt", "ACP"]
+_PANGKAT_W = [30, 18, 15, 12, 6, 8, 5, 3, 2, 1]
+_STATES = ["Kelantan", "Terengganu", "Pahang", "Kedah", "Perak", "Selangor", "Johor", "Sabah", "Sarawak", "Melaka"]
+_UNITS = [f"{kind} {state}" for state in _STATES for kind in ("IPK", "IPD", "Cawangan Trafik", "Cawangan Siasatan")]
+_UNIT_W = [1.0 / (i + 1) for i in range(len(_UNITS))]
+_JAWATAN = ["Ketua Polis", "Timbalan Ketua", "Ketua Bahagian", "Ketua Unit", "Penyelia", "Pegawai Penyiasat", "Anggota"]
+
+def _name(rng):
+    if rng.random() < 0.12:
+        return f"{rng.choice(_SURNAME)} {rng.choice(_MALE[18:] + _FEMALE[10:])}"
+    if rng.random() < 0.55:
+        return f"{rng.choice(_MALE[:18])} {rng.choice(_MALE[:18])} bin {rng.choice(_FATHER)}"
+    return f"{rng.choice(_FEMALE[:10])} {rng.choice(_FEMALE[:10])} binti {rng.choice(_FATHER)}"
+
+def _no_kp(i, rng):
+    born = date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 45))
+    return f"{born:%y%m%d}-{rng.randint(1, 16):02d}-{i % 10000:04d}{i // 10000:03d}"   # i keeps it unique
+
+def profil_rows(n, seed):
+    rng = random.Random(seed); start = date(1990, 1, 1)
+    for i in range(n):
+        yield (_name(rng), _no_kp(i, rng), rng.choices(_PANGKAT, _PANGKAT_W)[0], rng.choices(_UNITS, _UNIT_W)[0],
+               f"01{rng.randint(0, 9)}-{rng.randint(1000000, 9999999)}", f"No. {rng.randint(1, 300)}, Jalan {rng.choice(_FATHER)} {rng.randint(1, 40)}",
+               start + timedelta(days=rng.randrange(35 * 365)), "tidak_aktif" if rng.random() < 0.06 else "aktif")
+
+def carta_rows(n, seed, fanout=6):
+    # Heap-shaped supervisor tree (depth ~log6 n) with jitter; units follow the subtree of the 2nd level
+    rng = random.Random(seed + 1); units = {}
+    for i in range(1, n + 1):
+        sup = None if i == 1 else max(1, (i - 2) // fanout + 1 - rng.randint(0, 1))
+        unit = "Ibu Pejabat" if i == 1 else (units[sup] if sup != 1 else rng.choice(_UNITS))
+        units[i] = unit; depth = 0 if sup is None else min(len(_JAWATAN) - 1, (i - 1).bit_length() // 3)
+        yield (i, _name(rng), _JAWATAN[depth], unit, sup, f"09-{rng.randint(1000000, 9999999)}", None)
+
+def _insert(conn, sql, rows, total, label):
+    cur = conn.cursor(); batch = []; done = 0; t0 = time.perf_counter()
+    def flush():
+        nonlocal done
+        sed._begin(conn); cur.executemany(sql, batch); conn.commit(); done += len(batch); batch.clear()
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= INSERT_BATCH: flush()
+    if batch: flush()
+    print(f"  generated {done:,} {label} rows in {time.perf_counter() - t0:.1f}s", flush=True)
+
+def generate(conn, n, seed):
+    cur = conn.cursor()
+    for t in ("change_log", "carta_organisasi", "profil_pk_wm"): cur.execute(f"DELETE FROM {t}")
+    conn.commit()
+    _insert(conn, "INSERT INTO profil_pk_wm (nama,no_kp,pangkat,unit,telefon,alamat,tarikh_masuk,status) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+            profil_rows(n, seed), n, "profil_pk_wm")
+    _insert(conn, "INSERT INTO carta_organisasi (id,nama,jawatan,unit,supervisor_id,telefon,email) VALUES (%s,%s,%s,%s,%s,%s,%s)",
+            carta_rows(n, seed), n, "carta_organisasi")
+    sed.dashboard_rebuild(conn)   # rows were bulk-inserted past the incremental counters
+
+def _count(conn, table):
+    cur = conn.cursor(); cur.execute(f"SELECT COUNT(*) FROM {table}"); return cur.fetchall()[0][0]
+
+class _Prefetched:
+    # Cursor stand-in holding rows already fetched, so rows_to_dicts/result_set are timed without the DB read
+    def __init__(self, description, rows): self.description = description; self._rows = rows
+    def fetchall(self): return self._rows
+
+def timed(fn, repeats, cold=True):
+    # cold: every repeat starts from an empty RESULT_CACHE
+    times = []; result = None
+    for _ in range(repeats):
+        if cold: sed.RESULT_CACHE.clear()
+        t0 = time.perf_counter(); result = fn(); times.append(time.perf_counter() - t0)
+    return {"min_s": min(times), "median_s": statistics.median(times), "mean_s": statistics.fmean(times), "repeats": repeats}, result
+
+def _rows_of(result):
+    if isinstance(result, dict): return len(result.get("rows", ()))
+    if isinstance(result, (list, tuple, sed.ResultSet)): return len(result)
+    return result if isinstance(result, int) else None
+
+def _crud_refresh(repeats):
+    fields = sed.MODULE_SPECS["profil"]["fields"]; api = sed.api_profil()
+    try:
+        root = sed.ctk.CTk(); root.withdraw()
+    except Exception:
+        def headless():
+            head = api["changes"]()["next_cursor"]; page = api["page"](with_total=True)
+            return head, [[r.get(f["name"], "") for f in fields] for r in page["rows"]]
+        stats, (_, values) = timed(headless, repeats)
+        return dict(stats, rows=len(values), mode="headless")
+    try:
+        frame = sed.CrudFrame(root, api=api, fields=fields, title="bench")
+        def refresh():
+            frame.refresh()
+            while frame._loading: root.update(); time.sleep(0.0005)
+            root.update_idletasks(); return len(frame.view.rows)
+        stats, n = timed(refresh, repeats)
+        return dict(stats, rows=n, mode="tk")
+    finally:
+        root.destroy()
+
+def run_size(label, n, args, workdir):
+    if args.backend == "sqlite":
+        sed.DB_CONFIG.update(backend="sqlite", path=str(workdir / f"bench_{label}.db"))
+    sed.reset_pool(); sed.RESULT_CACHE.clear()
+    if not sed.ensure_schema(): raise SystemExit("Could not connect to the benchmark database")
+    conn = sed.get_db_connection()
+    try:
+        if args.regenerate or _count(conn, "profil_pk_wm") != n or _count(conn, "carta_organisasi") != n:
+            generate(conn, n, args.seed)
+        cur = conn.cursor(); cur.execute("SELECT unit FROM profil_pk_wm GROUP BY unit ORDER BY COUNT(*) DESC LIMIT 1")
+        top_unit = cur.fetchall()[0][0]
+    finally:
+        conn.close()
+    reps = 1 if n >= 1_000_000 else args.repeats
+    out = {"rows": n, "benchmarks": {}}
+    def bench(name, fn, repeats=reps, skip=None, cold=True):
+        if skip:
+            out["benchmarks"][name] = {"skipped": skip}; print(f"  {name:<32} skipped ({skip})"); return
+        stats, result = timed(fn, repeats, cold); stats["rows"] = _rows_of(result)
+        out["benchmarks"][name] = stats
+        print(f"  {name:<32} {stats['median_s'] * 1000:10.1f} ms  ({stats['rows']} rows)", flush=True)
+
+    w = sed._with_conn
+    big = n > LIST_MAX_ROWS and "table larger than LIST_MAX_ROWS"
+    bench("profil_list", lambda: w(sed.profil_list), skip=big)
+    bench("profil_search_by_name", lambda: w(sed.profil_search_by_name, "bin Ahmad"), skip=big)
+    bench("profil_page(first)", lambda: w(sed.profil_page, limit=sed.PAGE_SIZE, with_total=True))
+    bench("profil_page(order nama)", lambda: w(sed.profil_page, limit=sed.PAGE_SIZE, order="nama", desc=False))
+    bench("records_page(unit, order tarikh_masuk)", lambda: sed.list_profil_records_page(unit=top_unit, order="tarikh_masuk"))
+    bench("profil_search(fulltext)", lambda: w(sed.profil_search, "Ahmad Ismail"))
+    bench("list_profil_records(unit)", lambda: sed.list_profil_records(unit=top_unit), skip=big)
+    bench("dashboard_summary", lambda: w(sed.dashboard_summary))
+    bench("dashboard_rebuild", lambda: w(sed.dashboard_rebuild), skip=big)
+    bench("dedupe_scan", lambda: w(sed.dedupe_scan)["compared"], skip=big)
+    bench("list_profil_records(name)", lambda: sed.list_profil_records(name="Siti"), skip=big)
+    bench("records_page(unit+name+status)", lambda: sed.list_profil_records_page(unit=top_unit, name="Ahmad", status="aktif"))
+    bench("records_page(masuk range)", lambda: sed.list_profil_records_page(masuk_from="2010-01-01", masuk_to="2014-12-31"))
+    bench("list_profil_records(status)", lambda: sed.list_profil_records(status="tidak_aktif"))
+    bench("list_profil_records()", lambda: sed.list_profil_records(), skip=big)
+    bench("list_profil_records_page(unit)", lambda: sed.list_profil_records_page(unit=top_unit))
+    sed.RESULT_CACHE.clear(); sed.list_profil_records(status="tidak_aktif")
+    bench("list_profil_records(cached)", lambda: sed.list_profil_records(status="tidak_aktif"), repeats=args.repeats, cold=False)
+
+    conn = sed.get_db_connection()
+    try:
+        cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm LIMIT %s", (min(n, 100_000),))
+        desc, rows = cur.description, cur.fetchall()
+    finally:
+        conn.close()
+    bench("rows_to_dicts", lambda: sed.rows_to_dicts(_Prefetched(desc, rows)), repeats=args.repeats)
+    bench("result_set", lambda: sed.result_set(_Prefetched(desc, rows)), repeats=args.repeats)
+    bench("result_set(walk .get)", lambda: [r.get("nama") for r in sed.result_set(_Prefetched(desc, rows))], repeats=args.repeats)
+    del rows
+
+    csv_path = workdir / f"bench_{label}.csv"; pdf_path = workdir / f"bench_{label}.pdf"
+    bench("export_csv", lambda: w(sed.profil_export_csv, str(csv_path)))
+    bench("export_csv(gzip)", lambda: w(sed.profil_export_csv, str(csv_path) + ".gz"))
+    no_pdf = (sed._reportlab() is None and "reportlab not installed") or (n > args.pdf_max_rows and f"> --pdf-max-rows {args.pdf_max_rows}")
+    bench("export_pdf", lambda: w(sed.profil_export_pdf, str(pdf_path)), repeats=1, skip=no_pdf)
+    for p in (csv_path, pdf_path, workdir / f"bench_{label}.csv.gz"):
+        if p.exists(): out.setdefault("files", {})[p.name] = p.stat().st_size; p.unlink()
+
+    bench("carta_children(root)", lambda: w(sed.carta_children, None))
+    bench("carta_subtree(2)", lambda: w(sed.carta_subtree, 2))
+    bench("carta_headcount_by_unit", lambda: w(sed.carta_headcount_by_unit))
+
+    out["benchmarks"]["CrudFrame.refresh"] = r = _crud_refresh(args.repeats)
+    print(f"  {'CrudFrame.refresh':<32} {r['median_s'] * 1000:10.1f} ms  ({r['rows']} rows, {r['mode']})", flush=True)
+    out["pool"] = sed.pool_stats(); out["cache"] = sed.cache_stats()
+    return out
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=sed.BASE_DIR, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(new, old_path):
+    with open(old_path, "r", encoding="utf-8") as f: old = json.load(f)
+    print(f"\nvs {old_path} ({old.get('commit')}):")
+    for label, res in new["results"].items():
+        prev = old.get("results", {}).get(label, {}).get("benchmarks", {})
+        for name, b in res["benchmarks"].items():
+            p = prev.get(name)
+            if "median_s" not in b or not p or "median_s" not in p: continue
+            ratio = b["median_s"] / p["median_s"] if p["median_s"] else float("inf")
+            flag = "  REGRESSION" if ratio > 1.2 else ("  faster" if ratio < 0.8 else "")
+            print(f"  {label:>5} {name:<32} {p['median_s'] * 1000:9.1f} -> {b['median_s'] * 1000:9.1f} ms  x{ratio:.2f}{flag}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="SED benchmark suite")
+    ap.add_argument("--sizes", default="1k,100k,1m", help=f"comma-separated row counts ({', '.join(SIZES)} or integers)")
+    ap.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    ap.add_argument("--database", default="sed_bench", help="MySQL database for --backend mysql (never the app database)")
+    ap.add_argument("--data-dir", help="keep generated SQLite files here and reuse them between runs")
+    ap.add_argument("--regenerate", action="store_true", help="rebuild the data even when the row counts already match")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1829)
+    ap.add_argument("--pdf-max-rows", type=int, default=PDF_MAX_ROWS)
+    ap.add_argument("--out", help="results JSON (default: bench_results/bench_<commit>_<time>.json)")
+    ap.add_argument("--compare", help="earlier results JSON to compare against")
+    args = ap.parse_args(argv)
+
+    sizes = [(s.strip().lower(), SIZES.get(s.strip().lower()) or int(s)) for s in args.sizes.split(",") if s.strip()]
+    if args.backend == "mysql":
+        if args.database == sed.load_config()["database"]: raise SystemExit("Refusing to generate benchmark data in the application database")
+        sed.DB_CONFIG.update(backend="mysql", database=args.database)
+    workdir = Path(args.data_dir) if args.data_dir else Path(tempfile.mkdtemp(prefix="sed_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    commit = _git_commit()
+    report = {"commit": commit, "started": datetime.now().isoformat(timespec="seconds"), "backend": args.backend, "seed": args.seed,
+              "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(), "results": {}}
+    try:
+        for label, n in sizes:
+            print(f"[{label}] {n:,} rows ({args.backend})", flush=True)
+            report["results"][label] = run_size(label, n, args, workdir)
+    finally:
+        sed.reset_pool()
+        if not args.data_dir: shutil.rmtree(workdir, ignore_errors=True)
+    out = Path(args.out) if args.out else sed.BASE_DIR / "bench_results" / f"bench_{commit or 'nogit'}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, default=str)
+    print(f"\nResults: {out}")
+    if args.compare: compare(report, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 # SED Monolith v2 — single-file app (backend + frontend)
-# Dependencies: customtkinter, mysql-connector-python, (optional) reportlab
+# Dependencies: customtkinter, mysql-connector-python, (optional) reportlab + pypdf (PDF export; pypdf joins the parallel parts), openpyxl (XLSX import)
+# Storage: MySQL by default, or an embedded SQLite file (config.json: {"db": {"backend": "sqlite", "path": "sed.db"}})
 # Run: python SED_monolith_v2.py
 
-import os, sys, json, csv, hashlib, logging
+import os, sys, re, json, csv, gzip, hashlib, logging, threading, time, atexit, base64, tempfile, itertools, secrets
+STARTUP_T0 = time.perf_counter()
+from types import SimpleNamespace
+from collections import deque, OrderedDict
+from collections.abc import Mapping, Sequence
+from difflib import SequenceMatcher
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import queue, multiprocessing, sqlite3, zipfile, shutil
 from logging.handlers import RotatingFileHandler
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import messagebox, filedialog
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
@@ -23,12 +33,16 @@ try:
 except Exception as e:
     raise RuntimeError("mysql-connector-python required. Install: pip install mysql-connector-python") from e
 
-# reportlab is optional (for PDF export)
-try:
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.pdfgen import canvas as pdf_canvas
-except Exception:
-    pdf_canvas = None
+# reportlab is optional (for PDF export) and slow to import, so it is loaded on first use
+@lru_cache(maxsize=None)
+def _reportlab():
+    try:
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.pdfgen import canvas
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+    except Exception:
+        return None
+    return SimpleNamespace(A4=A4, landscape=landscape, canvas=canvas, stringWidth=stringWidth)
 
 # ---------------- Paths & constants ----------------
 BASE_DIR = Path(os.path.abspath(os.path.dirname(__file__)))
@@ -43,9 +57,94 @@ DEFAULT_DB = {
     "user": "root",
     "password": "",
     "database": "sed_db",
-    "autocommit": True
+    "autocommit": True,
+    "backend": "mysql",    # "mysql" or "sqlite"
+    "path": "sed.db"       # SQLite database file (relative to the app directory)
 }
 
+# Embedded SQLite backend: WAL lets readers run alongside the single writer
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",    # durable at checkpoints; safe against corruption in WAL mode
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-32000",     # KiB
+)
+SQLITE_STATEMENT_CACHE = 256        # compiled statements kept per connection
+SQLITE_BUSY_TIMEOUT = 10.0          # seconds a writer waits for the write lock
+
+# Connection pool (config.json: {"pool": {"size": 5, "timeout": 10, "ping_interval": 30}})
+DEFAULT_POOL = {
+    "size": 5,             # max open connections per process
+    "timeout": 10.0,       # seconds to wait for a free connection
+    "ping_interval": 30.0  # idle seconds before a connection is pinged on checkout
+}
+
+# Read-through cache for list/search APIs (config.json: {"cache": {"ttl": 30, "max_entries": 256}}; ttl 0 disables)
+DEFAULT_CACHE = {
+    "ttl": 30.0,
+    "max_entries": 256
+}
+
+# Headless data service (config.json: {"service": {"url": "http://host:8765", "host": "127.0.0.1", "port": 8765, "token": ""}})
+# Clients with a "url" go through the service; --serve listens on host:port.
+DEFAULT_SERVICE = {
+    "url": "",             # empty -> this client talks to MySQL directly
+    "host": "127.0.0.1",   # --serve bind address (localhost only unless changed)
+    "port": 8765,
+    "token": "",           # shared secret sent as "Authorization: Bearer <token>"; empty disables
+    "timeout": 60.0        # client socket timeout (s)
+}
+SERVICE_MAX_BODY = 8 * 1024 * 1024
+SERVICE_SESSION_TTL = 12 * 3600   # s; an auth.login session token is valid this long
+
+# Instrumentation (config.json: {"metrics": {"slow_ms": 500, "dump_interval": 0, "dump_path": "logs/metrics.prom"}})
+DEFAULT_METRICS = {
+    "slow_ms": 500.0,        # API calls slower than this go to the slow-query log (SED.slow)
+    "dump_interval": 0.0,    # seconds between Prometheus dumps to dump_path; 0 = only on demand / at exit
+    "dump_path": "",         # relative to the app directory; empty disables file dumps
+    "window": 2048           # latest samples per API used for p50/p95/p99
+}
+
+# Local replica of carta/profil for stations on a slow or flaky link
+# (config.json: {"replica": {"enabled": true, "path": "sed_replica.db", "interval": 15}})
+DEFAULT_REPLICA = {
+    "enabled": False,
+    "path": "sed_replica.db",   # embedded SQLite file (relative to the app directory)
+    "interval": 15.0,           # seconds between background delta syncs
+    "batch": 2000,              # rows per pull from the server
+    "overlap": 30.0             # seconds re-read behind the sync cursor (transactions that committed late)
+}
+REPLICA_MAX_BACKOFF = 300.0     # longest wait between sync attempts while the server is unreachable
+
+PAGE_SIZE = 200        # rows per page for list screens
+MAX_PAGE_SIZE = 5000
+SEARCH_DEBOUNCE_MS = 300  # type-ahead delay before the search query is sent
+FT_MIN_TOKEN = 3          # InnoDB innodb_ft_min_token_size default
+EXPORT_CHUNK = 5000        # rows per fetchmany() when streaming exports
+CHANGE_POLL_MS = 5000      # how often open grids pick up other users' edits
+VIRTUAL_PREFETCH = 100     # rows past the visible window a grid keeps loaded ahead of scrolling
+CHANGE_BATCH = 2000        # more changes than this since a cursor -> client reloads instead
+CHANGE_LOG_RETENTION_DAYS = 30
+CARTA_MAX_DEPTH = 64       # bound for hierarchy walks (also stops runaway recursion on bad data)
+CARTA_CHILD_PAGE = 500     # children loaded per expand in the org-chart tree
+IMPORT_BATCH = 1000                     # rows per executemany()/commit in bulk import
+BULK_CHUNK = 500                        # ids per "WHERE id IN (...)" statement in bulk edit/delete
+PREPARED_CACHE = 128       # server-side prepared statements kept per connection (LRU)
+IMPORT_LOAD_DATA_BYTES = 20 * 1024 * 1024  # "auto" import uses LOAD DATA LOCAL INFILE above this file size
+IMPORT_STAGE_DIR = Path(tempfile.gettempdir()) / "sed_import"   # the only directory LOAD DATA LOCAL may read
+DEDUPE_MIN_SCORE = 0.88    # profil pairs scoring at least this go to the merge queue
+DEDUPE_BLOCK_MAX = 200     # larger blocks (very common name + birth date) are not expanded into pairs
+
+# PDF report engine
+PDF_SAMPLE_ROWS = 200      # rows measured to size columns
+PDF_MAX_COL_W = 220.0      # pt; wider values are truncated with "..."
+PDF_MIN_FONT = 5.5
+PDF_ROWS_PER_PART = 2500   # rows rendered per worker process
+PDF_PARALLEL_MIN = 5000    # below this, render in-process
+PDF_MAX_WORKERS = 4
+REPORT_PACK_WORKERS = 3   # module exports run concurrently in a report pack (each holds a pooled connection)
+
 # ---------------- Logging ----------------
 def get_logger(name="SED"):
     logger = logging.getLogger(name)
@@ -60,34 +159,508 @@ def get_logger(name="SED"):
 log = get_logger("SED")
 
 # ---------------- DB helpers ----------------
-def load_config() -> Dict[str, Any]:
+def _load_section(name: str, defaults: Dict[str, Any], **coerce) -> Dict[str, Any]:
+    # config.json section `name` over `defaults`; coerce[key] converts/clamps each value. A bad value
+    # anywhere in the section keeps the whole section at its defaults.
+    out = dict(defaults)
     if CONFIG_PATH.exists():
         try:
             with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-            db = cfg.get("db", {})
-            return {
-                "host": db.get("host", DEFAULT_DB["host"]),
-                "port": int(db.get("port", DEFAULT_DB["port"])),
-                "user": db.get("user", DEFAULT_DB["user"]),
-                "password": db.get("password", DEFAULT_DB["password"]),
-                "database": db.get("database", DEFAULT_DB["database"]),
-                "autocommit": True
-            }
+                c = json.load(f).get(name, {})
+            out.update({k: fn(c.get(k, out[k])) for k, fn in coerce.items()})
         except Exception as e:
-            log.exception("Failed reading config.json; using defaults: %s", e)
-    return dict(DEFAULT_DB)
+            log.exception("Failed reading %s config; using defaults: %s", name, e)
+    return out
+
+def load_config() -> Dict[str, Any]:
+    keep = lambda v: v
+    return _load_section("db", DEFAULT_DB, host=keep, port=int, user=keep, password=keep, database=keep,
+                         backend=lambda v: str(v).lower(), path=keep)
+
+def load_pool_config() -> Dict[str, Any]:
+    return _load_section("pool", DEFAULT_POOL, size=lambda v: max(1, int(v)), timeout=float, ping_interval=float)
+
+def load_cache_config() -> Dict[str, Any]:
+    return _load_section("cache", DEFAULT_CACHE, ttl=lambda v: max(0.0, float(v)), max_entries=lambda v: max(1, int(v)))
+
+def load_service_config() -> Dict[str, Any]:
+    return _load_section("service", DEFAULT_SERVICE, url=lambda v: str(v or "").rstrip("/"), host=str, port=int,
+                         token=lambda v: str(v or ""), timeout=lambda v: max(1.0, float(v)))
+
+def load_metrics_config() -> Dict[str, Any]:
+    return _load_section("metrics", DEFAULT_METRICS, slow_ms=lambda v: max(0.0, float(v)), dump_interval=lambda v: max(0.0, float(v)),
+                         dump_path=lambda v: str(v or ""), window=lambda v: max(16, int(v)))
+
+def load_replica_config() -> Dict[str, Any]:
+    return _load_section("replica", DEFAULT_REPLICA, enabled=bool, path=lambda v: str(v or DEFAULT_REPLICA["path"]),
+                         interval=lambda v: max(1.0, float(v)), batch=lambda v: max(100, int(v)), overlap=lambda v: max(0.0, float(v)))
 
 DB_CONFIG = load_config()
+POOL_CONFIG = load_pool_config()
+CACHE_CONFIG = load_cache_config()
+SERVICE_CONFIG = load_service_config()
+METRICS_CONFIG = load_metrics_config()
+REPLICA_CONFIG = load_replica_config()
+
+# ---------------- Storage backends ----------------
+# The data layer writes MySQL-flavoured SQL with %s placeholders. Whatever differs between
+# backends (DDL, introspection, upserts, locks, plans) goes through dialect_of(conn).
+class MySQLDialect:
+    name = "mysql"
+    fulltext = True              # MATCH ... AGAINST search indexes
+    alter_foreign_keys = True    # ALTER TABLE ... ADD CONSTRAINT
+    load_data = True             # LOAD DATA LOCAL INFILE bulk import
+    locking_reads = True         # SELECT ... FOR UPDATE inside a write transaction
+    insert_ignore = "INSERT IGNORE"
+
+    def ddl(self, sql: str) -> List[str]:
+        return [sql]
+
+    def index_name(self, table: str, name: str) -> str:
+        return name
+
+    def index_exists(self, conn, table, name) -> bool:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s",
+                    (table, name))
+        return cur.fetchall()[0][0] > 0
+
+    def column_exists(self, conn, table, column) -> bool:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s",
+                    (table, column))
+        return cur.fetchall()[0][0] > 0
+
+    def fk_exists(self, conn, table, name) -> bool:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM information_schema.TABLE_CONSTRAINTS WHERE CONSTRAINT_SCHEMA=DATABASE() "
+                    "AND TABLE_NAME=%s AND CONSTRAINT_NAME=%s AND CONSTRAINT_TYPE='FOREIGN KEY'", (table, name))
+        return cur.fetchall()[0][0] > 0
+
+    def add_column(self, conn, table, column, ddl):
+        cur = conn.cursor(); cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"); conn.commit()
+
+    def add_index(self, conn, table, name, ddl):
+        cur = conn.cursor(); cur.execute(f"ALTER TABLE {table} ADD {ddl}"); conn.commit()
+
+    def upsert_sql(self, table, cols, update_cols, key, source=None) -> str:
+        upd = ",".join(f"{c}=VALUES({c})" for c in update_cols) or f"{key}={key}"
+        if source:
+            return f"INSERT INTO {table} ({','.join(cols)}) SELECT {','.join(cols)} FROM {source} ON DUPLICATE KEY UPDATE {upd}"
+        return f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(cols))}) ON DUPLICATE KEY UPDATE {upd}"
+
+    def timestamp_param(self, v):
+        return v   # TIMESTAMP(6) compares with a datetime parameter
+
+    def accumulate_sql(self, table, cols, keys, select) -> str:
+        # Insert the rows of `select`; where the key already exists, add to the last column instead
+        n = cols[-1]
+        return f"INSERT INTO {table} ({','.join(cols)}) {select} ON DUPLICATE KEY UPDATE {n}={n}+VALUES({n})"
+
+    def lock(self, cur, name, timeout) -> bool:
+        cur.execute("SELECT GET_LOCK(%s, %s)", (name, int(timeout))); return cur.fetchall()[0][0] == 1
+
+    def unlock(self, cur, name):
+        cur.execute("SELECT RELEASE_LOCK(%s)", (name,)); cur.fetchall()
+
+    def explain(self, cur, sql, params) -> List[Dict[str, Any]]:
+        # -> [{"key", "type", "rows"}] per plan step
+        cur.execute("EXPLAIN " + sql, params)
+        return [{"key": p.get("key"), "type": p.get("type"), "rows": p.get("rows")} for p in rows_to_dicts(cur)]
+
+SQLITE_NOW = "(strftime('%Y-%m-%d %H:%M:%f','now','localtime'))"   # CURRENT_TIMESTAMP(6) in local time, like MySQL
+SQLITE_NOW_S = "(datetime('now','localtime'))"
+_SQLITE_INDEX = re.compile(r"(UNIQUE\s+|FULLTEXT\s+)?(?:INDEX|KEY)\s+(\w+)\s*\(((?:[^()]|\(\d+\))*)\)", re.I)
+
+class SQLiteDialect(MySQLDialect):
+    name = "sqlite"
+    fulltext = False             # search uses the word-start LIKE path over NOCASE indexes
+    alter_foreign_keys = False
+    load_data = False
+    locking_reads = False        # _begin's BEGIN IMMEDIATE already serialises writers
+    insert_ignore = "INSERT OR IGNORE"
+
+    def _types(self, sql: str) -> str:
+        sql = re.sub(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", sql, flags=re.I)
+        sql = re.sub(r"\bENUM\([^)]*\)", "TEXT", sql, flags=re.I)
+        # MySQL's default collation is case-insensitive; NOCASE keeps that and lets LIKE 'x%' use the index
+        sql = re.sub(r"\b(VARCHAR\(\d+\)|TEXT\b)(?!\s+COLLATE)", r"\1 COLLATE NOCASE", sql, flags=re.I)
+        sql = re.sub(r"DEFAULT\s+CURRENT_TIMESTAMP\(\d\)", "DEFAULT " + SQLITE_NOW, sql, flags=re.I)
+        sql = re.sub(r"DEFAULT\s+CURRENT_TIMESTAMP\b", "DEFAULT " + SQLITE_NOW_S, sql, flags=re.I)
+        return re.sub(r"\s+UNSIGNED\b", "", sql, flags=re.I)
+
+    def _touch_trigger(self, table, column, now=SQLITE_NOW) -> str:
+        # Stands in for ON UPDATE CURRENT_TIMESTAMP (recursive_triggers is off, so this does not re-fire)
+        return (f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_touch AFTER UPDATE ON {table} FOR EACH ROW "
+                f"WHEN NEW.{column} IS OLD.{column} BEGIN UPDATE {table} SET {column}={now} WHERE id=NEW.id; END")
+
+    def _index_cols(self, cols: str) -> str:
+        return re.sub(r"\(\d+\)", "", cols)   # no prefix indexes in SQLite
+
+    def ddl(self, sql: str) -> List[str]:
+        # CREATE TABLE in MySQL syntax -> SQLite statements (inline indexes become CREATE INDEX)
+        s = sql.strip().rstrip(";").strip()
+        m = re.match(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", s, re.I)
+        if not m: return [self._types(s)]
+        table = m.group(1); after = []
+        s = re.sub(r"\)\s*ENGINE\s*=.*$", ")", s, flags=re.S | re.I)
+        def inline_index(mi):
+            kind = (mi.group(1) or "").strip().upper()
+            if kind != "FULLTEXT":
+                after.append(f"CREATE {'UNIQUE ' if kind else ''}INDEX IF NOT EXISTS {self.index_name(table, mi.group(2))} "
+                             f"ON {table} ({self._index_cols(mi.group(3))})")
+            return ""
+        s = re.sub(r",\s*" + _SQLITE_INDEX.pattern, inline_index, s, flags=re.I)
+        for col in re.findall(r"(\w+)\s+TIMESTAMP[^,]*ON\s+UPDATE\s+CURRENT_TIMESTAMP", s, flags=re.I):
+            after.append(self._touch_trigger(table, col))
+        s = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP(?:\(\d\))?", "", s, flags=re.I)
+        return [self._types(s)] + after
+
+    def index_name(self, table: str, name: str) -> str:
+        return f"{table}__{name}"    # index names are per-database in SQLite, per-table in MySQL
+
+    def index_exists(self, conn, table, name) -> bool:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='index' AND tbl_name=%s AND name=%s", (table, self.index_name(table, name)))
+        return cur.fetchall()[0][0] > 0
+
+    def column_exists(self, conn, table, column) -> bool:
+        cur = conn.cursor(); cur.execute("SELECT COUNT(*) FROM pragma_table_info(%s) WHERE name=%s", (table, column))
+        return cur.fetchall()[0][0] > 0
+
+    def fk_exists(self, conn, table, name) -> bool:
+        return False   # SQLite keeps no constraint names
+
+    def add_column(self, conn, table, column, ddl):
+        touch = re.search(r"ON\s+UPDATE\s+CURRENT_TIMESTAMP", ddl, re.I)
+        d = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP(?:\(\d\))?", "", ddl, flags=re.I)
+        now = SQLITE_NOW if re.search(r"CURRENT_TIMESTAMP\(\d\)", d, re.I) else SQLITE_NOW_S
+        dynamic = re.search(r"DEFAULT\s+CURRENT_TIMESTAMP", d, re.I)
+        if dynamic:
+            # ADD COLUMN only takes constant defaults: backfill, and default new rows by trigger
+            d = re.sub(r"\s+(NOT\s+NULL|DEFAULT\s+CURRENT_TIMESTAMP(?:\(\d\))?)", "", d, flags=re.I)
+        cur = conn.cursor(); cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {self._types(d)}")
+        if dynamic:
+            cur.execute(f"UPDATE {table} SET {column}={now}")
+            cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_default AFTER INSERT ON {table} FOR EACH ROW "
+                        f"WHEN NEW.{column} IS NULL BEGIN UPDATE {table} SET {column}={now} WHERE id=NEW.id; END")
+        if touch: cur.execute(self._touch_trigger(table, column, now))
+        conn.commit()
+
+    def add_index(self, conn, table, name, ddl):
+        m = _SQLITE_INDEX.fullmatch(ddl.strip())
+        if not m: raise ValueError(f"Unsupported index DDL for SQLite: {ddl}")
+        kind = (m.group(1) or "").strip().upper()
+        if kind == "FULLTEXT":
+            log.info("SQLite: FULLTEXT index %s skipped (prefix search is used instead)", name); return
+        cur = conn.cursor()
+        cur.execute(f"CREATE {'UNIQUE ' if kind else ''}INDEX IF NOT EXISTS {self.index_name(table, name)} ON {table} ({self._index_cols(m.group(3))})")
+        conn.commit()
+
+    def upsert_sql(self, table, cols, update_cols, key, source=None) -> str:
+        upd = ("DO UPDATE SET " + ",".join(f"{c}=excluded.{c}" for c in update_cols)) if update_cols else "DO NOTHING"
+        if source:
+            return f"INSERT INTO {table} ({','.join(cols)}) SELECT {','.join(cols)} FROM {source} WHERE true ON CONFLICT({key}) {upd}"
+        return f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(cols))}) ON CONFLICT({key}) {upd}"
+
+    def accumulate_sql(self, table, cols, keys, select) -> str:
+        n = cols[-1]
+        return f"INSERT INTO {table} ({','.join(cols)}) {select} ON CONFLICT({','.join(keys)}) DO UPDATE SET {n}={n}+excluded.{n}"
+
+    def timestamp_param(self, v):
+        # Timestamps are stored as SQLITE_NOW text (milliseconds) and compared as strings
+        return v.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] if isinstance(v, datetime) else v
+
+    def lock(self, cur, name, timeout) -> bool:
+        return True    # one file; concurrent writers already serialise on the database lock
+
+    def unlock(self, cur, name):
+        pass
+
+    def explain(self, cur, sql, params) -> List[Dict[str, Any]]:
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params); out = []
+        for row in cur.fetchall():
+            detail = row[-1]; m = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+            key = m.group(1) if m else ("PRIMARY" if "PRIMARY KEY" in detail else None)
+            if key and key.startswith("sqlite_autoindex_"):
+                # Unnamed UNIQUE column index: report it by column, as MySQL does
+                cur.execute("SELECT name FROM pragma_index_info(%s)", (key,)); cols = [r[0] for r in cur.fetchall()]
+                key = cols[0] if len(cols) == 1 else key
+            elif key and "__" in key:
+                key = key.split("__", 1)[1]
+            out.append({"key": key, "type": detail.split(" ", 1)[0], "rows": None})
+        return out
+
+MYSQL = MySQLDialect()
+SQLITE = SQLiteDialect()
+DB_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+def dialect_of(conn):
+    return getattr(conn, "dialect", None) or MYSQL
+
+@lru_cache(maxsize=1024)
+def _qmark(sql: str) -> str:
+    # %s (and %% escapes) -> sqlite3 qmark style; cached so each statement is rewritten once
+    return re.sub(r"%([s%])", lambda m: "?" if m.group(1) == "s" else "%", sql)
+
+def _sqlite_ts(b: bytes):
+    try: return datetime.fromisoformat(b.decode())
+    except ValueError: return b.decode()
+
+def _sqlite_date(b: bytes):
+    try: return date.fromisoformat(b.decode()[:10])
+    except ValueError: return b.decode()
+
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+sqlite3.register_adapter(Decimal, str)   # DECIMAL columns have NUMERIC affinity
+sqlite3.register_converter("TIMESTAMP", _sqlite_ts)
+sqlite3.register_converter("DATETIME", _sqlite_ts)
+sqlite3.register_converter("DATE", _sqlite_date)
+
+class SQLiteCursor:
+    # mysql.connector cursor surface used by the data layer
+    def __init__(self, cur, dictionary=False):
+        self._cur = cur; self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cur.execute(_qmark(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(_qmark(sql), seq)
+
+    @property
+    def description(self): return self._cur.description
+    @property
+    def rowcount(self): return self._cur.rowcount
+    @property
+    def lastrowid(self): return self._cur.lastrowid
+
+    def _wrap(self, rows):
+        if not self._dictionary: return rows
+        cols = [d[0] for d in self._cur.description]
+        return [dict(zip(cols, r)) for r in rows]
+
+    def fetchone(self):
+        r = self._cur.fetchone()
+        return None if r is None else self._wrap([r])[0]
+
+    def fetchall(self): return self._wrap(self._cur.fetchall())
+    def fetchmany(self, size=1): return self._wrap(self._cur.fetchmany(size))
+    def close(self): self._cur.close()
+    def __iter__(self): return iter(self.fetchall())
+
+class SQLiteConnection:
+    """Embedded SQLite database behind the mysql.connector connection interface.
+
+    Runs in autocommit mode like the MySQL connections; _begin() opens an IMMEDIATE
+    transaction so a write never fails half-way on a lock upgrade. Statements are
+    prepared once per connection and reused through sqlite3's statement cache.
+    """
+    dialect = SQLITE
+
+    def __init__(self, path):
+        path = Path(path)
+        if not path.is_absolute(): path = BASE_DIR / path
+        self.path = path
+        self._db = sqlite3.connect(str(path), timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=SQLITE_STATEMENT_CACHE)
+        for pragma in SQLITE_PRAGMAS: self._db.execute(pragma)
+
+    def cursor(self, dictionary=False, **_ignored):   # buffered/prepared: always both in sqlite3
+        return SQLiteCursor(self._db.cursor(), dictionary)
+
+    @property
+    def in_transaction(self): return self._db.in_transaction
+
+    def start_transaction(self): self._db.execute("BEGIN IMMEDIATE")
+    def commit(self): self._db.commit()
+    def rollback(self): self._db.rollback()
+    def ping(self, reconnect=False, **_ignored): self._db.execute("SELECT 1").fetchall()
+    def is_connected(self): return True
+    def close(self): self._db.close()
+
+def _mysql_args(cfg) -> Dict[str, Any]:
+    return {k: v for k, v in cfg.items() if k not in ("backend", "path")}
+
+def connect_db(cfg=None, **extra):
+    """Open a raw connection for `cfg` (default DB_CONFIG) on its configured backend."""
+    cfg = DB_CONFIG if cfg is None else cfg
+    if cfg.get("backend") == "sqlite":
+        return SQLiteConnection(cfg.get("path") or DEFAULT_DB["path"])
+    # LOAD DATA LOCAL (bulk import) may only read the import stage directory
+    extra.setdefault("allow_local_infile_in_path", str(IMPORT_STAGE_DIR))
+    return mysql.connector.connect(**_mysql_args(cfg), **extra)
+
+def conn_config(conn) -> Dict[str, Any]:
+    # Settings for another connection to the same database as `conn` (e.g. from a worker process)
+    if isinstance(conn, PooledConnection): return dict(conn._pool.cfg)
+    if isinstance(conn, SQLiteConnection): return {"backend": "sqlite", "path": str(conn.path)}
+    return dict(DB_CONFIG)
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class PooledConnection:
+    # Thin proxy over a raw connection; close() hands it back to the pool.
+    def __init__(self, pool, raw):
+        self._pool = pool; self._raw = raw; self._broken = False; self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def invalidate(self):
+        # Drop instead of recycling (e.g. after a lost connection or an abandoned streaming read)
+        self._broken = True
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        self._pool._release(self._raw, self._broken)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+class ConnectionPool:
+    """Bounded LIFO pool of DB connections (MySQL or SQLite, per cfg["backend"]).
+
+    Callers block up to `timeout` seconds when every connection is checked out.
+    Connections idle for longer than `ping_interval` are pinged on checkout and
+    transparently replaced when the server has dropped them.
+    """
+    def __init__(self, cfg, size=5, timeout=10.0, ping_interval=30.0):
+        self.cfg = dict(cfg); self.size = max(1, int(size))
+        self.timeout = float(timeout); self.ping_interval = float(ping_interval)
+        self._idle = deque()   # (raw, last_used) — most recently used on the right
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {"acquired": 0, "created": 0, "waited": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                      "timeouts": 0, "pings": 0, "reconnects": 0, "discarded": 0}
+
+    def _connect(self):
+        raw = connect_db(self.cfg)
+        with self._cond: self.stats["created"] += 1
+        return raw
+
+    def _healthy(self, raw):
+        with self._cond: self.stats["pings"] += 1
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except Exception:
+            log.warning("Stale pooled connection; reconnecting")
+            with self._cond: self.stats["reconnects"] += 1
+            try: raw.close()
+            except Exception: pass
+            return self._connect()
+
+    def get(self):
+        t0 = time.perf_counter(); waited = False
+        with self._cond:
+            while True:
+                if self._closed: raise RuntimeError("Connection pool closed")
+                if self._idle:
+                    raw, last_used = self._idle.pop(); break
+                if self._open < self.size:
+                    self._open += 1; raw, last_used = None, None; break
+                remaining = self.timeout - (time.perf_counter() - t0)
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeout(f"No free DB connection after {self.timeout:.1f}s (pool size {self.size})")
+                waited = True
+                self._cond.wait(remaining)
+            wait_ms = (time.perf_counter() - t0) * 1000.0
+            self.stats["acquired"] += 1
+            if waited:
+                self.stats["waited"] += 1; self.stats["wait_ms_total"] += wait_ms
+                self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+        if waited and wait_ms > 1000:
+            log.warning("Waited %.0f ms for a DB connection (pool size %d)", wait_ms, self.size)
+        try:
+            if raw is None:
+                raw = self._connect()
+            elif time.monotonic() - last_used > self.ping_interval:
+                raw = self._healthy(raw)
+        except Exception:
+            with self._cond:
+                self._open -= 1; self._cond.notify()
+            raise
+        return PooledConnection(self, raw)
+
+    def _release(self, raw, broken=False):
+        if not broken:
+            try:
+                if getattr(raw, "unread_result", False): broken = True
+                elif raw.in_transaction: raw.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            if broken or self._closed:
+                self._open -= 1; self.stats["discarded"] += 1
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+        if broken or self._closed:
+            try: raw.close()
+            except Exception: pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]; self._idle.clear()
+            self._open -= len(idle); self._cond.notify_all()
+        for raw in idle:
+            try: raw.close()
+            except Exception: pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            snap = dict(self.stats)
+            snap.update(size=self.size, open=self._open, idle=len(self._idle), in_use=self._open - len(self._idle))
+        snap["wait_ms_avg"] = snap["wait_ms_total"] / snap["waited"] if snap["waited"] else 0.0
+        return snap
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+        return _POOL
+
+def reset_pool():
+    # Close the shared pool; the next get_db_connection() builds one from the current DB_CONFIG
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        log.info("Closing DB pool: %s", pool.snapshot())
+        pool.close()
+
+atexit.register(reset_pool)
+
+def pool_stats() -> Dict[str, Any]:
+    with _POOL_LOCK:
+        pool = _POOL
+    return pool.snapshot() if pool else {}
+
+_ACQUIRE = threading.local()   # .seconds: how long this thread's last get_db_connection() took
 
 def get_db_connection():
+    t0 = time.perf_counter()
     try:
-        return mysql.connector.connect(**DB_CONFIG)
+        return get_pool().get()
     except Exception as e:
         log.exception("DB connection error: %s", e)
         return None
+    finally:
+        _ACQUIRE.seconds = time.perf_counter() - t0
 
 def _create_database_if_missing():
+    if DB_CONFIG.get("backend") == "sqlite": return   # the file is created on first connect
     cfg = dict(DB_CONFIG)
     dbname = cfg.pop("database", None)
     try:
@@ -99,15 +672,571 @@ def _create_database_if_missing():
         try: conn.close()
         except: pass
 
+# ---------------- Metrics ----------------
+slow_log = log.getChild("slow")   # propagates to the app's RotatingFileHandler
+
+class Metrics:
+    """Per-API call counts, latency and connection-acquire quantiles, rows and approximate bytes.
+
+    Quantiles come from the latest `window` samples of each API, so they follow the
+    current behaviour rather than the whole process lifetime; the counters and sums are
+    cumulative (Prometheus counters).
+    """
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window=2048):
+        self.window = int(window); self._lock = threading.Lock(); self._apis: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, api, seconds, rows=0, nbytes=0, acquire=None, error=False, cached=False):
+        with self._lock:
+            m = self._apis.get(api)
+            if m is None:
+                m = self._apis[api] = {"calls": 0, "errors": 0, "cache_hits": 0, "rows": 0, "bytes": 0, "seconds": 0.0,
+                                       "acquire_seconds": 0.0, "acquires": 0, "lat": deque(maxlen=self.window), "acq": deque(maxlen=self.window)}
+            m["calls"] += 1; m["seconds"] += seconds; m["lat"].append(seconds); m["rows"] += rows; m["bytes"] += nbytes
+            if error: m["errors"] += 1
+            if cached: m["cache_hits"] += 1
+            if acquire is not None: m["acquires"] += 1; m["acquire_seconds"] += acquire; m["acq"].append(acquire)
+
+    @staticmethod
+    def _quantiles(samples):
+        s = sorted(samples)
+        return {q: (s[min(len(s) - 1, int(q * len(s)))] if s else 0.0) for q in Metrics.QUANTILES}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            apis = {k: dict(v, lat=list(v["lat"]), acq=list(v["acq"])) for k, v in self._apis.items()}
+        out = {}
+        for name, m in sorted(apis.items()):
+            lat = self._quantiles(m.pop("lat")); acq = self._quantiles(m.pop("acq"))
+            m.update({f"p{int(q * 100)}_ms": lat[q] * 1000 for q in self.QUANTILES})
+            m.update({f"acquire_p{int(q * 100)}_ms": acq[q] * 1000 for q in self.QUANTILES})
+            m["_lat"] = lat; m["_acq"] = acq; out[name] = m
+        return out
+
+    def reset(self):
+        with self._lock: self._apis.clear()
+
+    def prometheus(self) -> str:
+        snap = self.snapshot(); lines = []
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}"); lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+        for metric, key, help_text in (("sed_api_calls_total", "calls", "Data API calls (cache hits included)."),
+                                       ("sed_api_errors_total", "errors", "Data API calls that raised."),
+                                       ("sed_api_cache_hits_total", "cache_hits", "Data API calls served from the result cache."),
+                                       ("sed_api_rows_total", "rows", "Rows returned by data API calls."),
+                                       ("sed_api_bytes_total", "bytes", "Approximate bytes of row data returned by data API calls.")):
+            family(metric, "counter", help_text, [f'{metric}{{api="{esc(a)}"}} {m[key]}' for a, m in snap.items()])
+        for metric, qkey, sum_key, count_key, help_text in (
+                ("sed_api_latency_seconds", "_lat", "seconds", "calls", "Data API call latency."),
+                ("sed_db_acquire_seconds", "_acq", "acquire_seconds", "acquires", "Time to check a connection out of the pool.")):
+            samples = []
+            for a, m in snap.items():
+                samples += [f'{metric}{{api="{esc(a)}",quantile="{q}"}} {v:.6f}' for q, v in m[qkey].items()]
+                samples += [f'{metric}_sum{{api="{esc(a)}"}} {m[sum_key]:.6f}', f'{metric}_count{{api="{esc(a)}"}} {m[count_key]}']
+            family(metric, "summary", help_text, samples)
+        pool = pool_stats()
+        if pool:
+            family("sed_pool_connections", "gauge", "DB pool connections by state.",
+                   [f'sed_pool_connections{{state="{k}"}} {pool[k]}' for k in ("open", "idle", "in_use")] + [f'sed_pool_connections{{state="size"}} {pool["size"]}'])
+            family("sed_pool_timeouts_total", "counter", "Checkouts that gave up waiting.", [f"sed_pool_timeouts_total {pool['timeouts']}"])
+            family("sed_pool_waits_total", "counter", "Checkouts that had to wait.", [f"sed_pool_waits_total {pool['waited']}"])
+        cache = cache_stats()
+        family("sed_cache_events_total", "counter", "Result cache events.",
+               [f'sed_cache_events_total{{event="{k}"}} {cache[k]}' for k in ("hits", "misses", "evictions", "expired", "invalidations")])
+        family("sed_cache_entries", "gauge", "Entries in the result cache.", [f"sed_cache_entries {cache['entries']}"])
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics(METRICS_CONFIG["window"])
+
+def _result_rows(name, value) -> List[Any]:
+    # Row-shaped part of an API result (lists, pages, change sets)
+    if isinstance(value, (list, ResultSet)): return value
+    if isinstance(value, dict):
+        if isinstance(value.get("rows"), (list, ResultSet)): return value["rows"]
+        if isinstance(value.get("upserts"), (list, ResultSet)): return value["upserts"]
+    return []
+
+def _approx_bytes(rows) -> int:
+    # Text size of a sample of rows scaled up: cheap enough to run on every call
+    if not rows: return 0
+    sample = rows.tuples[:32] if isinstance(rows, ResultSet) else rows[:32]
+    size = sum(sum(len(str(v)) for v in (r.values() if isinstance(r, Mapping) else r)) for r in sample)
+    return size * len(rows) // len(sample)
+
+def _short_args(args, kwargs, limit=300) -> str:
+    text = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items() if k not in ("progress", "cancel")])
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def record_call(name, seconds, result=None, acquire=None, error=False, args=(), kwargs=None, cached=False):
+    rows = _result_rows(name, result)
+    n = len(rows) if rows else (result if isinstance(result, int) and not isinstance(result, bool) and "export" in name else 0)
+    METRICS.observe(name, seconds, n, _approx_bytes(rows), acquire, error, cached)
+    if not cached and seconds * 1000 >= METRICS_CONFIG["slow_ms"]:
+        slow_log.warning("%s took %.0f ms (acquire %.0f ms, %d rows%s) args: %s", name, seconds * 1000, (acquire or 0) * 1000, n,
+                         ", failed" if error else "", _short_args(args, kwargs or {}))
+
+def instrumented(name, log_args=True):
+    """Decorator for data functions that open their own connection (users/login)."""
+    def wrap(fn):
+        def inner(*args, **kwargs):
+            _ACQUIRE.seconds = None; t0 = time.perf_counter(); result = None; failed = True
+            try:
+                result = fn(*args, **kwargs); failed = False; return result
+            finally:
+                record_call(name, time.perf_counter() - t0, result, getattr(_ACQUIRE, "seconds", None), failed,
+                            args if log_args else ("<hidden>",), kwargs if log_args else {})
+        inner.__name__ = fn.__name__; inner.__doc__ = fn.__doc__
+        return inner
+    return wrap
+
+def metrics_text() -> str:
+    return METRICS.prometheus()
+
+def dump_metrics(path=None) -> Optional[str]:
+    # Prometheus text file, written atomically (node_exporter textfile collector friendly)
+    path = path or METRICS_CONFIG["dump_path"]
+    if not path: return None
+    path = Path(path) if Path(path).is_absolute() else BASE_DIR / path
+    path.parent.mkdir(parents=True, exist_ok=True); tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(metrics_text())
+    os.replace(tmp, path)
+    return str(path)
+
+_DUMP_THREAD: Optional[threading.Thread] = None
+
+def start_metrics_dump(interval=None):
+    global _DUMP_THREAD
+    interval = METRICS_CONFIG["dump_interval"] if interval is None else interval
+    if interval <= 0 or not METRICS_CONFIG["dump_path"] or _DUMP_THREAD is not None: return
+    def loop():
+        while True:
+            time.sleep(interval)
+            try: dump_metrics()
+            except Exception as e: log.warning("Metrics dump failed: %s", e)
+    _DUMP_THREAD = threading.Thread(target=loop, name="sed-metrics", daemon=True); _DUMP_THREAD.start()
+
+def _final_metrics_dump():
+    try:
+        if METRICS_CONFIG["dump_path"]: dump_metrics()
+    except Exception as e:
+        log.warning("Metrics dump failed: %s", e)
+
+atexit.register(_final_metrics_dump)
+
 # ---------------- Modules (data layer) ----------------
 def rows_to_dicts(cur) -> List[Dict[str, Any]]:
     cols = [c[0] for c in cur.description]
     return [dict(zip(cols, r)) for r in cur.fetchall()]
 
+class Row(Mapping):
+    """Read-only dict view of one result tuple; the column index is shared by the whole ResultSet."""
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index; self._values = values
+
+    def __getitem__(self, key): return self._values[self._index[key]]
+    def __iter__(self): return iter(self._index)
+    def __len__(self): return len(self._index)
+    def __contains__(self, key): return key in self._index
+    def __repr__(self): return f"Row({dict(self)!r})"
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+class ResultSet(Sequence):
+    """Query result kept as the driver's row tuples plus one column -> position map.
+
+    Indexing/iterating yields Row views (created on access, not stored), so callers keep
+    using r["col"] / r.get("col"); code that only needs values can use .tuples/.column().
+    A slice is a ResultSet sharing the same index.
+    """
+    __slots__ = ("columns", "_index", "tuples")
+
+    def __init__(self, columns, tuples=(), _index=None):
+        self.columns = tuple(columns); self._index = _index or {c: i for i, c in enumerate(self.columns)}
+        self.tuples = tuples if isinstance(tuples, list) else list(tuples)
+
+    def __len__(self): return len(self.tuples)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return ResultSet(self.columns, self.tuples[i], self._index)
+        return Row(self._index, self.tuples[i])
+
+    def __iter__(self):
+        index = self._index
+        return (Row(index, t) for t in self.tuples)
+
+    def __repr__(self): return f"<ResultSet {len(self.tuples)} rows x {len(self.columns)} columns>"
+
+    def column(self, name) -> List[Any]:
+        i = self._index[name]
+        return [t[i] for t in self.tuples]
+
+def result_set(cur) -> ResultSet:
+    # The list APIs' result type: no dict per row (see ResultSet)
+    return ResultSet([c[0] for c in cur.description], cur.fetchall())
+
+def execute_prepared(conn, sql: str, params=()):
+    """Run `sql` on a prepared statement cached on the connection, keyed by the SQL text.
+
+    MySQL prepares once per pooled connection and afterwards only sends the parameters;
+    SQLite reuses its own compiled statement. Results must be fully fetched before the
+    same statement runs again. Returns the cursor.
+    """
+    raw = getattr(conn, "_raw", conn)   # cache on the physical connection, not the pool proxy
+    try: cache = raw._sed_prepared
+    except AttributeError: cache = raw._sed_prepared = OrderedDict()
+    cur = cache.get(sql)
+    if cur is None:
+        cur = cache[sql] = raw.cursor(prepared=True)
+        if len(cache) > PREPARED_CACHE: cache.popitem(last=False)[1].close()
+    else:
+        cache.move_to_end(sql)
+    try: cur.execute(sql, tuple(params))
+    except DB_ERRORS: cache.pop(sql, None); raise
+    return cur
+
+def _create_table(conn, ddl: str):
+    # `ddl` is a MySQL CREATE TABLE IF NOT EXISTS; the dialect rewrites it for its backend
+    cur = conn.cursor()
+    for stmt in dialect_of(conn).ddl(ddl): cur.execute(stmt)
+    conn.commit()
+
+def _index_exists(conn, table: str, index_name: str) -> bool:
+    return dialect_of(conn).index_exists(conn, table, index_name)
+
+def _column_exists(conn, table: str, column: str) -> bool:
+    return dialect_of(conn).column_exists(conn, table, column)
+
+def _ensure_column(conn, table: str, column: str, ddl: str):
+    if not _column_exists(conn, table, column):
+        log.info("Adding column %s.%s", table, column)
+        dialect_of(conn).add_column(conn, table, column, ddl)
+
+def _ensure_index(conn, table: str, index_name: str, ddl: str):
+    # CREATE TABLE IF NOT EXISTS does not touch existing tables, so indexes are added separately
+    if not _index_exists(conn, table, index_name):
+        log.info("Adding index %s on %s", index_name, table)
+        dialect_of(conn).add_index(conn, table, index_name, ddl)
+
+def _fk_exists(conn, table: str, fk_name: str) -> bool:
+    return dialect_of(conn).fk_exists(conn, table, fk_name)
+
+# Keyset pagination: pages are ordered by (sort column, id) and the cursor carries the last pair seen,
+# so fetching page N costs the same as page 1 (no OFFSET scan).
+def _encode_token(obj: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(obj).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_token(token: str, key: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))[key])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
+
+def encode_cursor(last_id) -> Optional[str]:
+    return None if last_id is None else _encode_token({"id": int(last_id)})
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    return _decode_token(cursor, "id") if cursor else None
+
+def _keyset_page(conn, table: str, where=(), params=(), cursor=None, limit=PAGE_SIZE, with_total=False, order=None, desc=True) -> Dict[str, Any]:
+    """One page ordered by `order` (default id), then id, with a cursor carrying the last (value, id) seen.
+
+    `order` must already be validated against the table's sortable columns (_check_order).
+    NULLs sort first ascending and last descending, as in both MySQL and SQLite.
+    """
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+    clauses = list(where); args = list(params); total = None
+    col = order or "id"; op = "<" if desc else ">"; direction = "DESC" if desc else "ASC"
+    # Statement shapes repeat (filters x sort x first/next page), so each is prepared once per connection
+    if with_total:
+        cur = execute_prepared(conn, f"SELECT COUNT(*) FROM {table}" + (" WHERE " + " AND ".join(clauses) if clauses else ""), args)
+        total = cur.fetchall()[0][0]
+    if cursor:
+        last = _decode_sort_token(cursor, col)
+        if col == "id": clauses.append(f"id {op} %s"); args.append(last["id"])
+        elif last.get("v") is None:
+            clauses.append(f"({col} IS NULL AND id {op} %s)" if desc else f"(({col} IS NULL AND id > %s) OR {col} IS NOT NULL)")
+            args.append(last["id"])
+        else:
+            clauses.append(f"({col} {op} %s OR ({col} = %s AND id {op} %s)" + (f" OR {col} IS NULL)" if desc else ")"))
+            args += [last["v"], last["v"], last["id"]]
+    order_by = f"id {direction}" if col == "id" else f"{col} {direction}, id {direction}"
+    rows = result_set(execute_prepared(conn, f"SELECT * FROM {table}" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+                                          + f" ORDER BY {order_by} LIMIT %s", args + [limit + 1]))
+    more = len(rows) > limit; rows = rows[:limit]
+    return {"rows": rows, "page_size": limit, "next_cursor": _sort_token(rows[-1], col, desc) if more else None, "total": total}
+
+def _sort_token(row, col, desc) -> str:
+    if col == "id" and desc: return encode_cursor(row["id"])   # same token as before sorting existed
+    v = row.get(col)
+    return _encode_token({"id": int(row["id"]), "o": col, "d": bool(desc), "v": v if v is None or isinstance(v, (int, float, str)) else str(v)})
+
+def _decode_sort_token(token: str, col: str) -> Dict[str, Any]:
+    try:
+        last = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if last.get("o", "id") != col: raise ValueError("sort order changed")
+        last["id"] = int(last["id"]); return last
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
+
+def _check_order(order, allowed):
+    if order not in (None, "id") and order not in allowed:
+        raise ValueError(f"Tidak boleh isih mengikut {order!r}")
+    return order
+
+_FT_WORD = re.compile(r"\w+", re.UNICODE)
+
+def _search_where(columns, query: str, exact_prefix_col=None, fulltext=True):
+    """WHERE clauses and params matching `query` on `columns`, or None when there is nothing to search.
+
+    Every word must match as the start of a word in one of the columns: through the FULLTEXT
+    index when all words reach the minimum token size, else one group of word-start LIKEs per
+    word ("Ali" finds "Mohd Ali bin Ahmad"). An IC-like query (digits/dashes) is a prefix
+    match on `exact_prefix_col` when given. fulltext=False (backends without MATCH) always
+    takes the LIKE path.
+    """
+    query = (query or "").strip(); terms = _FT_WORD.findall(query)
+    if not terms: return None
+    if exact_prefix_col and re.fullmatch(r"[\d\-\s]+", query):
+        return [f"{exact_prefix_col} LIKE %s"], [query + "%"]
+    if fulltext and all(len(t) >= FT_MIN_TOKEN for t in terms):
+        return [f"MATCH({','.join(columns)}) AGAINST (%s IN BOOLEAN MODE)"], [" ".join(f"+{t}*" for t in terms)]
+    clauses, params = [], []
+    for t in terms:
+        clauses.append("(" + " OR ".join(f"{c} LIKE %s OR {c} LIKE %s" for c in columns) + ")")
+        params += [t + "%", "% " + t + "%"] * len(columns)
+    return clauses, params
+
+def _search_sql(table: str, columns, query: str, exact_prefix_col=None, fulltext=True):
+    # Search as one statement without a LIMIT (FULLTEXT matches ranked by relevance), or None
+    found = _search_where(columns, query, exact_prefix_col, fulltext)
+    if found is None: return None
+    where, params = found; sql = f"SELECT * FROM {table} WHERE " + " AND ".join(where)
+    if where[0].startswith("MATCH("): return sql + f" ORDER BY {where[0]} DESC, id DESC", params * 2
+    return sql + " ORDER BY id DESC", params
+
+def _fulltext_search(conn, table: str, columns, query: str, limit=PAGE_SIZE, exact_prefix_col=None) -> List[Dict[str, Any]]:
+    q = _search_sql(table, columns, query, exact_prefix_col, dialect_of(conn).fulltext)
+    if q is None: return []
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+    return result_set(execute_prepared(conn, q[0] + " LIMIT %s", q[1] + [limit]))
+
+# Streaming export: rows go from an unbuffered (server-side) cursor to disk chunk by chunk,
+# so memory stays flat however large the result set is.
+class OperationCancelled(Exception):
+    pass
+
+class ExportCancelled(OperationCancelled):
+    pass
+
+class ImportCancelled(OperationCancelled):
+    pass
+
+def iter_query_chunks(conn, sql: str, params=(), chunk_size=EXPORT_CHUNK):
+    cur = conn.cursor(buffered=False)
+    cur.execute(sql, params)
+    cols = [c[0] for c in cur.description]
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows: break
+        yield cols, rows
+
+def count_query(conn, sql: str, params=()) -> int:
+    cur = conn.cursor(); cur.execute(f"SELECT COUNT(*) FROM ({sql}) AS q", params)
+    return cur.fetchall()[0][0]
+
+def export_query_csv(conn, sql: str, params, path: str, chunk_size=EXPORT_CHUNK, compress=None, progress=None, cancel=None) -> int:
+    """Stream the result of `sql` into a CSV file (gzip when compress=True or path ends in .gz).
+
+    progress(done, total) is called after every chunk; setting the `cancel` event stops the
+    export, discards the partial file and raises ExportCancelled. Returns the row count.
+    """
+    if compress is None: compress = str(path).lower().endswith(".gz")
+    total = count_query(conn, sql, params) if progress else None
+    tmp = f"{path}.part"; done = 0
+    try:
+        with (gzip.open(tmp, "wt", newline="", encoding="utf-8") if compress else open(tmp, "w", newline="", encoding="utf-8")) as f:
+            w = csv.writer(f)
+            # Header straight from the cursor so an empty result still gets one
+            cur = conn.cursor(buffered=False); cur.execute(sql, params)
+            w.writerow([c[0] for c in cur.description])
+            while True:
+                if cancel is not None and cancel.is_set():
+                    # Abandoning an unbuffered result leaves unread rows on the wire; drop the connection
+                    if hasattr(conn, "invalidate"): conn.invalidate()
+                    raise ExportCancelled(path)
+                rows = cur.fetchmany(chunk_size)
+                if not rows: break
+                w.writerows(rows); done += len(rows)
+                if progress: progress(done, total)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    log.info("Exported %d rows to %s", done, path)
+    return done
+
+# Change tracking: every write appends (table, row id, op) to change_log in the same
+# transaction, so clients can ask for "what changed since cursor" instead of reloading.
+def change_log_ensure_table(conn):
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+            tbl VARCHAR(64) NOT NULL,
+            row_id INT NOT NULL,
+            op ENUM('upsert','delete') NOT NULL,
+            changed_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6),
+            INDEX idx_change_tbl_seq (tbl, seq)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+def prune_change_log(conn, days=CHANGE_LOG_RETENTION_DAYS):
+    cutoff = datetime.now() - timedelta(days=int(days))
+    cur = conn.cursor(); cur.execute("DELETE FROM change_log WHERE changed_at < %s", (cutoff,)); conn.commit()
+    return cur.rowcount
+
+def _ensure_updated_at(conn, table: str):
+    _ensure_column(conn, table, "updated_at", "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+    _ensure_index(conn, table, "idx_updated_at", "INDEX idx_updated_at (updated_at, id)")
+
+def _begin(conn):
+    # Connections run with autocommit; group a write and its change_log entry into one transaction
+    if not conn.in_transaction: conn.start_transaction()
+
+def _log_change(cur, table: str, row_ids, op: str):
+    cur.executemany("INSERT INTO change_log (tbl, row_id, op) VALUES (%s,%s,%s)", [(table, int(i), op) for i in row_ids])
+
+# Bulk edit/delete: the caller opens one transaction; ids go in BULK_CHUNK-sized IN (...) lists
+def _id_chunks(ids):
+    ids = sorted({int(i) for i in ids})
+    return [ids[i:i + BULK_CHUNK] for i in range(0, len(ids), BULK_CHUNK)]
+
+def _bulk_update(conn, table: str, ids, data: Dict[str, Any], allowed) -> int:
+    fields = [k for k in allowed if k in data]
+    if not fields: raise ValueError(f"Tiada medan yang boleh dikemaskini secara pukal (dibenarkan: {', '.join(allowed)})")
+    set_clause = ",".join(f"{k}=%s" for k in fields); vals = [data[k] for k in fields]; n = 0
+    counted = _dashboard_affected(table, fields); cur = conn.cursor()
+    for chunk in _id_chunks(ids):
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id FROM {table} WHERE id IN ({marks})", chunk); found = [r[0] for r in cur.fetchall()]
+        if not found: continue
+        if counted: _dashboard_delta(conn, table, f"id IN ({marks})", chunk, -1)
+        cur.execute(f"UPDATE {table} SET {set_clause} WHERE id IN ({marks})", vals + chunk)
+        if counted: _dashboard_delta(conn, table, f"id IN ({marks})", chunk, 1)
+        n += len(found); _log_change(cur, table, found, "upsert")
+    return n
+
+def _bulk_delete(conn, table: str, ids) -> int:
+    n = 0; cur = conn.cursor()
+    for chunk in _id_chunks(ids):
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id FROM {table} WHERE id IN ({marks})", chunk); found = [r[0] for r in cur.fetchall()]
+        if not found: continue
+        _dashboard_delta(conn, table, f"id IN ({marks})", chunk, -1)
+        cur.execute(f"DELETE FROM {table} WHERE id IN ({marks})", chunk)
+        n += cur.rowcount; _log_change(cur, table, found, "delete")
+        if table == "profil_pk_wm": _dedupe_forget(cur, found)
+    return n
+
+# Dashboard: per-key counts kept in dashboard_counts and adjusted in the same transaction as
+# every carta/profil write (subtract the affected rows' keys before, add them back after),
+# so the dashboard is one small read. dashboard_rebuild() recounts from scratch.
+DASHBOARD_METRICS = {
+    # table: [(metric, k1 expression, k2 expression)]
+    "profil_pk_wm": [("profil_unit_status", "COALESCE(unit,'')", "COALESCE(status,'')"),
+                     ("profil_intake_month", "COALESCE(SUBSTR(tarikh_masuk,1,7),'')", "''")],
+    "carta_organisasi": [("carta_unit", "COALESCE(unit,'')", "''")],
+}
+DASHBOARD_COLUMNS = {"profil_pk_wm": {"unit", "status", "tarikh_masuk"}, "carta_organisasi": {"unit"}}
+
+def dashboard_ensure_table(conn):
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS dashboard_counts (
+            metric VARCHAR(32) NOT NULL,
+            k1 VARCHAR(100) NOT NULL DEFAULT '',
+            k2 VARCHAR(32) NOT NULL DEFAULT '',
+            n INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, k1, k2)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+def _dashboard_affected(table, fields) -> bool:
+    return bool(DASHBOARD_COLUMNS.get(table, set()) & set(fields))
+
+def _dashboard_delta(conn, table: str, where: str, params, sign: int):
+    # Add (sign=1) or subtract (sign=-1) the rows of `table` matching `where` from their keys' counts
+    metrics = DASHBOARD_METRICS.get(table)
+    if not metrics: return
+    cur = conn.cursor(); dialect = dialect_of(conn)
+    for metric, k1, k2 in metrics:
+        select = f"SELECT '{metric}', {k1}, {k2}, {int(sign)}*COUNT(*) FROM {table} WHERE {where} GROUP BY 2, 3"
+        cur.execute(dialect.accumulate_sql("dashboard_counts", ("metric", "k1", "k2", "n"), ("metric", "k1", "k2"), select), params)
+
+def dashboard_rebuild(conn) -> Dict[str, Any]:
+    """Recount dashboard_counts from the base tables (repairs drift from writes made outside the app)."""
+    cur = conn.cursor(); cur.execute("SELECT metric, k1, k2, n FROM dashboard_counts WHERE n<>0")
+    before = {tuple(r[:3]): r[3] for r in cur.fetchall()}
+    _begin(conn); cur.execute("DELETE FROM dashboard_counts")
+    for table in DASHBOARD_METRICS: _dashboard_delta(conn, table, "1=1", (), 1)
+    conn.commit()
+    cur.execute("SELECT metric, k1, k2, n FROM dashboard_counts")
+    after = {tuple(r[:3]): r[3] for r in cur.fetchall()}
+    drift = sum(1 for k in set(before) | set(after) if before.get(k, 0) != after.get(k, 0))
+    if drift: log.warning("Dashboard rebuild corrected %d drifted counts", drift)
+    return {"keys": len(after), "drifted": drift}
+
+def dashboard_summary(conn) -> Dict[str, Any]:
+    profil, intake, carta = {}, [], []
+    for metric, k1, k2, n in execute_prepared(conn, "SELECT metric, k1, k2, n FROM dashboard_counts WHERE n<>0").fetchall():
+        if metric == "profil_unit_status":
+            u = profil.setdefault(k1, {"unit": k1, "aktif": 0, "tidak_aktif": 0, "jumlah": 0})
+            u[k2] = u.get(k2, 0) + n; u["jumlah"] += n
+        elif metric == "profil_intake_month": intake.append({"bulan": k1, "jumlah": n})
+        elif metric == "carta_unit": carta.append({"unit": k1, "jumlah": n})
+    units = sorted(profil.values(), key=lambda u: u["unit"])
+    return {"profil_unit": units, "intake": sorted(intake, key=lambda r: r["bulan"], reverse=True),
+            "carta_unit": sorted(carta, key=lambda r: r["unit"]),
+            "totals": {"aktif": sum(u["aktif"] for u in units), "tidak_aktif": sum(u["tidak_aktif"] for u in units),
+                       "profil": sum(u["jumlah"] for u in units), "carta": sum(r["jumlah"] for r in carta)}}
+
+def changes_since(conn, table: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Rows of `table` inserted/updated (full rows) or deleted (ids) after `cursor`.
+
+    cursor=None only returns the current head cursor. `reset` is True when the
+    cursor is too old (pruned) or too far behind, and the caller should reload.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MAX(seq),0), COALESCE(MIN(seq),1) FROM change_log")
+    head, oldest = cur.fetchall()[0]
+    out = {"upserts": [], "deletes": [], "next_cursor": _encode_token({"seq": int(head)}), "reset": False}
+    if cursor is None: return out
+    since = _decode_token(cursor, "seq")
+    if since >= head: return out
+    if since < oldest - 1: out["reset"] = True; return out
+    cur.execute("SELECT c.row_id, c.op FROM change_log c JOIN (SELECT row_id, MAX(seq) AS s FROM change_log "
+                "WHERE tbl=%s AND seq>%s AND seq<=%s GROUP BY row_id) m ON c.seq=m.s LIMIT %s",
+                (table, since, head, CHANGE_BATCH + 1))
+    latest = cur.fetchall()
+    if len(latest) > CHANGE_BATCH: out["reset"] = True; return out
+    upsert_ids = [rid for rid, op in latest if op == "upsert"]
+    out["deletes"] = [rid for rid, op in latest if op == "delete"]
+    if upsert_ids:
+        cur.execute(f"SELECT * FROM {table} WHERE id IN ({','.join(['%s'] * len(upsert_ids))})", upsert_ids)
+        out["upserts"] = result_set(cur)
+        found = {r["id"] for r in out["upserts"]}
+        out["deletes"] += [rid for rid in upsert_ids if rid not in found]   # deleted after the upsert we saw
+    return out
+
 # Carta Organisasi
 def carta_ensure_table(conn):
-    cur = conn.cursor()
-    cur.execute("""
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS carta_organisasi (
             id INT AUTO_INCREMENT PRIMARY KEY,
             nama VARCHAR(100) NOT NULL,
@@ -119,31 +1248,196 @@ def carta_ensure_table(conn):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """)
-    conn.commit()
 
 def carta_create(conn, data):
-    cur = conn.cursor()
+    _begin(conn); cur = conn.cursor()
     cur.execute("INSERT INTO carta_organisasi (nama,jawatan,unit,supervisor_id,telefon,email) VALUES (%s,%s,%s,%s,%s,%s)",
                 (data.get('nama'),data.get('jawatan'),data.get('unit'),data.get('supervisor_id'),data.get('telefon'),data.get('email')))
-    conn.commit(); return cur.lastrowid
+    rec_id = cur.lastrowid; _log_change(cur, "carta_organisasi", [rec_id], "upsert")
+    _dashboard_delta(conn, "carta_organisasi", "id=%s", (rec_id,), 1)
+    conn.commit(); return rec_id
+
+def _carta_chain(conn, start_id, lock=False):
+    """Ids from `start_id` up to the top (start first), and whether the walk was cut at CARTA_MAX_DEPTH.
+
+    One indexed lookup per level, never the whole table. lock=True (inside a write transaction)
+    reads each level FOR UPDATE where the backend has locking reads, so a concurrent re-parent
+    along the same chain waits for this transaction instead of passing the same check.
+    """
+    cur = conn.cursor()
+    if lock and dialect_of(conn).locking_reads:
+        chain, node = [], int(start_id)
+        while len(chain) <= CARTA_MAX_DEPTH:
+            cur.execute("SELECT supervisor_id FROM carta_organisasi WHERE id=%s FOR UPDATE", (node,)); r = cur.fetchall()
+            if not r: return chain, False
+            chain.append(node)
+            if r[0][0] is None: return chain, False
+            node = int(r[0][0])
+        return chain, True
+    cur.execute("""
+        WITH RECURSIVE up (id, supervisor_id, depth) AS (
+            SELECT id, supervisor_id, 0 FROM carta_organisasi WHERE id=%s
+            UNION ALL
+            SELECT c.id, c.supervisor_id, up.depth+1 FROM carta_organisasi c JOIN up ON c.id=up.supervisor_id WHERE up.depth < %s
+        ) SELECT id, supervisor_id, depth FROM up ORDER BY depth
+    """, (start_id, CARTA_MAX_DEPTH))
+    rows = cur.fetchall()
+    return [r[0] for r in rows], bool(rows) and rows[-1][2] >= CARTA_MAX_DEPTH and rows[-1][1] is not None
+
+def carta_would_cycle(conn, rec_id, supervisor_id, lock=False) -> bool:
+    # A chain still going at CARTA_MAX_DEPTH counts as a cycle: the walk never proved it reaches the top
+    if supervisor_id in (None, ""): return False
+    if int(supervisor_id) == int(rec_id): return True
+    chain, cut = _carta_chain(conn, supervisor_id, lock)
+    return cut or int(rec_id) in chain
 
 def carta_update(conn, rec_id, data):
     fields = [k for k in ['nama','jawatan','unit','supervisor_id','telefon','email'] if k in data]
     if not fields: return False
     set_clause = ','.join(f"{k}=%s" for k in fields)
     vals = [data[k] for k in fields] + [rec_id]
-    cur = conn.cursor(); cur.execute(f"UPDATE carta_organisasi SET {set_clause} WHERE id=%s", vals); conn.commit(); return cur.rowcount>0
+    counted = _dashboard_affected("carta_organisasi", fields)
+    _begin(conn); cur = conn.cursor()
+    # Checked inside the transaction, on a locked chain: two re-parents (A->B, B->A) cannot both pass
+    if 'supervisor_id' in data and carta_would_cycle(conn, rec_id, data['supervisor_id'], lock=True):
+        conn.rollback()
+        raise ValueError(f"Penyelia {data['supervisor_id']} berada di bawah rekod {rec_id}; hierarki akan berkitar "
+                         f"atau melebihi {CARTA_MAX_DEPTH} aras")
+    if counted: _dashboard_delta(conn, "carta_organisasi", "id=%s", (rec_id,), -1)
+    cur.execute(f"UPDATE carta_organisasi SET {set_clause} WHERE id=%s", vals); ok = cur.rowcount>0
+    if counted: _dashboard_delta(conn, "carta_organisasi", "id=%s", (rec_id,), 1)
+    if ok: _log_change(cur, "carta_organisasi", [rec_id], "upsert")
+    conn.commit(); return ok
 
 def carta_delete(conn, rec_id):
-    cur = conn.cursor(); cur.execute("DELETE FROM carta_organisasi WHERE id=%s", (rec_id,)); conn.commit(); return cur.rowcount>0
+    _begin(conn); cur = conn.cursor()
+    # Detach subordinates explicitly (rather than via ON DELETE SET NULL) so their change is logged
+    cur.execute("SELECT id FROM carta_organisasi WHERE supervisor_id=%s", (rec_id,)); children = [r[0] for r in cur.fetchall()]
+    if children:
+        cur.execute("UPDATE carta_organisasi SET supervisor_id=NULL WHERE supervisor_id=%s", (rec_id,))
+        _log_change(cur, "carta_organisasi", children, "upsert")
+    _dashboard_delta(conn, "carta_organisasi", "id=%s", (rec_id,), -1)
+    cur.execute("DELETE FROM carta_organisasi WHERE id=%s", (rec_id,)); ok = cur.rowcount>0
+    if ok: _log_change(cur, "carta_organisasi", [rec_id], "delete")
+    conn.commit(); return ok
+
+CARTA_BULK_FIELDS = ('jawatan','unit','supervisor_id')
+
+def carta_update_many(conn, ids, data) -> int:
+    # Returns the number of records matched (MySQL's rowcount would leave out rows already holding the value)
+    ids = {int(i) for i in ids}
+    sup = data.get('supervisor_id')
+    if sup not in (None, "") and int(sup) in ids: raise ValueError(f"Rekod {sup} tidak boleh menjadi penyelia kepada dirinya sendiri")
+    # One transaction for the whole set; the cycle check runs inside it on the locked chain, as in carta_update
+    _begin(conn)
+    if sup not in (None, ""):
+        chain, cut = _carta_chain(conn, sup, lock=True); inside = set(chain) & ids
+        if inside or cut: conn.rollback()
+        if inside: raise ValueError(f"Penyelia {sup} berada di bawah rekod {min(inside)}; hierarki akan berkitar")
+        if cut: raise ValueError(f"Rantaian penyelia {sup} melebihi {CARTA_MAX_DEPTH} aras; hierarki tidak dapat disahkan")
+    n = _bulk_update(conn, "carta_organisasi", ids, data, CARTA_BULK_FIELDS)
+    conn.commit(); return n
+
+def carta_delete_many(conn, ids) -> int:
+    ids = {int(i) for i in ids}
+    _begin(conn); cur = conn.cursor()
+    # Subordinates left behind are detached (and logged) as carta_delete does one at a time
+    for chunk in _id_chunks(ids):
+        marks = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id FROM carta_organisasi WHERE supervisor_id IN ({marks})", chunk)
+        children = [r[0] for r in cur.fetchall() if r[0] not in ids]
+        for part in _id_chunks(children):
+            cur.execute(f"UPDATE carta_organisasi SET supervisor_id=NULL WHERE id IN ({','.join(['%s'] * len(part))})", part)
+            _log_change(cur, "carta_organisasi", part, "upsert")
+    n = _bulk_delete(conn, "carta_organisasi", ids)
+    conn.commit(); return n
 
 def carta_list(conn):
-    cur = conn.cursor(); cur.execute("SELECT * FROM carta_organisasi ORDER BY id DESC"); return rows_to_dicts(cur)
+    cur = conn.cursor(); cur.execute("SELECT * FROM carta_organisasi ORDER BY id DESC"); return result_set(cur)
 
-# Profil PK/WM
-def profil_ensure_table(conn):
+# Hierarchy (supervisor_id adjacency list) — recursive CTEs over idx_carta_supervisor
+def carta_children(conn, parent_id=None, cursor=None, limit=CARTA_CHILD_PAGE):
+    # Direct reports of parent_id (top level when None), each with its own direct-report count
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE)); after = decode_cursor(cursor)
+    where = "c.supervisor_id IS NULL" if parent_id is None else "c.supervisor_id=%s"
+    params = [] if parent_id is None else [parent_id]
+    if after is not None: where += " AND c.id > %s"; params.append(after)
+    cur = conn.cursor()
+    cur.execute(f"SELECT c.*, (SELECT COUNT(*) FROM carta_organisasi x WHERE x.supervisor_id=c.id) AS n_children "
+                f"FROM carta_organisasi c WHERE {where} ORDER BY c.id LIMIT %s", params + [limit + 1])
+    rows = result_set(cur); more = len(rows) > limit; rows = rows[:limit]
+    return {"rows": rows, "next_cursor": encode_cursor(rows[-1]["id"]) if more else None}
+
+def carta_subtree(conn, root_id, max_depth=CARTA_MAX_DEPTH):
     cur = conn.cursor()
     cur.execute("""
+        WITH RECURSIVE sub (id, depth) AS (
+            SELECT id, 0 FROM carta_organisasi WHERE id=%s
+            UNION ALL
+            SELECT c.id, sub.depth+1 FROM carta_organisasi c JOIN sub ON c.supervisor_id=sub.id WHERE sub.depth < %s
+        ) SELECT c.*, sub.depth FROM sub JOIN carta_organisasi c ON c.id=sub.id ORDER BY sub.depth, c.id
+    """, (root_id, min(int(max_depth), CARTA_MAX_DEPTH)))
+    return result_set(cur)
+
+def carta_subtree_size(conn, root_id) -> int:
+    # Everyone reporting (directly or indirectly) to root_id, excluding root_id
+    cur = conn.cursor()
+    cur.execute("""
+        WITH RECURSIVE sub (id, depth) AS (
+            SELECT id, 0 FROM carta_organisasi WHERE id=%s
+            UNION ALL
+            SELECT c.id, sub.depth+1 FROM carta_organisasi c JOIN sub ON c.supervisor_id=sub.id WHERE sub.depth < %s
+        ) SELECT COUNT(*) - 1 FROM sub
+    """, (root_id, CARTA_MAX_DEPTH))
+    return max(0, cur.fetchall()[0][0])
+
+def carta_ancestors(conn, rec_id):
+    # Supervisor chain from the direct supervisor up to the top
+    cur = conn.cursor()
+    cur.execute("""
+        WITH RECURSIVE up (id, supervisor_id, depth) AS (
+            SELECT id, supervisor_id, 0 FROM carta_organisasi WHERE id=%s
+            UNION ALL
+            SELECT c.id, c.supervisor_id, up.depth+1 FROM carta_organisasi c JOIN up ON c.id=up.supervisor_id WHERE up.depth < %s
+        ) SELECT c.*, up.depth FROM up JOIN carta_organisasi c ON c.id=up.id WHERE up.depth > 0 ORDER BY up.depth
+    """, (rec_id, CARTA_MAX_DEPTH))
+    return result_set(cur)
+
+def carta_headcount_by_unit(conn):
+    # Maintained in dashboard_counts on every carta write, so no scan of carta_organisasi
+    return result_set(execute_prepared(conn, "SELECT k1 AS unit, n AS jumlah FROM dashboard_counts "
+                                                "WHERE metric='carta_unit' AND n<>0 ORDER BY k1"))
+
+def carta_node_details(conn, rec_id):
+    return {"ancestors": carta_ancestors(conn, rec_id), "subtree_size": carta_subtree_size(conn, rec_id)}
+
+def carta_changes(conn, cursor=None):
+    return changes_since(conn, "carta_organisasi", cursor)
+
+CARTA_SORTABLE = ('nama','jawatan','unit','supervisor_id','telefon','email')
+
+def carta_page(conn, cursor=None, limit=PAGE_SIZE, with_total=False, order=None, desc=True, query=None):
+    # query: the search as a filter, so its matches page like the full list
+    where, params = _search_where(("nama","jawatan","unit"), query, fulltext=dialect_of(conn).fulltext) or ((), ())
+    return _keyset_page(conn, "carta_organisasi", where, params, cursor=cursor, limit=limit, with_total=with_total,
+                        order=_check_order(order, CARTA_SORTABLE), desc=desc)
+
+def carta_search(conn, query, limit=PAGE_SIZE):
+    return _fulltext_search(conn, "carta_organisasi", ("nama","jawatan","unit"), query, limit)
+
+def carta_select_sql(query=None, fulltext=True):
+    # Full (unpaged) result set behind the grid: the whole table, or every search hit
+    return _search_sql("carta_organisasi", ("nama","jawatan","unit"), query, fulltext=fulltext) or ("SELECT * FROM carta_organisasi ORDER BY id DESC", [])
+
+def carta_export_csv(conn, path, query=None, **kwargs):
+    return export_query_csv(conn, *carta_select_sql(query, dialect_of(conn).fulltext), path, **kwargs)
+
+def carta_export_pdf(conn, path, query=None, title="Carta Organisasi", **kwargs):
+    return export_query_pdf(conn, *carta_select_sql(query, dialect_of(conn).fulltext), path, title, **kwargs)
+
+# Profil PK/WM
+def profil_ensure_table(conn):
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS profil_pk_wm (
             id INT AUTO_INCREMENT PRIMARY KEY,
             nama VARCHAR(120) NOT NULL,
@@ -157,26 +1451,54 @@ def profil_ensure_table(conn):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """)
-    conn.commit()
 
 def profil_create(conn, data):
-    cur = conn.cursor()
+    _begin(conn); cur = conn.cursor()
     cur.execute("""
         INSERT INTO profil_pk_wm (nama,no_kp,pangkat,unit,telefon,alamat,tarikh_masuk,status)
         VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
     """, (data.get('nama'),data.get('no_kp'),data.get('pangkat'),data.get('unit'),
           data.get('telefon'),data.get('alamat'),data.get('tarikh_masuk'),data.get('status') or 'aktif'))
-    conn.commit(); return cur.lastrowid
+    rec_id = cur.lastrowid; _log_change(cur, "profil_pk_wm", [rec_id], "upsert")
+    _dashboard_delta(conn, "profil_pk_wm", "id=%s", (rec_id,), 1)
+    _dedupe_check(conn, rec_id, data.get('no_kp'), data.get('nama'))
+    conn.commit(); return rec_id
 
 def profil_update(conn, rec_id, data):
     fields = [k for k in ['nama','no_kp','pangkat','unit','telefon','alamat','tarikh_masuk','status'] if k in data]
     if not fields: return False
     set_clause = ','.join(f"{k}=%s" for k in fields)
     vals = [data[k] for k in fields] + [rec_id]
-    cur = conn.cursor(); cur.execute(f"UPDATE profil_pk_wm SET {set_clause} WHERE id=%s", vals); conn.commit(); return cur.rowcount>0
+    counted = _dashboard_affected("profil_pk_wm", fields)
+    _begin(conn); cur = conn.cursor()
+    if counted: _dashboard_delta(conn, "profil_pk_wm", "id=%s", (rec_id,), -1)
+    cur.execute(f"UPDATE profil_pk_wm SET {set_clause} WHERE id=%s", vals); ok = cur.rowcount>0
+    if counted: _dashboard_delta(conn, "profil_pk_wm", "id=%s", (rec_id,), 1)
+    if ok: _log_change(cur, "profil_pk_wm", [rec_id], "upsert")
+    if ok and {'nama','no_kp'} & set(fields):
+        cur.execute("SELECT no_kp, nama FROM profil_pk_wm WHERE id=%s", (rec_id,)); _dedupe_check(conn, rec_id, *cur.fetchall()[0])
+    conn.commit(); return ok
 
 def profil_delete(conn, rec_id):
-    cur = conn.cursor(); cur.execute("DELETE FROM profil_pk_wm WHERE id=%s", (rec_id,)); conn.commit(); return cur.rowcount>0
+    _begin(conn); cur = conn.cursor()
+    _dashboard_delta(conn, "profil_pk_wm", "id=%s", (rec_id,), -1)
+    cur.execute("DELETE FROM profil_pk_wm WHERE id=%s", (rec_id,)); ok = cur.rowcount>0
+    if ok: _log_change(cur, "profil_pk_wm", [rec_id], "delete"); _dedupe_forget(cur, [rec_id])
+    conn.commit(); return ok
+
+PROFIL_BULK_FIELDS = ('pangkat','unit','status','tarikh_masuk')
+
+def profil_update_many(conn, ids, data) -> int:
+    data = dict(data)
+    if data.get('status') not in (None, "") and data['status'] not in PROFIL_STATUSES:
+        raise ValueError(f"Status tidak sah: {data['status']!r}")
+    if 'tarikh_masuk' in data: data['tarikh_masuk'] = _parse_date(data['tarikh_masuk'])
+    _begin(conn); n = _bulk_update(conn, "profil_pk_wm", ids, data, PROFIL_BULK_FIELDS)
+    conn.commit(); return n
+
+def profil_delete_many(conn, ids) -> int:
+    _begin(conn); n = _bulk_delete(conn, "profil_pk_wm", ids)
+    conn.commit(); return n
 
 def profil_list(conn, status=None):
     cur = conn.cursor()
@@ -184,25 +1506,598 @@ def profil_list(conn, status=None):
         cur.execute("SELECT * FROM profil_pk_wm WHERE status=%s ORDER BY id DESC", (status,))
     else:
         cur.execute("SELECT * FROM profil_pk_wm ORDER BY id DESC")
-    return rows_to_dicts(cur)
+    return result_set(cur)
 
 def profil_list_by_unit(conn, unit):
-    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE unit=%s ORDER BY id DESC",(unit,)); return rows_to_dicts(cur)
+    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE unit=%s ORDER BY id DESC",(unit,)); return result_set(cur)
 
 def profil_search_by_name(conn, name):
-    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE nama LIKE %s ORDER BY id DESC",(f"%{name}%",)); return rows_to_dicts(cur)
+    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE nama LIKE %s ORDER BY id DESC",(f"%{name}%",)); return result_set(cur)
 
 def profil_list_inactive(conn):
-    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE status='tidak_aktif' ORDER BY id DESC"); return rows_to_dicts(cur)
+    cur = conn.cursor(); cur.execute("SELECT * FROM profil_pk_wm WHERE status='tidak_aktif' ORDER BY id DESC"); return result_set(cur)
 
-# Placeholder modules (tables only)
-def _ensure_simple_table(conn, table_name: str):
+def profil_changes(conn, cursor=None):
+    return changes_since(conn, "profil_pk_wm", cursor)
+
+PROFIL_STATUSES = ('aktif','tidak_aktif')
+
+def profil_filter(unit=None, name=None, status=None, masuk_from=None, masuk_to=None):
+    """WHERE clauses and params for any combination of the Rekod Profil filters.
+
+    name is a prefix match on nama so it can use idx_profil_nama / idx_profil_unit_nama;
+    masuk_from/masuk_to bound tarikh_masuk (inclusive) and accept the import date formats.
+    """
+    where, params = [], []
+    if unit: where.append("unit=%s"); params.append(unit)
+    if status:
+        if status not in PROFIL_STATUSES: raise ValueError(f"Status tidak sah: {status!r}")
+        where.append("status=%s"); params.append(status)
+    prefix = re.sub(r"[%_]", "", (name or "").strip())   # wildcards would defeat the index
+    if prefix: where.append("nama LIKE %s"); params.append(prefix + "%")
+    lo, hi = _parse_date(masuk_from), _parse_date(masuk_to)
+    if lo and hi and lo > hi: raise ValueError("Julat tarikh_masuk tidak sah: tarikh mula selepas tarikh akhir")
+    if lo: where.append("tarikh_masuk >= %s"); params.append(lo)
+    if hi: where.append("tarikh_masuk <= %s"); params.append(hi)
+    return where, params
+
+def profil_page(conn, status=None, unit=None, name=None, masuk_from=None, masuk_to=None, cursor=None, limit=PAGE_SIZE, with_total=False,
+                order=None, desc=True, query=None):
+    where, params = profil_filter(unit, name, status, masuk_from, masuk_to)
+    found = _search_where(("nama","no_kp","unit"), query, "no_kp", dialect_of(conn).fulltext)
+    if found: where += found[0]; params += found[1]
+    return _keyset_page(conn, "profil_pk_wm", where, params, cursor=cursor, limit=limit, with_total=with_total,
+                        order=_check_order(order, PROFIL_COLUMNS), desc=desc)
+
+def profil_records(conn, unit=None, name=None, status=None, masuk_from=None, masuk_to=None):
+    where, params = profil_filter(unit, name, status, masuk_from, masuk_to)
     cur = conn.cursor()
-    cur.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (id INT AUTO_INCREMENT PRIMARY KEY) ENGINE=InnoDB;")
+    cur.execute("SELECT * FROM profil_pk_wm" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id DESC", params)
+    return result_set(cur)
+
+def profil_search(conn, query, limit=PAGE_SIZE):
+    return _fulltext_search(conn, "profil_pk_wm", ("nama","no_kp","unit"), query, limit, exact_prefix_col="no_kp")
+
+def profil_select_sql(query=None, fulltext=True):
+    return (_search_sql("profil_pk_wm", ("nama","no_kp","unit"), query, exact_prefix_col="no_kp", fulltext=fulltext)
+            or ("SELECT * FROM profil_pk_wm ORDER BY id DESC", []))
+
+def profil_export_csv(conn, path, query=None, **kwargs):
+    return export_query_csv(conn, *profil_select_sql(query, dialect_of(conn).fulltext), path, **kwargs)
+
+def profil_export_pdf(conn, path, query=None, title="Profil PK/WM", **kwargs):
+    return export_query_pdf(conn, *profil_select_sql(query, dialect_of(conn).fulltext), path, title, **kwargs)
+
+# Bulk import (PK/WM) from CSV/XLSX: validate, then upsert on the no_kp UNIQUE key in batches
+PROFIL_COLUMNS = ('nama','no_kp','pangkat','unit','telefon','alamat','tarikh_masuk','status')
+_PROFIL_MAXLEN = {'nama': 120, 'no_kp': 30, 'pangkat': 60, 'unit': 60, 'telefon': 30}
+_IMPORT_ALIASES = {'nokp': 'no_kp', 'no_ic': 'no_kp', 'ic': 'no_kp', 'no_kad_pengenalan': 'no_kp', 'tarikh': 'tarikh_masuk'}
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d")
+
+def _import_header(h) -> str:
+    k = re.sub(r"[\s\-/]+", "_", str(h or "").strip().lower())
+    return _IMPORT_ALIASES.get(k, k)
+
+def read_import_file(path: str):
+    """Yield (line_no, {column: value}) from a CSV or XLSX file; header names are normalised."""
+    if str(path).lower().endswith((".xlsx", ".xlsm")):
+        try:
+            from openpyxl import load_workbook
+        except Exception as e:
+            raise RuntimeError("openpyxl tiada. Jalankan: pip install openpyxl") from e
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [_import_header(h) for h in next(rows, ())]
+            for n, r in enumerate(rows, start=2):
+                if r and any(v not in (None, "") for v in r): yield n, dict(zip(header, r))
+        finally:
+            wb.close()
+    else:
+        with open(path, "r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [_import_header(h) for h in next(reader, [])]
+            for r in reader:
+                if any(v.strip() for v in r): yield reader.line_num, dict(zip(header, r))
+
+def _parse_date(v):
+    if v in (None, ""): return None
+    if isinstance(v, datetime): return v.date()
+    if isinstance(v, date): return v
+    for fmt in _DATE_FORMATS:
+        try: return datetime.strptime(str(v).strip(), fmt).date()
+        except ValueError: pass
+    raise ValueError(f"tarikh_masuk tidak sah: {v!r}")
+
+def validate_profil_row(raw: Dict[str, Any]):
+    # Returns (clean_row, None) or (None, reason)
+    row = {}
+    for k in PROFIL_COLUMNS:
+        if k not in raw: continue
+        v = raw[k]
+        if isinstance(v, str): v = v.strip()
+        if v == "": v = None
+        if v is not None and k in _PROFIL_MAXLEN:
+            v = str(v)
+            if len(v) > _PROFIL_MAXLEN[k]: return None, f"{k} melebihi {_PROFIL_MAXLEN[k]} aksara"
+        row[k] = v
+    if not row.get('nama'): return None, "nama wajib"
+    if not row.get('no_kp'): return None, "no_kp wajib"
+    if 'tarikh_masuk' in row:
+        try: row['tarikh_masuk'] = _parse_date(row['tarikh_masuk'])
+        except ValueError as e: return None, str(e)
+    if row.get('status') is not None:
+        st = re.sub(r"[\s\-]+", "_", str(row['status']).lower())
+        if st not in ('aktif', 'tidak_aktif'): return None, f"status tidak sah: {row['status']!r}"
+        row['status'] = st
+    return row, None
+
+def _load_data_value(v) -> str:
+    # MySQL LOAD DATA default text format: tab-separated, backslash escapes, \N for NULL
+    if v is None: return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def profil_import_file(conn, path: str, batch_size=IMPORT_BATCH, method="auto", progress=None, cancel=None) -> Dict[str, Any]:
+    """Validate and upsert PK/WM profiles from a CSV/XLSX file.
+
+    Rows are matched on no_kp: new ones are inserted, existing ones have the columns present
+    in the file updated. method="batch" commits every `batch_size` rows via executemany;
+    "load_data" stages the whole file with LOAD DATA LOCAL INFILE and upserts in one
+    statement; "auto" picks load_data for large files and falls back to batch if the server
+    refuses local infile. Returns counts and a list of rejected rows with reasons.
+    """
+    t0 = time.perf_counter()
+    rows = read_import_file(path)
+    first = next(rows, None)
+    report = {"inserted": 0, "updated": 0, "rejected": [], "total": 0, "method": "batch", "duplicates": 0}
+    if first is None: return report
+    present = [c for c in PROFIL_COLUMNS if c in first[1]]
+    missing = {'nama', 'no_kp'} - set(present)
+    if missing: raise ValueError(f"Lajur wajib tiada dalam fail: {', '.join(sorted(missing))}")
+    cols = present + (['status'] if 'status' not in present else [])   # new rows default to aktif
+    update_cols = [c for c in present if c != 'no_kp']
+
+    def valid_rows():
+        seen = {}
+        for line, raw in itertools.chain([first], rows):
+            if cancel is not None and cancel.is_set(): raise ImportCancelled(path)
+            report["total"] += 1
+            row, reason = validate_profil_row(raw)
+            if row is not None and row['no_kp'] in seen:
+                row, reason = None, f"no_kp berulang dalam fail (baris {seen[row['no_kp']]})"
+            if row is None:
+                report["rejected"].append({"baris": line, "no_kp": raw.get('no_kp'), "nama": raw.get('nama'), "sebab": reason})
+                continue
+            seen[row['no_kp']] = line
+            row['status'] = row.get('status') or 'aktif'   # same default as profil_create
+            yield tuple(row.get(c) for c in cols)
+
+    if method == "auto":
+        method = "load_data" if os.path.getsize(path) >= IMPORT_LOAD_DATA_BYTES else "batch"
+    if method == "load_data" and not dialect_of(conn).load_data:
+        method = "batch"   # embedded backend: batched upserts are already local
+    if method == "load_data":
+        try:
+            _profil_import_load_data(conn, valid_rows(), cols, update_cols, report, progress)
+            report["method"] = "load_data"
+        except DB_ERRORS as e:
+            log.warning("LOAD DATA LOCAL INFILE unavailable (%s); falling back to batched import", e)
+            report.update(inserted=0, updated=0, rejected=[], total=0)
+            rows = read_import_file(path); first = next(rows, None)
+            _profil_import_batches(conn, valid_rows(), cols, update_cols, batch_size, report, progress)
+    else:
+        _profil_import_batches(conn, valid_rows(), cols, update_cols, batch_size, report, progress)
+    log.info("Imported %s: %d inserted, %d updated, %d rejected of %d rows via %s in %.1fs", path, report["inserted"],
+             report["updated"], len(report["rejected"]), report["total"], report["method"], time.perf_counter() - t0)
+    return report
+
+def _upsert_sql(table_cols, update_cols, source=None, dialect=MYSQL) -> str:
+    return dialect.upsert_sql("profil_pk_wm", table_cols, update_cols, "no_kp", source)
+
+def _profil_import_batches(conn, rows, cols, update_cols, batch_size, report, progress):
+    sql = _upsert_sql(cols, update_cols, dialect=dialect_of(conn)); kp = cols.index('no_kp'); batch = []
+    def flush():
+        keys = [r[kp] for r in batch]; marks = ",".join(["%s"] * len(keys))
+        _begin(conn); cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM profil_pk_wm WHERE no_kp IN ({marks})", keys)
+        existing = cur.fetchall()[0][0]
+        if existing: _dashboard_delta(conn, "profil_pk_wm", f"no_kp IN ({marks})", keys, -1)
+        cur.executemany(sql, batch)
+        _dashboard_delta(conn, "profil_pk_wm", f"no_kp IN ({marks})", keys, 1)
+        cur.execute(f"INSERT INTO change_log (tbl, row_id, op) SELECT 'profil_pk_wm', id, 'upsert' FROM profil_pk_wm WHERE no_kp IN ({marks})", keys)
+        cur.execute(f"SELECT id, no_kp, nama FROM profil_pk_wm WHERE no_kp IN ({marks})", keys)
+        report["duplicates"] += _dedupe_index(conn, cur.fetchall())
+        conn.commit()
+        report["updated"] += existing; report["inserted"] += len(batch) - existing
+        if progress: progress(report["total"], None)
+        batch.clear()
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= batch_size: flush()
+    if batch: flush()
+
+def _profil_import_load_data(conn, rows, cols, update_cols, report, progress):
+    # LOAD DATA LOCAL only reads files in IMPORT_STAGE_DIR (see connect_db); the stage is a session temp table
+    IMPORT_STAGE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="sed_import_", suffix=".tsv", dir=IMPORT_STAGE_DIR)
+    try:
+        n = 0
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            for r in rows:
+                f.write("\t".join(_load_data_value(v) for v in r) + "\n"); n += 1
+        if progress: progress(report["total"], None)
+        if not n: return
+        cur = conn.cursor()
+        try:
+            cur.execute("DROP TEMPORARY TABLE IF EXISTS _profil_stage")
+            cur.execute("CREATE TEMPORARY TABLE _profil_stage (nama VARCHAR(120), no_kp VARCHAR(30) PRIMARY KEY, pangkat VARCHAR(60), "
+                        "unit VARCHAR(60), telefon VARCHAR(30), alamat TEXT, tarikh_masuk DATE, status VARCHAR(20))")
+            cur.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE _profil_stage CHARACTER SET utf8mb4 ({','.join(cols)})", (tmp,))
+            conn.start_transaction()
+            cur.execute("SELECT COUNT(*) FROM _profil_stage s JOIN profil_pk_wm p ON p.no_kp=s.no_kp")
+            existing = cur.fetchall()[0][0]
+            staged = "no_kp IN (SELECT no_kp FROM _profil_stage)"
+            if existing: _dashboard_delta(conn, "profil_pk_wm", staged, (), -1)
+            cur.execute(_upsert_sql(cols, update_cols, source="_profil_stage"))
+            _dashboard_delta(conn, "profil_pk_wm", staged, (), 1)
+            cur.execute("INSERT INTO change_log (tbl, row_id, op) SELECT 'profil_pk_wm', p.id, 'upsert' "
+                        "FROM profil_pk_wm p JOIN _profil_stage s ON s.no_kp=p.no_kp")
+            cur.execute("SELECT p.id, p.no_kp, p.nama FROM profil_pk_wm p JOIN _profil_stage s ON s.no_kp=p.no_kp")
+            report["duplicates"] += _dedupe_index(conn, cur.fetchall())
+            conn.commit()
+            report["updated"] += existing; report["inserted"] += n - existing
+        except BaseException:
+            if conn.in_transaction: conn.rollback()
+            raise
+        finally:
+            cur.execute("DROP TEMPORARY TABLE IF EXISTS _profil_stage")   # the pooled connection is reused
+    finally:
+        try: os.remove(tmp)
+        except OSError: pass
+
+def write_import_rejects(path: str, rejected) -> str:
+    out = str(Path(path).with_name(Path(path).stem + "_ditolak.csv"))
+    with open(out, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.DictWriter(f, fieldnames=["baris", "no_kp", "nama", "sebab"]); w.writeheader(); w.writerows(rejected)
+    return out
+
+# Duplicate detection (PK/WM): the same person entered twice with no_kp formatted differently
+# ("850101-14-5678" / "850101145678") or nama spelt differently. Every profile gets a few blocking
+# keys in profil_dedupe_keys (normalised no_kp, birth date + first name, name sound-alikes); only
+# profiles sharing a key are compared, so finding candidates is near-linear rather than every
+# pair. Pairs scoring >= DEDUPE_MIN_SCORE go to profil_dedupe for review: merge or reject.
+_NAME_DROP = {"BIN","BINTI","BT","BTE","BN","B","AL","AP","HAJI","HJ","HAJAH","HJH","DATO","DATUK","DR","TUAN","PUAN","ENCIK","EN","CIK"}
+_NAME_CANON = {**dict.fromkeys(("MOHD","MOHAMAD","MOHAMMAD","MOHAMED","MOHAMMED","MUHAMAD","MUHAMMED","MUHD","MHD","MD"), "MUHAMMAD"),
+               "AB": "ABDUL", "ABD": "ABDUL", "NOOR": "NOR"}
+PROFIL_MERGE_FILL = ('nama','pangkat','unit','telefon','alamat','tarikh_masuk')
+
+def dedupe_ensure_tables(conn):
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS profil_dedupe_keys (
+            k VARCHAR(100) NOT NULL,
+            profil_id INT NOT NULL,
+            PRIMARY KEY (k, profil_id),
+            INDEX idx_dedupe_keys_profil (profil_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS profil_dedupe (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            keep_id INT NOT NULL,
+            dup_id INT NOT NULL,
+            score FLOAT NOT NULL,
+            reason VARCHAR(100),
+            status ENUM('baru','digabung','ditolak') NOT NULL DEFAULT 'baru',
+            found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            decided_at TIMESTAMP NULL,
+            decided_by VARCHAR(100),
+            UNIQUE INDEX uq_dedupe_pair (keep_id, dup_id),
+            INDEX idx_dedupe_status (status, score)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+
+def _sound(token: str) -> str:
+    # Consonant skeleton: MUHAMMAD/MOHAMAD -> MD, SITI/SITTI -> ST
+    return re.sub(r"(.)\1+", r"\1", token[0] + re.sub(r"[AEIOUYHW]", "", token[1:]))
+
+def _dedupe_profile(no_kp, nama):
+    # -> (kp, name, sound, keys); kp/name/sound are what _dedupe_score compares
+    kp = re.sub(r"[^0-9A-Z]", "", str(no_kp or "").upper())
+    toks = [_NAME_CANON.get(t, t) for t in re.split(r"[^A-Z0-9]+", re.sub(r"[/'.`]", "", str(nama or "").upper())) if t and t not in _NAME_DROP]
+    name = " ".join(sorted(toks)); sound = " ".join(sorted(_sound(t) for t in toks))
+    keys = [f"K:{kp}"] if kp else []
+    if toks:
+        if len(kp) == 12 and kp.isdigit(): keys.append(f"B:{kp[:6]}:{_sound(toks[0])}")   # MyKad starts with YYMMDD
+        keys += [f"S:{sound}", f"C:{_sound(''.join(toks))}"]   # C: spacing variants (NUR AIN / NURAIN)
+    return kp, name, sound, [k[:100] for k in keys]
+
+def _dedupe_score(a, b):
+    if a[0] and a[0] == b[0]: return 1.0, "no_kp sama"
+    name = 1.0 if a[2] and a[2] == b[2] else SequenceMatcher(None, a[1], b[1]).ratio()
+    short, long_ = sorted((set(a[2].split()), set(b[2].split())), key=len)
+    if len(short) >= 2 and short <= long_: name = max(name, 0.9)   # one name lacks a part (bin/binti ...)
+    kp = SequenceMatcher(None, a[0], b[0]).ratio() if a[0] and b[0] else 0.0
+    return round(0.6 * name + 0.4 * kp, 3), f"nama {name:.0%}, no_kp {kp:.0%}"
+
+def _dedupe_forget(cur, ids):
+    # A deleted profile's blocking keys and pending pairs go in the same transaction (decided pairs stay as history)
+    marks = ",".join(["%s"] * len(ids))
+    cur.execute(f"DELETE FROM profil_dedupe_keys WHERE profil_id IN ({marks})", ids)
+    cur.execute(f"DELETE FROM profil_dedupe WHERE status='baru' AND (keep_id IN ({marks}) OR dup_id IN ({marks}))", list(ids) * 2)
+
+def _dedupe_enqueue(conn, pairs) -> int:
+    # pairs: (low id, high id, score, reason); a pair already queued (even rejected) is not queued again
+    if not pairs: return 0
+    cur = conn.cursor()
+    cur.executemany(f"{dialect_of(conn).insert_ignore} INTO profil_dedupe (keep_id, dup_id, score, reason) VALUES (%s,%s,%s,%s)", pairs)
+    return cur.rowcount
+
+def _dedupe_index(conn, rows, queue=True) -> int:
+    """Replace the blocking keys of `rows` ((id, no_kp, nama) just written) and queue the profiles
+    sharing a key with one of them that score high enough. Returns the number of pairs queued."""
+    profs = {int(rid): _dedupe_profile(kp, nama) for rid, kp, nama in rows}
+    if not profs: return 0
+    cur = conn.cursor()
+    for chunk in _id_chunks(profs):
+        cur.execute(f"DELETE FROM profil_dedupe_keys WHERE profil_id IN ({','.join(['%s'] * len(chunk))})", chunk)
+    keys = [(k, rid) for rid, p in profs.items() for k in p[3]]
+    for i in range(0, len(keys), IMPORT_BATCH):
+        cur.executemany("INSERT INTO profil_dedupe_keys (k, profil_id) VALUES (%s,%s)", keys[i:i + IMPORT_BATCH])
+    if not queue: return 0
+    by_key = {}
+    for k, rid in keys: by_key.setdefault(k, []).append(rid)
+    found = {}; others = {}; klist = list(by_key)
+    for i in range(0, len(klist), BULK_CHUNK):
+        ks = klist[i:i + BULK_CHUNK]; blocks = {}
+        # Keys of deleted profiles drop out through the join (dedupe_scan rebuilds the table)
+        cur.execute(f"SELECT k.k, p.id, p.no_kp, p.nama FROM profil_dedupe_keys k JOIN profil_pk_wm p ON p.id=k.profil_id "
+                    f"WHERE k.k IN ({','.join(['%s'] * len(ks))})", ks)
+        for k, pid, kp, nama in cur.fetchall(): blocks.setdefault(k, []).append((pid, kp, nama))
+        for k, members in blocks.items():
+            if len(members) > DEDUPE_BLOCK_MAX: continue   # same rule as dedupe_scan
+            for pid, kp, nama in members:
+                for rid in by_key[k]:
+                    pair = (min(pid, rid), max(pid, rid))
+                    if pid == rid or pair in found: continue
+                    other = profs.get(pid) or others.get(pid) or others.setdefault(pid, _dedupe_profile(kp, nama))
+                    score, reason = _dedupe_score(profs[rid], other)
+                    found[pair] = (score, reason)
+    n = _dedupe_enqueue(conn, [pair + v for pair, v in found.items() if v[0] >= DEDUPE_MIN_SCORE])
+    if n: log.info("%d possible duplicate profil pair(s) queued", n)
+    return n
+
+def _dedupe_check(conn, rec_id, no_kp, nama, queue=True) -> int:
+    # On-insert check for one profile (profil_create/profil_update)
+    return _dedupe_index(conn, [(rec_id, no_kp, nama)], queue)
+
+def dedupe_scan(conn, progress=None, cancel=None) -> Dict[str, Any]:
+    """Batch job: rebuild every profile's blocking keys and queue the candidate pairs found."""
+    t0 = time.perf_counter(); prof, blocks = {}, {}
+    for _cols, rows in iter_query_chunks(conn, "SELECT id, no_kp, nama FROM profil_pk_wm"):
+        if cancel is not None and cancel.is_set():
+            if hasattr(conn, "invalidate"): conn.invalidate()
+            raise OperationCancelled("dedupe_scan")
+        for rid, kp, nama in rows:
+            p = prof[rid] = _dedupe_profile(kp, nama)
+            for k in p[3]: blocks.setdefault(k, []).append(rid)
+        if progress: progress(len(prof), None)
+    pairs, skipped = set(), 0
+    for ids in blocks.values():
+        if len(ids) > DEDUPE_BLOCK_MAX: skipped += 1; continue
+        pairs.update(itertools.combinations(sorted(ids), 2))
+    found = []
+    for a, b in pairs:
+        score, reason = _dedupe_score(prof[a], prof[b])
+        if score >= DEDUPE_MIN_SCORE: found.append((a, b, score, reason))
+    cur = conn.cursor(); _begin(conn)
+    cur.execute("DELETE FROM profil_dedupe_keys")
+    keys = [(k, rid) for rid, p in prof.items() for k in p[3]]
+    for i in range(0, len(keys), IMPORT_BATCH):
+        cur.executemany("INSERT INTO profil_dedupe_keys (k, profil_id) VALUES (%s,%s)", keys[i:i + IMPORT_BATCH])
+    cur.execute("DELETE FROM profil_dedupe WHERE status='baru' AND (keep_id NOT IN (SELECT id FROM profil_pk_wm) "
+                "OR dup_id NOT IN (SELECT id FROM profil_pk_wm))")
+    queued = _dedupe_enqueue(conn, found)
+    conn.commit()
+    if skipped: log.info("Dedupe scan skipped %d block(s) larger than %d profiles", skipped, DEDUPE_BLOCK_MAX)
+    return {"profiles": len(prof), "blocks": len(blocks), "skipped_blocks": skipped, "compared": len(pairs),
+            "found": len(found), "queued": queued, "seconds": round(time.perf_counter() - t0, 2)}
+
+def dedupe_queue(conn, status="baru", limit=MAX_PAGE_SIZE):
+    cur = conn.cursor()
+    cur.execute("SELECT d.id, d.score, d.reason, d.status, d.keep_id, a.nama AS keep_nama, a.no_kp AS keep_no_kp, a.unit AS keep_unit, "
+                "d.dup_id, b.nama AS dup_nama, b.no_kp AS dup_no_kp, b.unit AS dup_unit FROM profil_dedupe d "
+                "LEFT JOIN profil_pk_wm a ON a.id=d.keep_id LEFT JOIN profil_pk_wm b ON b.id=d.dup_id "
+                "WHERE d.status=%s ORDER BY d.score DESC, d.id LIMIT %s", (status, max(1, min(int(limit), MAX_PAGE_SIZE))))
+    return result_set(cur)
+
+def dedupe_reject(conn, pair_id, user=None) -> bool:
+    cur = conn.cursor()
+    cur.execute("UPDATE profil_dedupe SET status='ditolak', decided_at=%s, decided_by=%s WHERE id=%s AND status='baru'",
+                (dialect_of(conn).timestamp_param(datetime.now()), user, pair_id))
+    conn.commit(); return cur.rowcount > 0
+
+def profil_merge(conn, pair_id, keep_id=None, user=None) -> Dict[str, Any]:
+    """Merge a queued pair into `keep_id` (default: the older profile) and delete the other one.
+
+    Blank fields of the kept profile are filled from the duplicate (tarikh_masuk takes the earlier
+    date), and engine-module records filed under the duplicate's no_kp move to the kept no_kp.
+    """
+    cur = conn.cursor(); cur.execute("SELECT keep_id, dup_id, status FROM profil_dedupe WHERE id=%s", (pair_id,)); found = cur.fetchall()
+    if not found: raise KeyError(f"Pasangan pendua {pair_id} tiada")
+    a, b, status = found[0]
+    if status != "baru": raise ValueError(f"Pasangan pendua {pair_id} sudah {status}")
+    keep = int(keep_id or a)
+    if keep not in (a, b): raise ValueError(f"Profil {keep} bukan sebahagian pasangan {pair_id}")
+    dup = b if keep == a else a
+    cur.execute("SELECT * FROM profil_pk_wm WHERE id IN (%s,%s)", (keep, dup)); got = {r["id"]: r for r in result_set(cur)}
+    if len(got) < 2: raise ValueError("Salah satu profil sudah dipadam")
+    k, d = got[keep], got[dup]
+    fill = {c: d[c] for c in PROFIL_MERGE_FILL if k[c] in (None, "") and d[c] not in (None, "")}
+    if k["tarikh_masuk"] and d["tarikh_masuk"] and str(d["tarikh_masuk"]) < str(k["tarikh_masuk"]): fill["tarikh_masuk"] = d["tarikh_masuk"]
+    _begin(conn)
+    _dashboard_delta(conn, "profil_pk_wm", "id IN (%s,%s)", (keep, dup), -1)
+    cur.execute("DELETE FROM profil_pk_wm WHERE id=%s", (dup,))
+    if fill: cur.execute(f"UPDATE profil_pk_wm SET {','.join(f'{c}=%s' for c in fill)} WHERE id=%s", list(fill.values()) + [keep])
+    _dashboard_delta(conn, "profil_pk_wm", "id=%s", (keep,), 1)
+    _log_change(cur, "profil_pk_wm", [dup], "delete")
+    if fill: _log_change(cur, "profil_pk_wm", [keep], "upsert")
+    moved = {}
+    for m in _ENGINE_MODULES.values():
+        if "no_kp" not in m["cols"] or d["no_kp"] == k["no_kp"]: continue
+        cur.execute(f"SELECT id FROM {m['table']} WHERE no_kp=%s", (d["no_kp"],)); ids = [r[0] for r in cur.fetchall()]
+        if ids: moved[m["table"]] = _bulk_update(conn, m["table"], ids, {"no_kp": k["no_kp"]}, ("no_kp",))
+    cur.execute("DELETE FROM profil_dedupe_keys WHERE profil_id=%s", (dup,))
+    if "nama" in fill: _dedupe_check(conn, keep, k["no_kp"], fill["nama"], queue=False)
+    # Other pending pairs with the deleted profile are dropped; the next scan pairs the kept one again if needed
+    cur.execute("DELETE FROM profil_dedupe WHERE status='baru' AND id<>%s AND (keep_id=%s OR dup_id=%s)", (pair_id, dup, dup))
+    cur.execute("UPDATE profil_dedupe SET status='digabung', keep_id=%s, dup_id=%s, decided_at=%s, decided_by=%s WHERE id=%s",
+                (keep, dup, dialect_of(conn).timestamp_param(datetime.now()), user, pair_id))
     conn.commit()
+    log.info("Merged profil %s into %s (%s)", dup, keep, ", ".join(f"{t}: {n}" for t, n in moved.items()) or "no linked records")
+    return {"keep_id": keep, "dup_id": dup, "filled": sorted(fill), "moved": moved}
+
+# Placeholder tables as first created by the baseline migration (m007 gives them their columns)
+def _ensure_simple_table(conn, table_name: str):
+    _create_table(conn, f"CREATE TABLE IF NOT EXISTS {table_name} (id INT AUTO_INCREMENT PRIMARY KEY) ENGINE=InnoDB;")
+
+# ---------------- Module engine ----------------
+# Modules declared in MODULE_SPECS with "table"/"columns"/"indexes" get their DDL, CRUD, list,
+# page, search, change feed, bulk edit and export generated here. Column types:
+#   str (size), text, int, decimal, date, enum (choices); flags: required, unique, search.
+# Statements are built once at registration and run through execute_prepared().
+_MODULE_TYPES = {"str": lambda c: f"VARCHAR({int(c.get('size', 120))})", "text": lambda c: "TEXT", "int": lambda c: "INT",
+                 "decimal": lambda c: "DECIMAL(12,2)", "date": lambda c: "DATE",
+                 "enum": lambda c: "ENUM(" + ",".join(f"'{v}'" for v in c["choices"]) + ")"}
+_ENGINE_MODULES: Dict[str, Dict[str, Any]] = {}
+
+def register_module(key: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    t = spec["table"]; cols = [c["name"] for c in spec["columns"]]
+    for name in [t] + cols + [i[0] for i in spec.get("indexes", ())]:
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", name): raise ValueError(f"Invalid identifier in module {key}: {name!r}")
+    for c in spec["columns"]:
+        if c.get("type", "str") not in _MODULE_TYPES: raise ValueError(f"Unknown column type in {key}.{c['name']}: {c.get('type')}")
+    m = {"key": key, "table": t, "columns": spec["columns"], "cols": cols, "indexes": spec.get("indexes", ()),
+         "search": [c["name"] for c in spec["columns"] if c.get("search")], "exact": spec.get("search_exact"),
+         "bulk": [f[0] for f in spec.get("bulk_fields", ())],
+         "insert_sql": f"INSERT INTO {t} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(cols))})",
+         "delete_sql": f"DELETE FROM {t} WHERE id=%s", "list_sql": f"SELECT * FROM {t} ORDER BY id DESC"}
+    _ENGINE_MODULES[key] = m
+    return m
+
+def _module_column_ddl(c, nullable=False) -> str:
+    ddl = _MODULE_TYPES[c.get("type", "str")](c)
+    if c.get("choices"): ddl += f" DEFAULT '{c['choices'][0]}'"
+    return ddl + (" NOT NULL" if c.get("required") and not nullable else "")
+
+def module_ensure_table(conn, m):
+    t = m["table"]
+    _create_table(conn, f"CREATE TABLE IF NOT EXISTS {t} (id INT AUTO_INCREMENT PRIMARY KEY, "
+                        + "".join(f"{c['name']} {_module_column_ddl(c)}, " for c in m["columns"])
+                        + "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;")
+    # Tables that already exist (the old id-only placeholders) get the missing columns, NULL-able so ALTER works on filled tables
+    for c in m["columns"]: _ensure_column(conn, t, c["name"], _module_column_ddl(c, nullable=True))
+    _ensure_column(conn, t, "created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    _ensure_updated_at(conn, t)
+    for c in m["columns"]:
+        if c.get("unique"): _ensure_index(conn, t, f"uq_{c['name']}", f"UNIQUE INDEX uq_{c['name']} ({c['name']})")
+    for name, cols in m["indexes"]: _ensure_index(conn, t, name, f"INDEX {name} ({', '.join(cols)})")
+    if m["search"]: _ensure_index(conn, t, f"ft_{t}", f"FULLTEXT INDEX ft_{t} ({', '.join(m['search'])})")
+
+def module_ensure_tables(conn):
+    for m in _ENGINE_MODULES.values(): module_ensure_table(conn, m)
+
+def _module_clean(m, data, partial=False) -> Dict[str, Any]:
+    # Typed, validated values for the module's columns; unknown keys (e.g. id) are ignored
+    row = {}
+    for c in m["columns"]:
+        name, label, kind = c["name"], c.get("label", c["name"]), c.get("type", "str")
+        if name not in data:
+            if not partial: row[name] = c["choices"][0] if c.get("choices") else None
+            continue
+        v = data[name]; v = v.strip() if isinstance(v, str) else v
+        if v in (None, ""): v = None
+        elif kind == "date":
+            try: v = _parse_date(v)
+            except ValueError: raise ValueError(f"{label} tidak sah: {v!r}") from None
+        elif kind in ("int", "decimal"):
+            try: v = int(v) if kind == "int" else Decimal(str(v).replace(",", ""))
+            except (ValueError, InvalidOperation): raise ValueError(f"{label} mesti nombor: {v!r}") from None
+        elif kind == "enum" and v not in c["choices"]:
+            raise ValueError(f"{label} tidak sah: {v!r} (pilihan: {', '.join(c['choices'])})")
+        elif kind == "str" and len(str(v)) > int(c.get("size", 120)):
+            raise ValueError(f"{label} melebihi {c.get('size', 120)} aksara")
+        row[name] = v
+    for c in m["columns"]:
+        if c.get("required") and c["name"] in row and row[c["name"]] is None:
+            raise ValueError(f"Medan {c.get('label', c['name'])} wajib")
+    return row
+
+def _module_log(conn, table, rec_id, op):
+    execute_prepared(conn, "INSERT INTO change_log (tbl, row_id, op) VALUES (%s,%s,%s)", (table, int(rec_id), op))
+
+def module_create(conn, m, data):
+    row = _module_clean(m, data)
+    _begin(conn); rec_id = execute_prepared(conn, m["insert_sql"], [row[c] for c in m["cols"]]).lastrowid
+    _module_log(conn, m["table"], rec_id, "upsert")
+    conn.commit(); return rec_id
+
+def module_update(conn, m, rec_id, data):
+    row = _module_clean(m, data, partial=True)
+    if not row: return False
+    fields = [c for c in m["cols"] if c in row]
+    _begin(conn)
+    ok = execute_prepared(conn, f"UPDATE {m['table']} SET {','.join(f'{k}=%s' for k in fields)} WHERE id=%s",
+                          [row[k] for k in fields] + [rec_id]).rowcount > 0
+    if ok: _module_log(conn, m["table"], rec_id, "upsert")
+    conn.commit(); return ok
+
+def module_delete(conn, m, rec_id):
+    _begin(conn); ok = execute_prepared(conn, m["delete_sql"], (rec_id,)).rowcount > 0
+    if ok: _module_log(conn, m["table"], rec_id, "delete")
+    conn.commit(); return ok
 
-def simple_list(conn, table_name: str):
-    cur = conn.cursor(); cur.execute(f"SELECT * FROM {table_name}"); return rows_to_dicts(cur)
+def module_update_many(conn, m, ids, data) -> int:
+    _begin(conn); n = _bulk_update(conn, m["table"], ids, _module_clean(m, data, partial=True), m["bulk"])
+    conn.commit(); return n
+
+def module_delete_many(conn, m, ids) -> int:
+    _begin(conn); n = _bulk_delete(conn, m["table"], ids)
+    conn.commit(); return n
+
+def module_list(conn, m):
+    return result_set(execute_prepared(conn, m["list_sql"]))
+
+def module_page(conn, m, cursor=None, limit=PAGE_SIZE, with_total=False, order=None, desc=True, query=None):
+    where, params = ((), ())
+    if (query or "").strip():   # no search columns: nothing matches, as module_search
+        where, params = (_search_where(m["search"], query, m["exact"], dialect_of(conn).fulltext) if m["search"] else None) or (["1=0"], [])
+    return _keyset_page(conn, m["table"], where, params, cursor=cursor, limit=limit, with_total=with_total,
+                        order=_check_order(order, m["cols"]), desc=desc)
+
+def module_search(conn, m, query, limit=PAGE_SIZE):
+    if not m["search"]: return []
+    return _fulltext_search(conn, m["table"], m["search"], query, limit, exact_prefix_col=m["exact"])
+
+def module_select_sql(m, query=None, fulltext=True):
+    return ((_search_sql(m["table"], m["search"], query, exact_prefix_col=m["exact"], fulltext=fulltext) if m["search"] else None)
+            or (m["list_sql"], []))
+
+def module_export_csv(conn, m, path, query=None, **kwargs):
+    return export_query_csv(conn, *module_select_sql(m, query, dialect_of(conn).fulltext), path, **kwargs)
+
+def module_export_pdf(conn, m, path, query=None, title=None, **kwargs):
+    return export_query_pdf(conn, *module_select_sql(m, query, dialect_of(conn).fulltext), path, title or m["key"], **kwargs)
+
+def module_changes(conn, m, cursor=None):
+    return changes_since(conn, m["table"], cursor)
+
+@lru_cache(maxsize=None)
+def module_op(key: str, op: str):
+    # conn-first function for one module; named <key>_<op> so metrics and the result cache keep modules apart
+    fn = globals()[f"module_{op}"]
+    def bound(conn, *args, **kwargs): return fn(conn, _ENGINE_MODULES[key], *args, **kwargs)
+    bound.__name__ = f"{key}_{op}"
+    return bound
 
 # ---------------- Users / Roles ----------------
 ROLE_PERMISSIONS = {
@@ -226,8 +2121,7 @@ def _hpw(pw: str) -> str:
     return hashlib.sha256(pw.encode("utf-8")).hexdigest()
 
 def ensure_users_table(conn):
-    cur = conn.cursor()
-    cur.execute("""
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS users (
             id INT AUTO_INCREMENT PRIMARY KEY,
             username VARCHAR(100) UNIQUE NOT NULL,
@@ -236,15 +2130,16 @@ def ensure_users_table(conn):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """)
-    conn.commit()
     # seed
+    cur = conn.cursor()
     for u,pw,role in [("admin","admin123","admin"), ("alif","alif123","host")]:
         try:
-            cur.execute("INSERT IGNORE INTO users (username, password, role) VALUES (%s,%s,%s)", (u, _hpw(pw), role))
+            cur.execute(f"{dialect_of(conn).insert_ignore} INTO users (username, password, role) VALUES (%s,%s,%s)", (u, _hpw(pw), role))
         except Exception:
             pass
     conn.commit()
 
+@instrumented("login_user", log_args=False)
 def login_user(username: str, password: str) -> Optional[Dict[str, Any]]:
     conn = get_db_connection()
     if not conn:
@@ -259,19 +2154,21 @@ def login_user(username: str, password: str) -> Optional[Dict[str, Any]]:
     finally:
         conn.close()
 
+@instrumented("create_user", log_args=False)
 def create_user(username: str, password: str, role: str = "user") -> bool:
     conn = get_db_connection()
     if not conn:
         return False
     try:
         cur = conn.cursor()
-        cur.execute("INSERT IGNORE INTO users (username, password, role) VALUES (%s,%s,%s)",
+        cur.execute(f"{dialect_of(conn).insert_ignore} INTO users (username, password, role) VALUES (%s,%s,%s)",
                     (username, _hpw(password), role))
         conn.commit()
         return cur.rowcount > 0
     finally:
         conn.close()
 
+@instrumented("delete_user")
 def delete_user(requestor_username: str, username: str) -> bool:
     conn = get_db_connection()
     if not conn:
@@ -290,24 +2187,455 @@ def delete_user(requestor_username: str, username: str) -> bool:
     finally:
         conn.close()
 
-# ---------------- Schema bootstrapping ----------------
-def ensure_schema():
-    _create_database_if_missing()
-    conn = get_db_connection()
-    if not conn:
-        log.error("Could not connect to DB (ensure_schema)")
-        return False
-    try:
-        ensure_users_table(conn)
-        carta_ensure_table(conn)
-        profil_ensure_table(conn)
-        for t in ["bkl_input_table","laporan_jenayah_table","ganjaran_pk_wm_table","rekod_ganjaran_table","jurnal_sed_table"]:
-            _ensure_simple_table(conn, t)
-    finally:
-        conn.close()
-    return True
+# ---------------- Schema migrations ----------------
+# Ordered, idempotent steps recorded in schema_version. Each step only adds what is missing,
+# so re-running one after a partial failure (MySQL DDL is not transactional) is safe.
+def _m001_baseline(conn):
+    ensure_users_table(conn)
+    change_log_ensure_table(conn)
+    carta_ensure_table(conn)
+    profil_ensure_table(conn)
+    for t in ["bkl_input_table","laporan_jenayah_table","ganjaran_pk_wm_table","rekod_ganjaran_table","jurnal_sed_table"]:
+        _ensure_simple_table(conn, t)
+
+def _m002_fulltext(conn):
+    _ensure_index(conn, "carta_organisasi", "ft_carta_search", "FULLTEXT INDEX ft_carta_search (nama, jawatan, unit)")
+    _ensure_index(conn, "profil_pk_wm", "ft_profil_search", "FULLTEXT INDEX ft_profil_search (nama, no_kp, unit)")
+
+def _m003_change_tracking(conn):
+    _ensure_updated_at(conn, "carta_organisasi")
+    _ensure_updated_at(conn, "profil_pk_wm")
+
+def _m004_list_indexes(conn):
+    # Match the real filters: keyset pages are "WHERE <filter> AND id < ? ORDER BY id DESC"
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_unit", "INDEX idx_profil_unit (unit, id)")
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_status_unit", "INDEX idx_profil_status_unit (status, unit, id)")
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_nama", "INDEX idx_profil_nama (nama)")
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_tarikh_masuk", "INDEX idx_profil_tarikh_masuk (tarikh_masuk)")
+    _ensure_index(conn, "carta_organisasi", "idx_carta_supervisor", "INDEX idx_carta_supervisor (supervisor_id)")
+    _ensure_index(conn, "carta_organisasi", "idx_carta_unit", "INDEX idx_carta_unit (unit, id)")
+
+def _m005_supervisor_fk(conn):
+    # SQLite cannot add constraints to an existing table; carta_delete nulls subordinates itself
+    if not dialect_of(conn).alter_foreign_keys: return
+    if _fk_exists(conn, "carta_organisasi", "fk_carta_supervisor"): return
+    cur = conn.cursor()
+    # Existing rows may point at deleted supervisors; the constraint cannot be added until they are cleared
+    cur.execute("UPDATE carta_organisasi c LEFT JOIN carta_organisasi s ON s.id=c.supervisor_id "
+                "SET c.supervisor_id=NULL WHERE c.supervisor_id IS NOT NULL AND s.id IS NULL")
+    if cur.rowcount: log.warning("Cleared %d dangling carta_organisasi.supervisor_id values", cur.rowcount)
+    conn.commit()
+    cur.execute("ALTER TABLE carta_organisasi ADD CONSTRAINT fk_carta_supervisor FOREIGN KEY (supervisor_id) "
+                "REFERENCES carta_organisasi(id) ON DELETE SET NULL")
+    conn.commit()
+
+def _m006_profil_filter_indexes(conn):
+    # Rekod Profil combines filters; unit is the usual leading one, with a name prefix or a tarikh_masuk range
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_unit_nama", "INDEX idx_profil_unit_nama (unit, nama)")
+    _ensure_index(conn, "profil_pk_wm", "idx_profil_unit_masuk", "INDEX idx_profil_unit_masuk (unit, tarikh_masuk)")
+
+def _m007_module_engine(conn):
+    # The id-only placeholder tables become the MODULE_SPECS engine modules (columns, indexes, updated_at).
+    # A later change to a module's columns/indexes is applied by a new step calling module_ensure_tables again.
+    module_ensure_tables(conn)
+
+def _m008_dashboard(conn):
+    dashboard_ensure_table(conn)
+    dashboard_rebuild(conn)
+
+def _m009_dedupe(conn):
+    # The initial scan fills profil_dedupe_keys, which the on-insert check in profil_create looks up
+    dedupe_ensure_tables(conn)
+    dedupe_scan(conn)
+
+MIGRATIONS = [
+    (1, "baseline tables and seed users", _m001_baseline),
+    (2, "FULLTEXT search indexes", _m002_fulltext),
+    (3, "updated_at change tracking", _m003_change_tracking),
+    (4, "secondary indexes for list queries", _m004_list_indexes),
+    (5, "carta_organisasi.supervisor_id foreign key", _m005_supervisor_fk),
+    (6, "composite indexes for combined profil filters", _m006_profil_filter_indexes),
+    (7, "schema-driven modules: BKL, laporan jenayah, ganjaran, jurnal SED", _m007_module_engine),
+    (8, "dashboard_counts summary table", _m008_dashboard),
+    (9, "profil duplicate detection keys and merge queue", _m009_dedupe),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn) -> int:
+    """Apply pending migrations in order; returns the resulting schema version."""
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    # Serialise concurrent clients starting at the same time
+    cur = conn.cursor(); dialect = dialect_of(conn)
+    if not dialect.lock(cur, "sed_schema_migrate", 60): raise RuntimeError("Timed out waiting for another client's schema migration")
+    try:
+        cur.execute("SELECT version FROM schema_version"); applied = {r[0] for r in cur.fetchall()}
+        for version, name, step in MIGRATIONS:
+            if version in applied: continue
+            log.info("Applying migration %d: %s", version, name)
+            t0 = time.perf_counter()
+            step(conn)
+            cur.execute("INSERT INTO schema_version (version, name) VALUES (%s,%s)", (version, name)); conn.commit()
+            log.info("Migration %d done in %.2fs", version, time.perf_counter() - t0)
+            applied.add(version)
+        return max(applied) if applied else 0
+    finally:
+        dialect.unlock(cur, "sed_schema_migrate")
+
+def schema_is_current(conn) -> bool:
+    # One round trip on the common launch path: no DDL, no seeds, no migration lock
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version"); version = cur.fetchall()[0][0]
+    except DB_ERRORS:
+        return False   # fresh database: schema_version does not exist yet
+    return version is not None and version >= SCHEMA_VERSION
+
+def ensure_schema(prune=True, timings=None):
+    t0 = time.perf_counter()
+    conn = get_db_connection()
+    if not conn:
+        # Only a brand-new install lacks the database; don't pay for a second connection otherwise
+        try: _create_database_if_missing()
+        except Exception as e: log.warning("Could not create database: %s", e)
+        conn = get_db_connection()
+    if not conn:
+        log.error("Could not connect to DB (ensure_schema)")
+        return False
+    if timings is not None: timings.append(("db_connect", time.perf_counter() - t0))
+    try:
+        t0 = time.perf_counter(); current = schema_is_current(conn)
+        if timings is not None: timings.append(("schema_check", time.perf_counter() - t0))
+        if not current:
+            t0 = time.perf_counter(); migrate(conn)
+            if timings is not None: timings.append(("migrate", time.perf_counter() - t0))
+        if prune:
+            pruned = prune_change_log(conn)
+            if pruned: log.info("Pruned %d change_log rows older than %d days", pruned, CHANGE_LOG_RETENTION_DAYS)
+    finally:
+        conn.close()
+    return True
+
+# EXPLAIN-based check that the hot list queries hit the indexes added above.
+# (On near-empty tables the optimizer may legitimately prefer the primary key.)
+PLAN_CHECKS = [
+    ("profil_page(unit)", "SELECT * FROM profil_pk_wm WHERE unit=%s AND id<%s ORDER BY id DESC LIMIT 201", ("X", 2**31-1), "idx_profil_unit"),
+    ("profil_page(status)", "SELECT * FROM profil_pk_wm WHERE status=%s ORDER BY id DESC LIMIT 201", ("tidak_aktif",), "idx_profil_status_unit"),
+    ("profil_list_inactive", "SELECT * FROM profil_pk_wm WHERE status='tidak_aktif' ORDER BY id DESC", (), "idx_profil_status_unit"),
+    ("profil nama prefix", "SELECT * FROM profil_pk_wm WHERE nama LIKE %s ORDER BY id DESC LIMIT 201", ("ABC%",), "idx_profil_nama"),
+    ("profil_page(unit+nama)", "SELECT * FROM profil_pk_wm WHERE unit=%s AND nama LIKE %s ORDER BY id DESC LIMIT 201", ("X", "ABC%"), "idx_profil_unit_nama"),
+    ("profil_page(order nama)", "SELECT * FROM profil_pk_wm ORDER BY nama ASC, id ASC LIMIT 201", (), "idx_profil_nama"),
+    ("profil_search", "SELECT * FROM profil_pk_wm WHERE MATCH(nama,no_kp,unit) AGAINST (%s IN BOOLEAN MODE) LIMIT 201", ("+abc*",), "ft_profil_search"),
+    ("profil no_kp prefix", "SELECT * FROM profil_pk_wm WHERE no_kp LIKE %s ORDER BY id DESC LIMIT 201", ("9001%",), "no_kp"),
+    ("carta subordinates", "SELECT * FROM carta_organisasi WHERE supervisor_id=%s", (1,), "idx_carta_supervisor"),
+    ("carta_search", "SELECT * FROM carta_organisasi WHERE MATCH(nama,jawatan,unit) AGAINST (%s IN BOOLEAN MODE) LIMIT 201", ("+abc*",), "ft_carta_search"),
+    ("changes_since", "SELECT row_id, MAX(seq) FROM change_log WHERE tbl=%s AND seq>%s GROUP BY row_id", ("profil_pk_wm", 0), "idx_change_tbl_seq"),
+]
+
+def check_query_plans(conn) -> List[Dict[str, Any]]:
+    results = []; cur = conn.cursor(); dialect = dialect_of(conn)
+    for name, sql, params, expected in PLAN_CHECKS:
+        if "MATCH(" in sql and not dialect.fulltext: continue
+        plan = dialect.explain(cur, sql, params)
+        used = [p.get("key") for p in plan]
+        ok = expected in used
+        results.append({"query": name, "expected": expected, "key": ",".join(str(k) for k in used), "type": plan[0].get("type") if plan else None,
+                        "rows": plan[0].get("rows") if plan else None, "ok": ok})
+        if not ok: log.warning("Query plan check: %s uses %s, expected %s", name, used, expected)
+    return results
+
+# ---------------- PDF report engine ----------------
+# Column widths are measured from a sample, headers and page numbers repeat on every page,
+# rows stream from the DB in chunks and each page is drawn through a single text object.
+# Large reports are split into page-aligned parts rendered by worker processes and merged
+# (needs pypdf; without it the report is rendered in-process).
+def _require_reportlab():
+    rl = _reportlab()
+    if rl is None:
+        raise RuntimeError("reportlab tiada. Jalankan: pip install reportlab")
+    return rl
+
+def _pdf_writer_cls():
+    try:
+        from pypdf import PdfWriter
+        return PdfWriter
+    except Exception:
+        return None
+
+def _pdf_cell(v) -> str:
+    return "" if v is None else str(v).replace("\r", " ").replace("\n", " ")[:300]
+
+@lru_cache(maxsize=8192)   # repeated values (unit, pangkat, status...) are measured once
+def _pdf_fit(text: str, width: float, font: str, size: float) -> str:
+    # Helvetica glyphs are 0.19-1.0 em wide: skip measuring when the answer is certain
+    if len(text) * size <= width: return text
+    text = text[:int(width / (0.19 * size)) + 1]; stringWidth = _reportlab().stringWidth
+    if stringWidth(text, font, size) <= width: return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if stringWidth(text[:mid] + "...", font, size) <= width: lo = mid
+        else: hi = mid - 1
+    return text[:lo] + "..."
+
+def pdf_layout(cols, sample_rows, title="Laporan") -> Dict[str, Any]:
+    # Plain dict so it can be shipped to worker processes
+    rl = _require_reportlab(); stringWidth = rl.stringWidth
+    page_w, page_h = rl.landscape(rl.A4); margin = 36.0; size = 8.0; pad = 3.0
+    natural = []
+    for i, c in enumerate(cols):
+        ws = sorted(stringWidth(_pdf_cell(r[i]), "Helvetica", size) for r in sample_rows)
+        p90 = ws[min(len(ws) - 1, int(len(ws) * 0.9))] if ws else 0.0
+        natural.append(max(stringWidth(str(c), "Helvetica-Bold", size), min(p90, PDF_MAX_COL_W), 24.0) + 2 * pad)
+    avail = page_w - 2 * margin
+    scale = min(1.0, avail / sum(natural)) if natural else 1.0
+    size = max(PDF_MIN_FONT, size * scale); row_h = size + 4.0
+    header_y = page_h - margin - 30.0; first_y = header_y - row_h - 2.0
+    return {"title": title, "cols": [str(c) for c in cols], "widths": [w * scale for w in natural],
+            "pagesize": (page_w, page_h), "margin": margin, "pad": pad, "size": size, "row_h": row_h,
+            "header_y": header_y, "first_y": first_y,
+            "rows_per_page": int((first_y - (margin + 12.0)) // row_h) + 1,
+            "generated": datetime.now().strftime("%Y-%m-%d %H:%M")}
+
+def _pdf_render_rows(path, layout, chunks, first_page=1, total_pages=None, progress=None, cancel=None, total_rows=None) -> int:
+    c = _require_reportlab().canvas.Canvas(str(path), pagesize=layout["pagesize"]); c.setTitle(layout["title"])
+    page_w, page_h = layout["pagesize"]; m = layout["margin"]; pad = layout["pad"]; size = layout["size"]
+    xs = []; x = m
+    for w in layout["widths"]: xs.append(x); x += w
+    headers = [_pdf_fit(h, w - 2 * pad, "Helvetica-Bold", size) for h, w in zip(layout["cols"], layout["widths"])]
+    fits = [w - 2 * pad for w in layout["widths"]]
+    rpp = layout["rows_per_page"]; page = first_page; n = 0; done = 0; text = None
+
+    def start_page():
+        c.setFont("Helvetica-Bold", 12); c.drawString(m, page_h - m - 12, layout["title"])
+        c.setFont("Helvetica-Bold", size)
+        for hx, h in zip(xs, headers): c.drawString(hx + pad, layout["header_y"], h)
+        c.line(m, layout["header_y"] - 3, page_w - m, layout["header_y"] - 3)
+        t = c.beginText(); t.setFont("Helvetica", size); return t
+
+    def end_page(t):
+        c.drawText(t); c.setFont("Helvetica", 7)
+        c.drawString(m, m / 2, f"Dijana: {layout['generated']}")
+        c.drawRightString(page_w - m, m / 2, f"Muka {page} / {total_pages}" if total_pages else f"Muka {page}")
+        c.showPage()
+
+    for _cols, rows in chunks:
+        if cancel is not None and cancel.is_set(): raise ExportCancelled(path)
+        for r in rows:
+            if n == 0: text = start_page()
+            y = layout["first_y"] - n * layout["row_h"]
+            for i, v in enumerate(r):
+                text.setTextOrigin(xs[i] + pad, y); text.textOut(_pdf_fit(_pdf_cell(v), fits[i], "Helvetica", size))
+            n += 1
+            if n == rpp: end_page(text); page += 1; n = 0
+        done += len(rows)
+        if progress: progress(done, total_rows)
+    if n or page == first_page:
+        end_page(text or start_page())
+    c.save()
+    return done
+
+_ID_ORDER = re.compile(r"\s+ORDER\s+BY\s+id\s+(ASC|DESC)\s*$", re.I)
+
+class _FlagFile:
+    # Cancel flag the worker processes can see: set() creates the file, is_set() checks for it
+    def __init__(self, path): self.path = path
+    def set(self): open(self.path, "w").close()
+    def is_set(self): return os.path.exists(self.path)
+
+def _pdf_render_part(db_cfg, sql, params, lo, hi, layout, out_path, first_page, total_pages, cancel) -> int:
+    # Runs in a worker process: own connection, the rows with lo <= id <= hi
+    conn = connect_db(db_cfg)
+    try:
+        return _pdf_render_rows(out_path, layout, iter_query_chunks(conn, sql, list(params) + [lo, hi]), first_page, total_pages, cancel=cancel)
+    finally:
+        try: conn.close()
+        except DB_ERRORS: pass   # abandoned unbuffered read after a cancel
+
+def _pdf_id_ranges(conn, base, params, direction, part_rows) -> List[List[int]]:
+    # One pass over the ids in output order on the calling connection: [first id, last id, rows] per part
+    ranges = []; n = 0
+    for _cols, rows in iter_query_chunks(conn, f"SELECT id FROM ({base}) q ORDER BY id {direction}", params):
+        for (rid,) in rows:
+            if n % part_rows == 0: ranges.append([rid, rid, 0])
+            ranges[-1][1] = rid; ranges[-1][2] += 1; n += 1
+    return ranges
+
+def export_query_pdf(conn, sql: str, params, path: str, title="Laporan", progress=None, cancel=None, workers=None) -> int:
+    """Render the result of `sql` as a PDF report at `path`; returns the number of rows rendered.
+
+    A large result ordered by id is rendered in parallel: one pass over its ids on `conn` cuts it
+    into id ranges of whole pages, and each worker process renders one range (WHERE id BETWEEN)
+    from its own connection to the same database. The parts are joined into path.part, which
+    replaces `path` when complete.
+    """
+    _require_reportlab()
+    params = list(params)
+    cur = conn.cursor(); cur.execute(sql + " LIMIT %s", params + [PDF_SAMPLE_ROWS])
+    cols = [d[0] for d in cur.description]; sample = cur.fetchall()
+    layout = pdf_layout(cols, sample, title); rpp = layout["rows_per_page"]
+    part_pages = max(1, PDF_ROWS_PER_PART // rpp); part_rows = part_pages * rpp
+    workers = min(workers or PDF_MAX_WORKERS, os.cpu_count() or 1)
+    writer_cls = _pdf_writer_cls(); by_id = _ID_ORDER.search(sql); ranges = None
+    if by_id and workers >= 2 and writer_cls is not None and len(sample) >= PDF_SAMPLE_ROWS:
+        ranges = _pdf_id_ranges(conn, sql[:by_id.start()], params, by_id.group(1).upper(), part_rows)
+        total = sum(r[2] for r in ranges)
+    else:
+        total = count_query(conn, sql, params)
+    total_pages = max(1, -(-total // rpp)); tmp = f"{path}.part"; t0 = time.perf_counter()
+    if ranges is None or total < PDF_PARALLEL_MIN:
+        workers = 1
+        try:
+            done = _pdf_render_rows(tmp, layout, iter_query_chunks(conn, sql, params), 1, total_pages, progress, cancel, total)
+            os.replace(tmp, path)
+        except BaseException:
+            if hasattr(conn, "invalidate"): conn.invalidate()
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+    else:
+        workers = min(workers, len(ranges)); parts = [f"{path}.part{k}" for k in range(len(ranges))]
+        flag = _FlagFile(f"{path}.cancel"); db_cfg = conn_config(conn)
+        part_sql = f"SELECT * FROM ({sql[:by_id.start()]}) q WHERE id BETWEEN %s AND %s ORDER BY id {by_id.group(1).upper()}"
+        ex = ProcessPoolExecutor(max_workers=workers); done = 0
+        try:
+            pending = {ex.submit(_pdf_render_part, db_cfg, part_sql, params, min(a, b), max(a, b), layout,
+                                 parts[k], k * part_pages + 1, total_pages, flag) for k, (a, b, _n) in enumerate(ranges)}
+            while pending:
+                finished, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set(): raise ExportCancelled(path)
+                for f in finished: done += f.result()
+                if finished and progress: progress(done, total)
+            w = writer_cls()
+            for part in parts: w.append(part)
+            with open(tmp, "wb") as f: w.write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            flag.set()   # running workers stop at their next chunk
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
+            for part in parts + [flag.path]:
+                try: os.remove(part)
+                except OSError: pass
+    log.info("PDF report %s: %d rows, %d pages, %d worker(s), %.1fs", path, done, total_pages, workers, time.perf_counter() - t0)
+    return done
+
+# ---------------- Background DB worker ----------------
+class DBWorker:
+    """Runs data-layer calls on a thread pool and hands results back to Tk via after().
+
+    Requests submitted under the same `key` supersede each other: a newer request
+    cancels the older one if it has not started yet and its result is dropped, so
+    a stale search can never overwrite a newer one. Callbacks always run on the
+    Tk thread and are skipped when their widget has been destroyed meanwhile.
+    """
+    POLL_MS = 20
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sed-db")
+        self._results = queue.SimpleQueue()
+        self._latest = {}; self._futures = {}
+        self._pending = 0; self._host = None   # Tk-thread only
+
+    def submit(self, widget, fn, *args, on_done=None, on_error=None, key=None, **kwargs):
+        token = object()
+        if key is not None:
+            old = self._futures.pop(key, None)
+            if old is not None and old.cancel(): self._pending -= 1
+            self._latest[key] = token
+        self._pending += 1
+        fut = self._executor.submit(self._run, token, key, widget, fn, args, kwargs, on_done, on_error)
+        if key is not None: self._futures[key] = fut
+        self._ensure_polling(widget)
+        return token
+
+    def cancel(self, key):
+        self._latest.pop(key, None)
+        fut = self._futures.pop(key, None)
+        if fut is not None and fut.cancel(): self._pending -= 1
+
+    def post(self, widget, fn, *args):
+        # Thread-safe: schedule fn(*args) on the Tk thread (e.g. progress updates from a running job)
+        self._results.put(("post", None, None, widget, fn, args))
+
+    def _run(self, token, key, widget, fn, args, kwargs, on_done, on_error):
+        try:
+            result = fn(*args, **kwargs)
+        except OperationCancelled as e:
+            log.info("%s: %s", type(e).__name__, e)
+            self._results.put(("error", token, key, widget, on_error, (e,)))
+        except Exception as e:
+            log.exception("Background DB call %s failed", getattr(fn, "__name__", fn))
+            self._results.put(("error", token, key, widget, on_error, (e,)))
+        else:
+            self._results.put(("done", token, key, widget, on_done, (result,)))
+
+    @staticmethod
+    def _alive(widget):
+        try: return bool(widget.winfo_exists())
+        except tk.TclError: return False
+
+    def _ensure_polling(self, widget):
+        if self._host is not None and self._alive(self._host): return
+        self._host = widget.winfo_toplevel()
+        self._host.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        while True:
+            try: kind, token, key, widget, cb, args = self._results.get_nowait()
+            except queue.Empty: break
+            if kind != "post":
+                self._pending -= 1
+                if key is not None:
+                    if self._latest.get(key) is not token: continue   # superseded
+                    self._latest.pop(key, None); self._futures.pop(key, None)
+            if cb is None or not self._alive(widget): continue
+            try: cb(*args)
+            except Exception: log.exception("DB worker callback failed")
+        if self._pending > 0 and self._alive(self._host):
+            self._host.after(self.POLL_MS, self._poll)
+        else:
+            self._host = None
+
+_WORKER: Optional[DBWorker] = None
+
+def get_worker() -> DBWorker:
+    global _WORKER
+    if _WORKER is None:
+        _WORKER = DBWorker(max_workers=POOL_CONFIG["size"])
+    return _WORKER
 
 # ---------------- GUI utils ----------------
+class ProgressDialog(ctk.CTkToplevel):
+    # Progress window for long background jobs; the job polls cancel_event between chunks
+    def __init__(self, master, title="Proses"):
+        super().__init__(master); self.title(title); self.geometry("380x150"); self.resizable(False, False)
+        self.cancel_event = threading.Event()
+        self.label = ctk.CTkLabel(self, text="Memulakan..."); self.label.pack(padx=12, pady=(16,6))
+        self.bar = ctk.CTkProgressBar(self, width=320); self.bar.set(0); self.bar.pack(padx=12, pady=6)
+        self.btn = ctk.CTkButton(self, text="Batal", command=self.cancel); self.btn.pack(pady=(6,12))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def cancel(self):
+        self.cancel_event.set(); self.btn.configure(state="disabled", text="Membatalkan...")
+
+    def update_progress(self, done, total=None, text=None):
+        if total: self.bar.set(min(1.0, done / total))
+        self.label.configure(text=text or (f"{done:,} / {total:,} baris" if total else f"{done:,} baris"))
+
+    def reporter(self):
+        # Thread-safe progress(done, total) callback for use inside a DBWorker job
+        worker = get_worker()
+        return lambda done, total=None, text=None: worker.post(self, self.update_progress, done, total, text)
+
 def export_csv(rows: List[Dict[str, Any]], default_name="export.csv"):
     if not rows:
         messagebox.showinfo("Export", "Tiada data untuk diexport.")
@@ -323,7 +2651,7 @@ def export_csv(rows: List[Dict[str, Any]], default_name="export.csv"):
     messagebox.showinfo("Export", f"CSV disimpan: {path}")
 
 def export_pdf(rows: List[Dict[str, Any]], title="Laporan", default_name="export.pdf"):
-    if pdf_canvas is None:
+    if _reportlab() is None:
         messagebox.showerror("Export PDF", "reportlab tiada. Jalankan: pip install reportlab")
         return
     if not rows:
@@ -331,56 +2659,434 @@ def export_pdf(rows: List[Dict[str, Any]], title="Laporan", default_name="export
         return
     path = filedialog.asksaveasfilename(defaultextension=".pdf", initialfile=default_name, filetypes=[("PDF","*.pdf")])
     if not path: return
-    c = pdf_canvas.Canvas(path, pagesize=landscape(A4))
-    c.setFont("Helvetica", 12)
-    c.drawString(50,560,title)
-    y = 520; keys = list(rows[0].keys())
-    for r in rows:
-        x = 50
-        for k in keys:
-            c.drawString(x,y, str(r.get(k,""))[:30]); x += 180
-        y -= 18
-        if y < 50: c.showPage(); y = 560
-    c.save(); messagebox.showinfo("Export", f"PDF disimpan: {path}")
+    keys = list(rows[0].keys()); tuples = [tuple(r.get(k) for k in keys) for r in rows]
+    layout = pdf_layout(keys, tuples[:PDF_SAMPLE_ROWS], title)
+    _pdf_render_rows(path, layout, [(keys, tuples)], total_pages=max(1, -(-len(tuples) // layout["rows_per_page"])))
+    messagebox.showinfo("Export", f"PDF disimpan: {path}")
 
 # ---------------- GUI components ----------------
+def _cell(v) -> str:
+    # Treeview cell text for a typed value
+    if v is None: return ""
+    if isinstance(v, datetime): return v.strftime("%Y-%m-%d %H:%M")
+    if isinstance(v, date): return v.isoformat()
+    return str(v)
+
+def _sort_key(key):
+    # NULLs first, like ORDER BY ... ASC in MySQL/SQLite
+    return lambda r: (r.get(key) is not None, r.get(key))
+
+class VirtualGrid(ctk.CTkFrame):
+    """Treeview that only holds the rows on screen.
+
+    The rows live in a plain list; a fixed pool of Treeview items (one per visible line) is
+    re-bound to rows[top:top+visible] as the user scrolls, so 100k rows cost 100k dicts, not
+    100k Tk items. Selection is kept by row id, independent of the pool.
+    columns: [(key, label, width)]
+    on_need_more(): called when the window comes within `prefetch` rows of the loaded end and has_more is set.
+    on_sort(key, desc): heading click; without it the loaded rows are sorted in memory.
+    on_select(): the selection changed.
+    """
+    def __init__(self, master, columns=(), on_need_more=None, on_sort=None, on_select=None, prefetch=VIRTUAL_PREFETCH):
+        super().__init__(master, fg_color="transparent")
+        self.on_need_more = on_need_more; self.on_sort = on_sort; self.on_select = on_select; self.prefetch = prefetch
+        self.rows = []; self._pos = {}; self._selected = set(); self._anchor = None
+        self.total = None; self.has_more = False; self.sort_key = None; self.sort_desc = False
+        self._top = 0; self._items = []; self._keys = []; self._labels = {}; self._need_job = None
+        self.tree = ttk.Treeview(self, columns=[], show="headings", height=1, selectmode="extended")
+        self.ysb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew"); self.ysb.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1); self.grid_columnconfigure(0, weight=1)
+        # Class bindings would select/scroll pool items, which mean nothing here, so every one is replaced
+        t = self.tree
+        t.bind("<Configure>", lambda e: self._resize(e.height))
+        t.bind("<Button-1>", lambda e: self._click(e, "set"))
+        t.bind("<Control-Button-1>", lambda e: self._click(e, "toggle"))
+        t.bind("<Shift-Button-1>", lambda e: self._click(e, "range"))
+        t.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        t.bind("<Button-4>", lambda e: self.scroll(-3)); t.bind("<Button-5>", lambda e: self.scroll(3))
+        for key, step in (("Up", -1), ("Down", 1), ("Prior", "-page"), ("Next", "page"), ("Home", "home"), ("End", "end")):
+            t.bind(f"<{key}>", lambda e, s=step: self._key(s, False)); t.bind(f"<Shift-{key}>", lambda e, s=step: self._key(s, True))
+        t.bind("<Control-a>", lambda e: (self.select_all(), "break")[1])
+        if columns: self.set_columns(columns)
+
+    # --- rows ---
+    def set_columns(self, columns):
+        self._keys = [c[0] for c in columns]; self._labels = {c[0]: c[1] for c in columns}
+        self.tree.configure(columns=self._keys)
+        for key, label, width in columns: self.tree.heading(key, text=label); self.tree.column(key, width=width, anchor="w")
+        self._headings(); self._render()
+
+    @property
+    def columns_set(self): return bool(self._keys)
+
+    def set_rows(self, rows, has_more=False, total=None):
+        self.rows = list(rows); self._reindex(); self._selected.clear(); self._anchor = None
+        self._top = 0; self.has_more = has_more; self.total = total; self._render(); self._select_event()
+
+    def clear(self): self.set_rows([])
+
+    def append_rows(self, rows, has_more=False):
+        # Rows already present (patched in by a change sync) are replaced in place
+        for r in rows:
+            i = self._pos.get(self._rid(r))
+            if i is None: self._pos[self._rid(r)] = len(self.rows); self.rows.append(r)
+            else: self.rows[i] = r
+        self.has_more = has_more; self._render()
+
+    def upsert_rows(self, rows, at_top=True):
+        """Replace rows with the same id; insert the rest at the top (or drop them). Returns how many were inserted."""
+        new = []
+        for r in rows:
+            i = self._pos.get(self._rid(r))
+            if i is not None: self.rows[i] = r
+            elif at_top: new.append(r)
+        if new: self.rows[:0] = new[::-1]; self._reindex()
+        self._render(); return len(new)
+
+    def remove(self, ids):
+        ids = set(ids) & self._pos.keys()
+        if ids:
+            self.rows = [r for r in self.rows if self._rid(r) not in ids]; self._reindex()
+            self._selected -= ids; self._render(); self._select_event()
+        return len(ids)
+
+    def sort_rows(self, key, desc=False):
+        try: self.rows.sort(key=_sort_key(key), reverse=desc)
+        except TypeError: self.rows.sort(key=lambda r: _cell(r.get(key)), reverse=desc)   # mixed types
+        self._reindex(); self._top = 0; self._render()
+
+    def set_sort(self, key, desc=False):
+        self.sort_key, self.sort_desc = key, desc; self._headings()
+
+    def sort_args(self):
+        # kwargs for a page_fn that sorts server-side; nothing when the default order (id DESC) applies
+        return {"order": self.sort_key, "desc": self.sort_desc} if self.sort_key else {}
+
+    @staticmethod
+    def _rid(r): return r.get("id", id(r))
+
+    def _reindex(self): self._pos = {self._rid(r): i for i, r in enumerate(self.rows)}
+
+    def row(self, rid):
+        i = self._pos.get(rid); return None if i is None else self.rows[i]
+
+    # --- selection (row ids, in row order) ---
+    def selection(self):
+        return sorted(self._selected, key=self._pos.__getitem__)
+
+    @property
+    def selected_count(self): return len(self._selected)
+
+    def select_all(self):
+        self._selected = set(self._pos); self._render(); self._select_event()
+
+    def _select_event(self):
+        if self.on_select: self.on_select()
+
+    def _click(self, e, mode):
+        region = self.tree.identify_region(e.x, e.y)
+        if region == "separator": return None   # let the column be resized
+        if region == "heading":
+            key = self._column_key(self.tree.identify_column(e.x))
+            if key: self._heading_click(key)
+            return "break"
+        self.tree.focus_set(); item = self.tree.identify_row(e.y)
+        if not item: return "break"
+        pos = self._top + self._items.index(item)
+        if pos < len(self.rows): self._pick(pos, mode)
+        return "break"
+
+    def _pick(self, pos, mode):
+        rid = self._rid(self.rows[pos])
+        if mode == "range" and self._anchor is not None:
+            lo, hi = sorted((self._anchor, pos)); self._selected = {self._rid(r) for r in self.rows[lo:hi + 1]}
+        elif mode == "toggle":
+            self._selected ^= {rid}; self._anchor = pos
+        else:
+            self._selected = {rid}; self._anchor = pos
+        self._render(); self._select_event()
+
+    def _key(self, step, extend):
+        if not self.rows: return "break"
+        page = max(1, len(self._items) - 1); cur = self._anchor if self._anchor is not None else self._top
+        pos = {"-page": cur - page, "page": cur + page, "home": 0, "end": len(self.rows) - 1}.get(step, cur + step if isinstance(step, int) else cur)
+        pos = max(0, min(pos, len(self.rows) - 1))
+        if extend and self._anchor is not None:
+            anchor = self._anchor; self._pick(pos, "range"); self._anchor = anchor
+        else: self._pick(pos, "set")
+        if pos < self._top: self.scroll_to(pos)
+        elif pos >= self._top + len(self._items): self.scroll_to(pos - len(self._items) + 1)
+        return "break"
+
+    # --- sorting ---
+    def _column_key(self, col):
+        try: return self._keys[int(col.lstrip("#")) - 1]
+        except (ValueError, IndexError): return None
+
+    def _heading_click(self, key):
+        desc = not self.sort_desc if key == self.sort_key else False
+        self.set_sort(key, desc)
+        if self.on_sort: self.on_sort(key, desc)
+        else: self.sort_rows(key, desc)
+
+    def _headings(self):
+        for k in self._keys:
+            arrow = (" \u25bc" if self.sort_desc else " \u25b2") if k == self.sort_key else ""
+            self.tree.heading(k, text=self._labels[k] + arrow)
+
+    # --- window ---
+    def _extent(self): return max(len(self.rows), self.total or 0)
+
+    def _row_metrics(self):
+        # (heading height, row height) measured from a mapped item; the style's rowheight until then
+        box = self.tree.bbox(self._items[0]) if self._items else ""
+        if box: return box[1], box[3]
+        rh = int(ttk.Style().lookup("Treeview", "rowheight") or 0) or 20
+        return rh + 4, rh
+
+    def _resize(self, height):
+        head, rh = self._row_metrics(); want = max(1, (height - head) // max(1, rh))
+        while len(self._items) < want: self._items.append(self.tree.insert("", "end", values=()))
+        if len(self._items) > want: self.tree.delete(*self._items[want:]); del self._items[want:]
+        self._render()
+
+    def scroll(self, rows):
+        self.scroll_to(self._top + rows); return "break"
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), self._extent() - len(self._items)))
+        if top != self._top: self._top = top; self._render()
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto": self.scroll_to(float(args[0]) * self._extent())
+        elif action == "scroll": self.scroll(int(args[0]) * (max(1, len(self._items) - 1) if args[1] == "pages" else 1))
+
+    def _render(self):
+        n = len(self.rows); extent = self._extent(); shown = len(self._items)
+        self._top = max(0, min(self._top, extent - shown))
+        keys = self._keys; item = self.tree.item; picked = []
+        for i, iid in enumerate(self._items):
+            pos = self._top + i
+            if pos < n:
+                r = self.rows[pos]; item(iid, values=[_cell(r.get(k)) for k in keys])
+                if self._selected and self._rid(r) in self._selected: picked.append(iid)
+            else: item(iid, values=["\u2026"] if pos < extent else ())   # counted but not fetched yet / past the end
+        self.tree.selection_set(picked)
+        self.ysb.set(*((self._top / extent, min(1.0, (self._top + shown) / extent)) if extent else (0.0, 1.0)))
+        if self.has_more and self.on_need_more and self._need_job is None and self._top + shown + self.prefetch >= n:
+            self._need_job = self.after_idle(self._need_more)
+
+    def _need_more(self):
+        self._need_job = None
+        if self.has_more: self.on_need_more()
+
+    def destroy(self):
+        if self._need_job: self.after_cancel(self._need_job); self._need_job = None
+        super().destroy()
+
 class CrudFrame(ctk.CTkFrame):
-    def __init__(self, master, api, fields, title="", combos=None, required=None):
+    def __init__(self, master, api, fields, title="", combos=None, required=None, bulk_fields=None):
         super().__init__(master)
-        self.api = api; self.fields = fields; self.combos = combos or {}; self.required = required or set()
+        self.api = api; self.fields = fields; self.combos = combos or {}; self.required = required or set(); self._title = title
+        self.bulk_fields = bulk_fields or []   # [(name, label)] or [(name, label, choices)] for "Kemaskini Pukal"
         ctk.CTkLabel(self, text=title, font=ctk.CTkFont(size=18, weight="bold")).grid(row=0, column=0, sticky="w", padx=8, pady=(10,0))
 
         toolbar = ctk.CTkFrame(self); toolbar.grid(row=1, column=0, sticky="ew", padx=8, pady=6)
-        self.search_var = tk.StringVar()
-        ctk.CTkEntry(toolbar, textvariable=self.search_var, placeholder_text="Cari...").pack(side="left", padx=4)
+        self.search_var = tk.StringVar(); self._search_job = None
+        search_entry = ctk.CTkEntry(toolbar, textvariable=self.search_var, placeholder_text="Cari...")
+        search_entry.pack(side="left", padx=4); search_entry.bind("<Return>", lambda e: self.refresh())
+        self.search_var.trace_add("write", lambda *a: self._schedule_search())
         ctk.CTkButton(toolbar, text="Cari", command=self.refresh).pack(side="left", padx=4)
         ctk.CTkButton(toolbar, text="Tambah", command=self.open_add).pack(side="left", padx=4)
         ctk.CTkButton(toolbar, text="Edit", command=self.open_edit).pack(side="left", padx=4)
         ctk.CTkButton(toolbar, text="Padam", command=self.delete_selected).pack(side="left", padx=4)
-        ctk.CTkButton(toolbar, text="Export CSV", command=lambda: export_csv(self._all_rows)).pack(side="right", padx=4)
-        ctk.CTkButton(toolbar, text="Export PDF", command=lambda: export_pdf(self._all_rows, title)).pack(side="right", padx=4)
-
-        self.tree = ttk.Treeview(self, columns=[f['name'] for f in self.fields], show='headings')
-        for f in self.fields:
-            self.tree.heading(f['name'], text=f['label'])
-            self.tree.column(f['name'], width=140, anchor="w")
-        self.tree.grid(row=2, column=0, sticky="nsew", padx=8, pady=8)
+        if self.bulk_fields and 'update_many' in self.api:
+            ctk.CTkButton(toolbar, text="Kemaskini Pukal", command=self.open_bulk_edit).pack(side="left", padx=4)
+        if 'import' in self.api:
+            ctk.CTkButton(toolbar, text="Import", command=self.import_file).pack(side="left", padx=4)
+        ctk.CTkButton(toolbar, text="Export CSV", command=self.export_csv).pack(side="right", padx=4)
+        ctk.CTkButton(toolbar, text="Export PDF", command=self.export_pdf).pack(side="right", padx=4)
+
+        self.view = VirtualGrid(self, [(f['name'], f['label'], 140) for f in self.fields], on_need_more=self.load_more,
+                                on_sort=self._on_sort, on_select=self._update_status)
+        self.view.grid(row=2, column=0, sticky="nsew", padx=8, pady=8)
+        statusbar = ctk.CTkFrame(self, fg_color="transparent"); statusbar.grid(row=3, column=0, sticky="ew", padx=8, pady=(0,6))
+        self.status = ctk.CTkLabel(statusbar, text="", anchor="w"); self.status.pack(side="left")
+        self.spinner = ctk.CTkProgressBar(statusbar, mode="indeterminate", width=120)
         self.grid_rowconfigure(2, weight=1); self.grid_columnconfigure(0, weight=1)
-        self._all_rows = []; self.refresh()
+        self._next_cursor = None; self._loading = False; self._paged = False; self._query = None
+        self._key = ("crud", id(self)); self._gen = 0
+        self._change_cursor = None; self._poll_job = None
+        self.refresh()
+
+    @property
+    def _all_rows(self):
+        return list(self.view.rows)
+
+    def destroy(self):
+        for job in (self._poll_job, self._search_job):
+            if job: self.after_cancel(job)
+        self._poll_job = self._search_job = None
+        super().destroy()
+
+    def _set_loading(self, on):
+        self._loading = on
+        if on:
+            self.status.configure(text="Memuatkan..."); self.spinner.pack(side="left", padx=8); self.spinner.start()
+        else:
+            self.spinner.stop(); self.spinner.pack_forget()
+
+    def _schedule_search(self):
+        # Debounce type-ahead: only the last keystroke within SEARCH_DEBOUNCE_MS triggers a query
+        if self._search_job: self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DEBOUNCE_MS, self.refresh)
 
     def refresh(self):
-        for r in self.tree.get_children(): self.tree.delete(r)
+        # Any in-flight list/search/page request for this frame is superseded (same worker key)
+        if self._search_job: self.after_cancel(self._search_job); self._search_job = None
+        self.view.clear(); self._next_cursor = None; self._gen += 1
         query = (self.search_var.get() or "").strip().lower()
-        try:
+        # A search is a filter on the paged list: its matches load page by page like the list does
+        self._query = query or None
+        self._paged = 'page' in self.api
+        if self._paged:
+            self._load_page(None, with_total=True); return
+        if query and 'search' in self.api:
+            self._submit(self._with_head(self.api['search'], query), on_done=self._got_head(self._append_rows), what="Search"); return
+        def list_filtered():
             rows = self.api['list']()
-        except Exception as e:
-            get_logger("CRUD").exception("List failed")
-            rows = []
-        if query:
-            rows = [r for r in rows if any(query in str(v).lower() for v in r.values())]
-        self._all_rows = rows
-        for r in rows:
-            self.tree.insert('', 'end', iid=str(r.get('id','')), values=[r.get(f['name'],"") for f in self.fields])
+            if query:
+                rows = [r for r in rows if any(query in str(v).lower() for v in r.values())]
+            return rows
+        self._submit(self._with_head(list_filtered), on_done=self._got_head(self._append_rows), what="List")
+
+    def _with_head(self, fn, *args, **kwargs):
+        # Read the change cursor *before* the data, so edits made while it loads are replayed by the next sync
+        changes = self.api.get('changes')
+        def job():
+            head = changes()['next_cursor'] if changes else None
+            return head, fn(*args, **kwargs)
+        return job
+
+    def _got_head(self, on_done):
+        def done(result):
+            self._change_cursor, data = result
+            on_done(data); self._schedule_poll()
+        return done
+
+    def _submit(self, fn, *args, on_done, what, **kwargs):
+        def done(result): self._set_loading(False); on_done(result)
+        def failed(e):
+            get_logger("CRUD").error("%s failed: %s", what, e)
+            self._set_loading(False); self._append_rows([])
+        self._set_loading(True)
+        get_worker().submit(self, fn, *args, on_done=done, on_error=failed, key=self._key, **kwargs)
+
+    def load_more(self):
+        if self._next_cursor and not self._loading: self._load_page(self._next_cursor)
+
+    def _load_page(self, cursor, with_total=False):
+        def got(page):
+            if with_total: self.view.total = page.get("total")
+            self._next_cursor = page.get("next_cursor")
+            self._append_rows(page["rows"])
+        sort = self.view.sort_args()
+        if self._query: sort["query"] = self._query
+        if cursor is None:
+            self._submit(self._with_head(self.api['page'], with_total=with_total, **sort), on_done=self._got_head(got), what="Page load")
+        else:
+            self._submit(self.api['page'], cursor=cursor, with_total=with_total, on_done=got, what="Page load", **sort)
+
+    def _on_sort(self, key, desc):
+        # Paged lists and searches are re-read in the new order (keyset on the sort column); list results are all loaded already
+        if self._paged: self.refresh()
+        else: self.view.sort_rows(key, desc)
+
+    def _append_rows(self, rows):
+        self.view.append_rows(rows, has_more=bool(self._next_cursor))
+        if not self._paged and self.view.sort_key: self.view.sort_rows(self.view.sort_key, self.view.sort_desc)
+        self._update_status()
+
+    def _update_status(self):
+        shown = len(self.view.rows); picked = self.view.selected_count; total = self.view.total
+        text = f"{shown} rekod" if total is None else f"{shown} / {total} rekod"
+        self.status.configure(text=f"{text} ({picked} dipilih)" if picked > 1 else text)
+
+    # --- incremental sync: patch only rows that changed (local writes and other users' edits) ---
+    def _schedule_poll(self):
+        if self._poll_job: self.after_cancel(self._poll_job)
+        self._poll_job = self.after(CHANGE_POLL_MS, self.sync_changes) if 'changes' in self.api else None
+
+    def sync_changes(self):
+        self._poll_job = None
+        if self._change_cursor is None or 'changes' not in self.api:
+            self.refresh(); return
+        gen = self._gen
+        def done(ch):
+            if gen == self._gen and not self._loading: self._apply_changes(ch)
+            self._schedule_poll()
+        def failed(e):
+            get_logger("CRUD").warning("Change sync failed: %s", e); self._schedule_poll()
+        get_worker().submit(self, self.api['changes'], self._change_cursor, on_done=done, on_error=failed, key=("changes", id(self)))
+
+    def _apply_changes(self, ch):
+        if ch.get("reset"): self.refresh(); return
+        self._change_cursor = ch["next_cursor"]
+        searching = bool((self.search_var.get() or "").strip())
+        removed = self.view.remove(ch["deletes"])
+        if removed and self.view.total: self.view.total -= removed
+        # Ids are auto-increment, so a row we have never seen is newer than everything loaded
+        # (under a column sort it still goes on top, where the user who just added it will look)
+        added = self.view.upsert_rows(ch["upserts"], at_top=not searching)
+        if added and self.view.total is not None: self.view.total += added
+        if ch["deletes"] or ch["upserts"]: self._update_status()
+
+    def export_csv(self):
+        # Streams the full filtered result set from the DB, not just the pages loaded in the grid
+        if 'export_csv' not in self.api:
+            export_csv(self._all_rows); return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", initialfile="export.csv",
+                                            filetypes=[("CSV","*.csv"),("CSV (gzip)","*.csv.gz")])
+        if path: self._run_export("CSV", self.api['export_csv'], path)
+
+    def export_pdf(self):
+        if 'export_pdf' not in self.api:
+            export_pdf(self._all_rows, self._title); return
+        if _reportlab() is None:
+            messagebox.showerror("Export PDF", "reportlab tiada. Jalankan: pip install reportlab"); return
+        path = filedialog.asksaveasfilename(defaultextension=".pdf", initialfile="export.pdf", filetypes=[("PDF","*.pdf")])
+        if path: self._run_export("PDF", self.api["export_pdf"], path, title=self._title)
+
+    def _run_export(self, kind, fn, path, **kwargs):
+        query = (self.search_var.get() or "").strip() or None
+        dlg = ProgressDialog(self, f"Export {kind}")
+        def done(n): dlg.destroy(); messagebox.showinfo("Export", f"{kind} disimpan ({n:,} baris): {path}")
+        def failed(e):
+            dlg.destroy()
+            if isinstance(e, ExportCancelled): messagebox.showinfo("Export", "Export dibatalkan.")
+            else: messagebox.showerror("Export", f"Gagal export: {e}")
+        get_worker().submit(dlg, fn, path, query, progress=dlg.reporter(), cancel=dlg.cancel_event,
+                            on_done=done, on_error=failed, **kwargs)
+
+    def import_file(self):
+        path = filedialog.askopenfilename(filetypes=[("CSV / Excel","*.csv *.xlsx"),("CSV","*.csv"),("Excel","*.xlsx")])
+        if not path: return
+        dlg = ProgressDialog(self, "Import")
+        def done(rep):
+            dlg.destroy()
+            msg = f"Baru: {rep['inserted']:,}\nDikemaskini: {rep['updated']:,}\nDitolak: {len(rep['rejected']):,}"
+            if rep.get("duplicates"): msg += f"\nKemungkinan pendua untuk disemak: {rep['duplicates']:,}"
+            if rep["rejected"]:
+                try: msg += f"\n\nSenarai ditolak: {write_import_rejects(path, rep['rejected'])}"
+                except OSError as e: msg += f"\n\nGagal simpan senarai ditolak: {e}"
+            messagebox.showinfo("Import", msg); self.refresh()
+        def failed(e):
+            dlg.destroy()
+            if isinstance(e, ImportCancelled): messagebox.showinfo("Import", "Import dibatalkan. Kelompok yang telah disimpan kekal."); self.refresh()
+            else: messagebox.showerror("Import", f"Gagal import: {e}")
+        get_worker().submit(dlg, self.api['import'], path, progress=dlg.reporter(), cancel=dlg.cancel_event,
+                            on_done=done, on_error=failed)
 
     def _collect_form(self, win, entries):
         data = {}
@@ -394,7 +3100,7 @@ class CrudFrame(ctk.CTkFrame):
     def open_add(self): self._open_form(mode="add")
 
     def open_edit(self):
-        sel = self.tree.selection()
+        sel = self.view.selection()
         if not sel: messagebox.showinfo("Info","Sila pilih rekod"); return
         self._open_form(mode="edit", rec_id=int(sel[0]))
 
@@ -407,99 +3113,1106 @@ class CrudFrame(ctk.CTkFrame):
         def save():
             data = self._collect_form(win, entries)
             if data is None: return
-            try:
-                if mode=="add": self.api['create'](data)
-                else: self.api['update'](rec_id, data)
-                win.destroy(); self.refresh()
-            except Exception as e: messagebox.showerror("Ralat", f"Gagal simpan: {e}")
+            btn_save.configure(state="disabled", text="Menyimpan...")
+            def saved(_): win.destroy(); self.sync_changes()
+            def failed(e): btn_save.configure(state="normal", text="Simpan"); messagebox.showerror("Ralat", f"Gagal simpan: {e}")
+            if mode=="add": get_worker().submit(win, self.api['create'], data, on_done=saved, on_error=failed)
+            else: get_worker().submit(win, self.api['update'], rec_id, data, on_done=saved, on_error=failed)
         frm_btn = ctk.CTkFrame(win); frm_btn.pack(fill="x",padx=10,pady=(0,10))
-        ctk.CTkButton(frm_btn, text="Simpan", command=save).pack(side="left",padx=6); ctk.CTkButton(frm_btn, text="Batal", command=win.destroy).pack(side="left",padx=6)
+        btn_save = ctk.CTkButton(frm_btn, text="Simpan", command=save); btn_save.pack(side="left",padx=6); ctk.CTkButton(frm_btn, text="Batal", command=win.destroy).pack(side="left",padx=6)
 
     def delete_selected(self):
-        sel = self.tree.selection(); 
+        sel = self.view.selection()
         if not sel: messagebox.showinfo("Info","Sila pilih rekod"); return
-        if not messagebox.askyesno("Pasti","Padam?"): return
-        try: self.api['delete'](int(sel[0])); self.refresh()
-        except Exception as e: messagebox.showerror("Ralat", f"Gagal padam: {e}")
+        if len(sel) == 1 or 'delete_many' not in self.api:
+            if not messagebox.askyesno("Pasti","Padam?" if len(sel) == 1 else f"Padam {len(sel)} rekod?"): return
+            ids = [int(i) for i in sel]
+            def delete_each(): return sum(1 for i in ids if self.api['delete'](i))
+            job = delete_each
+        else:
+            if not messagebox.askyesno("Pasti", f"Padam {len(sel):,} rekod yang dipilih?\n(satu transaksi: semua atau tiada)"): return
+            job = lambda: self.api['delete_many']([int(i) for i in sel])
+        def done(n):
+            self.sync_changes()
+            if len(sel) > 1: messagebox.showinfo("Padam", f"{n:,} rekod dipadam.")
+        get_worker().submit(self, job, on_done=done, on_error=lambda e: messagebox.showerror("Ralat", f"Gagal padam: {e}"))
+
+    def open_bulk_edit(self):
+        # One field, one value, every selected record, one transaction
+        sel = self.view.selection()
+        if not sel: messagebox.showinfo("Info","Sila pilih rekod"); return
+        ids = [int(i) for i in sel]; spec = {f[0]: f for f in self.bulk_fields}; labels = {f[1]: f[0] for f in self.bulk_fields}
+        win = ctk.CTkToplevel(self); win.title("Kemaskini Pukal"); win.transient(self.winfo_toplevel())
+        frm = ctk.CTkFrame(win); frm.pack(padx=10, pady=10, fill="x")
+        ctk.CTkLabel(frm, text=f"{len(ids):,} rekod dipilih").grid(row=0, column=0, columnspan=2, sticky="w", padx=6, pady=(4,8))
+        ctk.CTkLabel(frm, text="Medan").grid(row=1, column=0, sticky="e", padx=6, pady=4)
+        ctk.CTkLabel(frm, text="Nilai baru").grid(row=2, column=0, sticky="e", padx=6, pady=4)
+        field_var = tk.StringVar(value=self.bulk_fields[0][1]); value_var = tk.StringVar(); holder = {}
+        def show_value(*_):
+            if holder.get("w") is not None: holder["w"].destroy()
+            choices = spec[labels[field_var.get()]][2:]
+            w = (ctk.CTkComboBox(frm, variable=value_var, values=list(choices[0]), width=240, state="readonly") if choices
+                 else ctk.CTkEntry(frm, textvariable=value_var, width=240))
+            value_var.set(choices[0][0] if choices else ""); w.grid(row=2, column=1, sticky="w", padx=6, pady=4); holder["w"] = w
+        ctk.CTkComboBox(frm, variable=field_var, values=list(labels), width=240, state="readonly",
+                        command=show_value).grid(row=1, column=1, sticky="w", padx=6, pady=4)
+        show_value()
+        def apply():
+            name = labels[field_var.get()]; value = value_var.get().strip() or None
+            if not messagebox.askyesno("Pasti", f"Tetapkan {field_var.get()} = {value or '(kosong)'} untuk {len(ids):,} rekod?", parent=win): return
+            btn.configure(state="disabled", text="Menyimpan...")
+            def done(n): win.destroy(); self.sync_changes(); messagebox.showinfo("Kemaskini Pukal", f"{n:,} rekod dikemaskini.")
+            def failed(e): btn.configure(state="normal", text="Simpan"); messagebox.showerror("Ralat", f"Gagal kemaskini: {e}", parent=win)
+            get_worker().submit(win, self.api['update_many'], ids, {name: value}, on_done=done, on_error=failed)
+        frm_btn = ctk.CTkFrame(win); frm_btn.pack(fill="x", padx=10, pady=(0,10))
+        btn = ctk.CTkButton(frm_btn, text="Simpan", command=apply); btn.pack(side="left", padx=6)
+        ctk.CTkButton(frm_btn, text="Batal", command=win.destroy).pack(side="left", padx=6)
+
+PROFIL_RECORD_COLUMNS = [("id","ID",60), ("nama","Nama",220), ("no_kp","No. KP",120), ("pangkat","Pangkat",100), ("unit","Unit",120),
+                         ("telefon","Telefon",110), ("tarikh_masuk","Tarikh Masuk",100), ("status","Status",90)]
 
 class ReadOnlyList(ctk.CTkFrame):
-    def __init__(self, master, fetch_fn, title="", filters=None):
-        super().__init__(master); self.fetch_fn=fetch_fn; self.filters=filters or []
+    # columns: [(key, label, width)]; without it the columns come from the first rows returned.
+    # filters: [(key, label)] entries or [(key, label, choices)] drop-downs ("" = any)
+    def __init__(self, master, fetch_fn, title="", filters=None, page_fn=None, columns=None):
+        super().__init__(master); self.fetch_fn=fetch_fn; self.page_fn=page_fn; self.filters=filters or []
+        self._next_cursor = None; self._loading = False; self._kwargs = {}
         ctk.CTkLabel(self, text=title, font=ctk.CTkFont(size=18, weight="bold")).grid(row=0,column=0,sticky="w",padx=8,pady=(8,4))
         self.filter_vars={}
         if self.filters:
             filt = ctk.CTkFrame(self); filt.grid(row=1,column=0,sticky="ew",padx=8,pady=4)
-            for i,(k,label) in enumerate(self.filters):
+            for i,(k,label,*choices) in enumerate(self.filters):
                 ctk.CTkLabel(filt, text=label).grid(row=0,column=2*i,sticky="e",padx=4)
-                var = tk.StringVar(); ent=ctk.CTkEntry(filt, textvariable=var, width=180); ent.grid(row=0,column=2*i+1,sticky="w",padx=4); self.filter_vars[k]=var
+                var = tk.StringVar()
+                if choices: ent = ctk.CTkComboBox(filt, variable=var, values=[""] + list(choices[0]), width=120, state="readonly")
+                else: ent = ctk.CTkEntry(filt, textvariable=var, width=130); ent.bind("<Return>", lambda _e: self.refresh())
+                ent.grid(row=0,column=2*i+1,sticky="w",padx=4); self.filter_vars[k]=var
             ctk.CTkButton(filt, text="Cari", command=self.refresh).grid(row=0,column=2*len(self.filters)+1,padx=6)
-        self.tree = ttk.Treeview(self, columns=['data'], show='headings'); self.tree.heading('data', text='Rekod (JSON)')
-        self.tree.grid(row=2,column=0,sticky="nsew",padx=8,pady=8); self.grid_rowconfigure(2,weight=1); self.grid_columnconfigure(0,weight=1)
+        # With a page_fn, sorting is done by the query; a fetch_fn result is sorted in memory by the grid
+        self.view = VirtualGrid(self, columns or (), on_need_more=self._more, on_sort=(lambda k, d: self.refresh()) if page_fn else None)
+        self.view.grid(row=2,column=0,sticky="nsew",padx=8,pady=8)
+        self.status = ctk.CTkLabel(self, text="", anchor="w"); self.status.grid(row=3,column=0,sticky="ew",padx=8,pady=(0,6))
+        self.grid_rowconfigure(2,weight=1); self.grid_columnconfigure(0,weight=1)
+        self._key = ("list", id(self))
+        self.refresh()
+
+    def refresh(self):
+        self.view.clear(); self._next_cursor = None
+        self._kwargs = {k:v.get().strip() or None for k,v in self.filter_vars.items()}
+        if self.page_fn:
+            self._load_page(None); return
+        self._submit(self.fetch_fn, on_done=self._insert, **self._kwargs)
+
+    def _load_page(self, cursor):
+        def got(page):
+            self._next_cursor = page.get("next_cursor")
+            self._insert(page["rows"])
+        self._submit(self.page_fn, on_done=got, cursor=cursor, **self._kwargs, **self.view.sort_args())
+
+    def _submit(self, fn, on_done, **kwargs):
+        def done(result): self._loading = False; self.status.configure(text=""); on_done(result)
+        def failed(e): self._loading = False; self.status.configure(text=f"Ralat: {e}")
+        self._loading = True; self.status.configure(text="Memuatkan...")
+        get_worker().submit(self, fn, on_done=done, on_error=failed, key=self._key, **kwargs)
+
+    def _insert(self, items):
+        if items and not self.view.columns_set: self.view.set_columns([(k, k, 120) for k in items[0]])
+        self.view.append_rows(items, has_more=bool(self._next_cursor))
+        if not self.page_fn and self.view.sort_key: self.view.sort_rows(self.view.sort_key, self.view.sort_desc)
+
+    def _more(self):
+        if self._next_cursor and not self._loading: self._load_page(self._next_cursor)
+
+class OrgChartFrame(ctk.CTkFrame):
+    # Lazily expanded org chart: only the top level is fetched up front, children load on expand
+    def __init__(self, master, api, title="Carta Organisasi (Hierarki)"):
+        super().__init__(master); self.api = api
+        ctk.CTkLabel(self, text=title, font=ctk.CTkFont(size=18, weight="bold")).grid(row=0, column=0, columnspan=2, sticky="w", padx=8, pady=(10,0))
+        self.tree = ttk.Treeview(self, columns=["jawatan","unit","bawahan"], show="tree headings")
+        self.tree.heading("#0", text="Nama"); self.tree.column("#0", width=260)
+        for c, label, w in (("jawatan","Jawatan",180), ("unit","Unit",140), ("bawahan","Bawahan",80)):
+            self.tree.heading(c, text=label); self.tree.column(c, width=w, anchor="w")
+        ysb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview); self.tree.configure(yscrollcommand=ysb.set)
+        self.tree.grid(row=1, column=0, sticky="nsew", padx=(8,0), pady=8); ysb.grid(row=1, column=1, sticky="ns", pady=8)
+        side = ctk.CTkFrame(self); side.grid(row=1, column=2, sticky="ns", padx=8, pady=8)
+        self.details = ctk.CTkLabel(side, text="Pilih seorang untuk melihat rantaian penyelia.", justify="left", wraplength=240, anchor="w")
+        self.details.pack(fill="x", padx=6, pady=6)
+        ctk.CTkLabel(side, text="Bilangan mengikut unit", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=6, pady=(12,2))
+        self.units = ttk.Treeview(side, columns=["unit","jumlah"], show="headings", height=12)
+        self.units.heading("unit", text="Unit"); self.units.heading("jumlah", text="Jumlah")
+        self.units.column("unit", width=150); self.units.column("jumlah", width=70, anchor="e"); self.units.pack(fill="y", expand=True, padx=6, pady=6)
+        self.grid_rowconfigure(1, weight=1); self.grid_columnconfigure(0, weight=1)
+        self.tree.bind("<<TreeviewOpen>>", self._on_open); self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self._load_children("")
+        get_worker().submit(self, self.api["headcount_by_unit"], on_done=self._show_units)
+
+    def _show_units(self, rows):
+        for r in rows: self.units.insert("", "end", values=[r.get("unit") or "-", r.get("jumlah")])
+
+    def _load_children(self, parent_iid, cursor=None):
+        parent_id = None if parent_iid == "" else int(parent_iid)
+        def got(page):
+            for iid in self.tree.get_children(parent_iid):
+                if iid.startswith(("ph:", "more:")): self.tree.delete(iid)
+            for r in page["rows"]:
+                iid = str(r["id"])
+                if self.tree.exists(iid): continue
+                self.tree.insert(parent_iid, "end", iid=iid, text=r.get("nama") or "", values=[r.get("jawatan") or "", r.get("unit") or "", r.get("n_children") or ""])
+                if r.get("n_children"): self.tree.insert(iid, "end", iid=f"ph:{iid}", text="Memuatkan...")
+            if page.get("next_cursor"):
+                self.tree.insert(parent_iid, "end", iid=f"more:{parent_iid}:{page['next_cursor']}", text="... lagi (klik untuk muat)")
+        get_worker().submit(self, self.api["children"], parent_id, cursor, on_done=got,
+                            on_error=lambda e: messagebox.showerror("Ralat", f"Gagal muat carta: {e}"))
+
+    def _on_open(self, _e=None):
+        iid = self.tree.focus()
+        if iid and self.tree.exists(f"ph:{iid}"): self._load_children(iid)
+
+    def _on_select(self, _e=None):
+        sel = self.tree.selection()
+        if not sel: return
+        iid = sel[0]
+        if iid.startswith("more:"):
+            _, parent_iid, cursor = iid.split(":", 2); self.tree.delete(iid); self._load_children(parent_iid, cursor); return
+        if iid.startswith("ph:"): return
+        def got(d):
+            chain = " > ".join(a.get("nama") or "?" for a in reversed(d["ancestors"])) or "(paling atas)"
+            self.details.configure(text=f"{self.tree.item(iid, 'text')}\n\nRantaian penyelia:\n{chain}\n\nJumlah di bawah: {d['subtree_size']:,}")
+        get_worker().submit(self, self.api["details"], int(iid), on_done=got, key=("orgdetails", id(self)))
+
+class DashboardFrame(ctk.CTkFrame):
+    # Live counts from dashboard_counts: one small query per refresh, whatever the table sizes
+    def __init__(self, master, can_rebuild=False, title="Papan Pemuka"):
+        super().__init__(master); self._job = None
+        top = ctk.CTkFrame(self, fg_color="transparent"); top.grid(row=0, column=0, columnspan=3, sticky="ew", padx=8, pady=(10,0))
+        ctk.CTkLabel(top, text=title, font=ctk.CTkFont(size=18, weight="bold")).pack(side="left")
+        if can_rebuild: ctk.CTkButton(top, text="Kira Semula", width=110, command=self._rebuild).pack(side="right", padx=4)
+        ctk.CTkButton(top, text="Muat Semula", width=110, command=self.refresh).pack(side="right", padx=4)
+        self.totals = ctk.CTkLabel(self, text="", anchor="w"); self.totals.grid(row=1, column=0, columnspan=3, sticky="ew", padx=8, pady=4)
+        self.units = self._table(0, "PK/WM mengikut unit", [("unit","Unit",160), ("aktif","Aktif",70), ("tidak_aktif","Tidak aktif",80), ("jumlah","Jumlah",70)])
+        self.intake = self._table(1, "Kemasukan bulanan (tarikh_masuk)", [("bulan","Bulan",100), ("jumlah","Bilangan",80)])
+        self.carta = self._table(2, "Carta mengikut unit", [("unit","Unit",160), ("jumlah","Jumlah",70)])
+        self.grid_rowconfigure(3, weight=1)
+        for c in range(3): self.grid_columnconfigure(c, weight=1)
         self.refresh()
 
+    def _table(self, col, heading, columns):
+        ctk.CTkLabel(self, text=heading, font=ctk.CTkFont(weight="bold")).grid(row=2, column=col, sticky="w", padx=8)
+        tree = ttk.Treeview(self, columns=[c[0] for c in columns], show="headings")
+        for key, label, width in columns:
+            tree.heading(key, text=label); tree.column(key, width=width, anchor="w" if key in ("unit","bulan") else "e")
+        tree.grid(row=3, column=col, sticky="nsew", padx=8, pady=(2,8)); tree._keys = [c[0] for c in columns]
+        return tree
+
+    def destroy(self):
+        if self._job: self.after_cancel(self._job); self._job = None
+        super().destroy()
+
     def refresh(self):
-        for r in self.tree.get_children(): self.tree.delete(r)
-        kwargs = {k:v.get().strip() or None for k,v in self.filter_vars.items()}
+        if self._job: self.after_cancel(self._job); self._job = None
+        get_worker().submit(self, data_call, "dashboard.summary", on_done=self._show, key=("dashboard", id(self)),
+                            on_error=lambda e: self.totals.configure(text=f"Ralat: {e}"))
+
+    def _show(self, d):
+        t = d["totals"]
+        self.totals.configure(text=f"PK/WM: {t['profil']:,} (aktif {t['aktif']:,}, tidak aktif {t['tidak_aktif']:,})    Carta: {t['carta']:,}")
+        for tree, rows in ((self.units, d["profil_unit"]), (self.intake, d["intake"]), (self.carta, d["carta_unit"])):
+            tree.delete(*tree.get_children())
+            for r in rows: tree.insert("", "end", values=[_cell(r.get(k)) or ("(tiada)" if k in ("unit","bulan") else "") for k in tree._keys])
+        self._job = self.after(CHANGE_POLL_MS, self.refresh)
+
+    def _rebuild(self):
+        if not messagebox.askyesno("Kira Semula", "Kira semula semua kiraan papan pemuka daripada jadual asal?"): return
+        def done(r): messagebox.showinfo("Kira Semula", f"Selesai: {r['keys']:,} kiraan, {r['drifted']:,} dibetulkan."); self.refresh()
+        get_worker().submit(self, data_call, "dashboard.rebuild", on_done=done, on_error=lambda e: messagebox.showerror("Ralat", f"Gagal: {e}"))
+
+# ---------------- Result cache ----------------
+class ResultCache:
+    """Thread-safe TTL + LRU cache for read APIs, keyed by function and arguments.
+
+    Entries are tagged with the table they read; a write to that table drops them.
+    A per-table generation counter stops a load that raced with a write from being
+    cached. Cached values are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = float(ttl); self.max_entries = int(max_entries)
+        self._data = OrderedDict()   # key -> (expires_at, table, value), LRU order
+        self._gen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get_or_load(self, table: str, key, loader):
+        if self.ttl <= 0: return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key); self.stats["hits"] += 1
+                    return entry[2]
+                del self._data[key]; self.stats["expired"] += 1
+            self.stats["misses"] += 1; gen = self._gen.get(table, 0)
+        value = loader()
+        with self._lock:
+            if self._gen.get(table, 0) == gen:
+                self._data[key] = (now + self.ttl, table, value); self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False); self.stats["evictions"] += 1
+        return value
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self._gen[table] = self._gen.get(table, 0) + 1; self.stats["invalidations"] += 1
+            for k in [k for k, e in self._data.items() if e[1] == table]: del self._data[k]
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snap = dict(self.stats); snap.update(entries=len(self._data), ttl=self.ttl, max_entries=self.max_entries)
+        lookups = snap["hits"] + snap["misses"]
+        snap["hit_ratio"] = snap["hits"] / lookups if lookups else 0.0
+        return snap
+
+RESULT_CACHE = ResultCache(**CACHE_CONFIG)
+atexit.register(lambda: log.info("Result cache: %s", RESULT_CACHE.snapshot()))
+
+def cache_stats() -> Dict[str, Any]:
+    return RESULT_CACHE.snapshot()
+
+# ---------------- Local replica ----------------
+# carta_organisasi/profil_pk_wm copied into an embedded SQLite file. The read functions in
+# REPLICA_READS run there unchanged (same SQL through the SQLite dialect); writes still go to
+# the server, after which the table is re-synced. A delta is every row with updated_at at or
+# after the cursor minus `overlap`, paged on (updated_at, id), plus the deletes in change_log
+# since the last seq (or a full id comparison when that part of the log was pruned).
+REPLICA_TABLES = ("carta_organisasi", "profil_pk_wm")
+# Reads that touch nothing but the replicated tables (carta_headcount_by_unit reads dashboard_counts)
+REPLICA_READS = {carta_list, carta_page, carta_search, carta_children, carta_subtree, carta_node_details, carta_export_csv, carta_export_pdf,
+                 profil_list, profil_page, profil_search, profil_records, profil_export_csv, profil_export_pdf}
+
+def replica_ensure_schema(conn):
+    carta_ensure_table(conn); profil_ensure_table(conn)
+    for t in REPLICA_TABLES:
+        # The server's value is copied as-is; the column must not touch itself on UPDATE here
+        _ensure_column(conn, t, "updated_at", "TIMESTAMP(6) NULL")
+        _ensure_index(conn, t, "idx_updated_at", "INDEX idx_updated_at (updated_at, id)")
+    _m004_list_indexes(conn); _m006_profil_filter_indexes(conn)
+    _create_table(conn, """
+        CREATE TABLE IF NOT EXISTS replica_state (
+            tbl VARCHAR(64) PRIMARY KEY,
+            ts TIMESTAMP(6) NULL,
+            last_id INT NOT NULL DEFAULT 0,
+            seq BIGINT NULL,
+            synced_at TIMESTAMP(6) NULL
+        )
+    """)
+
+class LocalReplica:
+    """Embedded copy of REPLICA_TABLES, kept fresh from the server by delta sync.
+
+    A table is served locally once it has completed one sync (a fresh file reads from the
+    server until then). After a write through this client (reconcile) it reads from the
+    server again until a pull that started after the write has finished. When the server
+    is unreachable, reads keep coming from the last snapshot and the sync retries with backoff.
+    """
+    def __init__(self, path, interval=15.0, batch=2000, overlap=30.0):
+        self.interval = float(interval); self.batch = int(batch); self.overlap = timedelta(seconds=float(overlap))
+        self.pool = ConnectionPool({"backend": "sqlite", "path": path}, size=POOL_CONFIG["size"], timeout=POOL_CONFIG["timeout"], ping_interval=3600)
+        self._locks = {t: threading.Lock() for t in REPLICA_TABLES}
+        # reconcile() bumps _wanted; a pull records in _pulled the _wanted value it started from
+        self._wanted = dict.fromkeys(REPLICA_TABLES, 0); self._pulled = dict.fromkeys(REPLICA_TABLES, 0); self._marks = threading.Lock()
+        self.synced_at: Dict[str, datetime] = {}; self.last_error = None; self._fails = 0
+        self._stop = threading.Event(); self._thread = None
+        conn = self.pool.get()
         try:
-            items = self.fetch_fn(**kwargs)
-        except Exception as e:
-            items = []
-        import json as _json
-        for it in items or []: self.tree.insert('', 'end', values=[_json.dumps(it, ensure_ascii=False)])
+            self.path = conn.path; replica_ensure_schema(conn)
+            cur = conn.cursor(); cur.execute("SELECT tbl, synced_at FROM replica_state WHERE synced_at IS NOT NULL")
+            self.synced_at = dict(cur.fetchall())
+        finally:
+            conn.close()
+
+    def serves(self, table, fn) -> bool:
+        return table in self.synced_at and self._pulled[table] >= self._wanted[table] and fn in REPLICA_READS
+
+    def run(self, fn, *args, **kwargs):
+        t0 = time.perf_counter(); conn = self.pool.get(); acquire = time.perf_counter() - t0
+        result = None; failed = True
+        try:
+            result = fn(conn, *args, **kwargs); failed = False; return result
+        finally:
+            conn.close()
+            record_call(f"replica.{fn.__name__}", time.perf_counter() - t0, result, acquire, failed, args, kwargs)
+
+    # --- sync ---
+    def sync_table(self, table, wait=True) -> Optional[Dict[str, int]]:
+        """Pull one table's delta from the server; None if another sync of it is running and wait=False.
+
+        A reconcile() that lands while a pull is under way makes it pull once more before the
+        lock is released, so a write committed after the first pass read the server is not missed.
+        """
+        lock = self._locks[table]
+        if not lock.acquire(blocking=wait): return None
+        t0 = time.perf_counter(); out = {"upserts": 0, "deletes": 0}; failed = True
+        try:
+            server = get_db_connection()
+            if not server: raise RuntimeError("Cannot connect to DB")
+            local = self.pool.get()
+            try:
+                while True:
+                    wanted = self._wanted[table]
+                    out["deletes"] += self._pull_deletes(server, local, table)
+                    out["upserts"] += self._pull_rows(server, local, table)
+                    now = datetime.now(); cur = local.cursor()
+                    cur.execute("UPDATE replica_state SET synced_at=%s WHERE tbl=%s", (now, table))
+                    self.synced_at[table] = now; self._pulled[table] = wanted
+                    if self._wanted[table] == wanted: break
+                failed = False
+            except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+                server.invalidate(); raise
+            finally:
+                local.close(); server.close()
+        finally:
+            # Server unreachable: fall back to the snapshot rather than failing every read
+            if failed: self._pulled[table] = self._wanted[table]
+            lock.release()
+            record_call(f"replica.sync.{table}", time.perf_counter() - t0, error=failed)
+        if out["upserts"] or out["deletes"]:
+            RESULT_CACHE.invalidate(table)
+            log.info("Replica %s: %d upserted, %d deleted", table, out["upserts"], out["deletes"])
+        return out
+
+    def reconcile(self, table):
+        """After a server write: read `table` from the server until a pull started after now has finished."""
+        with self._marks: self._wanted[table] += 1
+        self.sync_table(table, wait=False)   # None: the sync holding the lock sees the mark and pulls again
+
+    def _state(self, local, table):
+        cur = local.cursor(); cur.execute("SELECT ts, last_id, seq FROM replica_state WHERE tbl=%s", (table,)); row = cur.fetchall()
+        if row: return row[0]
+        cur.execute("INSERT INTO replica_state (tbl) VALUES (%s)", (table,))
+        return None, 0, None
+
+    def _pull_deletes(self, server, local, table) -> int:
+        ts, _, seq = self._state(local, table)
+        cur = server.cursor()
+        cur.execute("SELECT COALESCE(MAX(seq),0), COALESCE(MIN(seq),1) FROM change_log"); head, oldest = cur.fetchall()[0]
+        if seq is not None and seq >= head: return 0
+        if ts is None:
+            gone = []   # empty copy: nothing to delete, start following the log from here
+        elif seq is None or seq < oldest - 1:
+            # The log no longer reaches back to our cursor: compare id sets instead
+            cur.execute(f"SELECT id FROM {table}"); alive = {r[0] for r in cur.fetchall()}
+            lc = local.cursor(); lc.execute(f"SELECT id FROM {table}"); gone = [r[0] for r in lc.fetchall() if r[0] not in alive]
+        else:
+            cur.execute("SELECT DISTINCT row_id FROM change_log WHERE tbl=%s AND seq>%s AND seq<=%s AND op='delete'", (table, seq, head))
+            gone = [r[0] for r in cur.fetchall()]
+        _begin(local); lc = local.cursor(); n = 0
+        for chunk in _id_chunks(gone):
+            lc.execute(f"DELETE FROM {table} WHERE id IN ({','.join(['%s'] * len(chunk))})", chunk); n += lc.rowcount
+        lc.execute("UPDATE replica_state SET seq=%s WHERE tbl=%s", (head, table)); local.commit()
+        return n
+
+    def _pull_rows(self, server, local, table) -> int:
+        ts, _, _ = self._state(local, table); d = dialect_of(server)
+        lc = local.cursor(); lc.execute("SELECT name FROM pragma_table_info(%s)", (table,)); local_cols = {r[0] for r in lc.fetchall()}
+        where, args = ("WHERE updated_at >= %s", [d.timestamp_param(ts - self.overlap)]) if isinstance(ts, datetime) else ("", [])
+        n = 0
+        while True:
+            rows = result_set(execute_prepared(server, f"SELECT * FROM {table} {where} ORDER BY updated_at, id LIMIT %s", args + [self.batch]))
+            if not rows: break
+            n += self._apply(local, table, rows, local_cols)
+            last = rows[-1]; p = d.timestamp_param(last["updated_at"])
+            where, args = "WHERE updated_at >= %s AND (updated_at > %s OR id > %s)", [p, p, last["id"]]
+            if len(rows) < self.batch: break
+        return n
+
+    def _apply(self, local, table, rows, local_cols) -> int:
+        # Only rows whose updated_at differs from the local copy are written (the overlap re-reads recent rows)
+        lc = local.cursor(); have = {}
+        for chunk in _id_chunks(r["id"] for r in rows):
+            lc.execute(f"SELECT id, updated_at FROM {table} WHERE id IN ({','.join(['%s'] * len(chunk))})", chunk); have.update(lc.fetchall())
+        changed = [r for r in rows if have.get(r["id"]) != r["updated_at"]]
+        cols = [c for c in rows[0] if c in local_cols]; last = rows[-1]
+        _begin(local)
+        if changed:
+            # OR REPLACE: the server is authoritative, so a stale local row holding the same no_kp goes too
+            lc.executemany(f"INSERT OR REPLACE INTO {table} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(cols))})",
+                           [[r[c] for c in cols] for r in changed])
+        lc.execute("UPDATE replica_state SET ts=%s, last_id=%s WHERE tbl=%s", (last["updated_at"], last["id"], table))
+        local.commit()
+        return len(changed)
+
+    def sync_all(self) -> Dict[str, Any]:
+        out, errors = {}, {}
+        for t in REPLICA_TABLES:
+            try: out[t] = self.sync_table(t)
+            except Exception as e: errors[t] = e
+        if errors and self.last_error is None: log.warning("Replica sync failed, serving the local copy: %s", errors)
+        elif not errors and self.last_error: log.info("Replica sync resumed")
+        self.last_error = "; ".join(f"{t}: {e}" for t, e in errors.items()) or None
+        self._fails = self._fails + 1 if errors else 0
+        return out
+
+    # --- background thread ---
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="replica-sync", daemon=True); self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.sync_all()
+            self._stop.wait(min(REPLICA_MAX_BACKOFF, self.interval * 2 ** min(self._fails, 8)))
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join(timeout=5)
+        self.pool.close()
+
+    def status(self) -> Dict[str, Any]:
+        conn = self.pool.get()
+        try:
+            cur = conn.cursor(); tables = {}
+            for t in REPLICA_TABLES:
+                cur.execute(f"SELECT COUNT(*) FROM {t}"); n = cur.fetchall()[0][0]
+                tables[t] = {"rows": n, "served": t in self.synced_at and self._pulled[t] >= self._wanted[t], "synced_at": self.synced_at.get(t)}
+        finally:
+            conn.close()
+        return {"path": str(self.path), "tables": tables, "error": self.last_error}
+
+_REPLICA: Optional[LocalReplica] = None
+
+def get_replica() -> Optional[LocalReplica]:
+    return _REPLICA
+
+def start_replica(force=False) -> Optional[LocalReplica]:
+    """Open the local replica (replica.enabled, or force) and start its background sync."""
+    global _REPLICA
+    if _REPLICA is not None or not (force or REPLICA_CONFIG["enabled"]): return _REPLICA
+    if SERVICE_CONFIG["url"]:
+        log.info("Local replica is not used through the data service"); return None
+    try:
+        _REPLICA = LocalReplica(REPLICA_CONFIG["path"], REPLICA_CONFIG["interval"], REPLICA_CONFIG["batch"], REPLICA_CONFIG["overlap"])
+    except Exception as e:
+        log.exception("Local replica unavailable: %s", e); return None
+    atexit.register(_REPLICA.close)
+    if not force: _REPLICA.start()
+    return _REPLICA
+
+def replica_reconcile(table):
+    # After a server write: pull it (and anything else new) so the next read sees it
+    replica = _REPLICA
+    if replica is None or table not in REPLICA_TABLES: return
+    try: replica.reconcile(table)
+    except Exception as e: log.warning("Replica reconcile of %s failed; the background sync will retry: %s", table, e)
+
+def replica_status() -> Dict[str, Any]:
+    return _REPLICA.status() if _REPLICA else {"enabled": False}
+
+def sync_replica() -> Dict[str, Any]:
+    return _REPLICA.sync_all() if _REPLICA else {}
 
 # ---------------- APIs (wrappers to call with new connections) ----------------
 def _with_conn(fn, *args, **kwargs):
-    conn = get_db_connection()
-    if not conn: raise RuntimeError("Cannot connect to DB")
-    try: return fn(conn, *args, **kwargs)
-    finally: conn.close()
+    t0 = time.perf_counter(); conn = get_db_connection(); acquire = time.perf_counter() - t0
+    if not conn:
+        record_call(fn.__name__, acquire, None, acquire, True, args, kwargs); raise RuntimeError("Cannot connect to DB")
+    result = None; failed = True
+    try:
+        result = fn(conn, *args, **kwargs); failed = False; return result
+    except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+        conn.invalidate(); raise
+    finally:
+        conn.close()
+        record_call(fn.__name__, time.perf_counter() - t0, result, acquire, failed, args, kwargs)
+
+def _read(table, fn, *args, **kwargs):
+    # Replicated tables are read from the local copy once it has synced; everything else from the server
+    replica = _REPLICA
+    if replica is not None and replica.serves(table, fn): return replica.run(fn, *args, **kwargs)
+    return _with_conn(fn, *args, **kwargs)
+
+def _cached(table, fn, *args, **kwargs):
+    # Read-through: served from RESULT_CACHE until TTL expiry or a write to `table`
+    key = (fn.__name__, args, tuple(sorted(kwargs.items()))); loaded = []
+    def load(): loaded.append(True); return _read(table, fn, *args, **kwargs)
+    t0 = time.perf_counter(); value = RESULT_CACHE.get_or_load(table, key, load)
+    if not loaded: record_call(fn.__name__, time.perf_counter() - t0, value, cached=True)
+    return value
+
+def _write(table, fn, *args, **kwargs):
+    try: result = _with_conn(fn, *args, **kwargs)
+    finally: RESULT_CACHE.invalidate(table)
+    replica_reconcile(table)
+    return result
+
+def _changes(table, fn, cursor=None):
+    # Changes made by other clients also make cached reads (and the local replica) of that table stale
+    ch = _with_conn(fn, cursor)
+    if ch["upserts"] or ch["deletes"] or ch["reset"]: RESULT_CACHE.invalidate(table); replica_reconcile(table)
+    return ch
 
 def api_carta():
+    t = "carta_organisasi"
     return {
-        "list": lambda: _with_conn(carta_list),
-        "create": lambda data: _with_conn(carta_create, data),
-        "update": lambda rec_id, data: _with_conn(carta_update, rec_id, data),
-        "delete": lambda rec_id: _with_conn(carta_delete, rec_id),
+        "list": lambda: _cached(t, carta_list),
+        "page": lambda cursor=None, limit=PAGE_SIZE, with_total=False, order=None, desc=True, query=None: _cached(t, carta_page, cursor=cursor, limit=limit, with_total=with_total, order=order, desc=desc, query=query),
+        "search": lambda query, limit=PAGE_SIZE: _cached(t, carta_search, query, limit),
+        "export_csv": lambda path, query=None, **kw: _read(t, carta_export_csv, path, query, **kw),
+        "export_pdf": lambda path, query=None, **kw: _read(t, carta_export_pdf, path, query, **kw),
+        "changes": lambda cursor=None: _changes(t, carta_changes, cursor),
+        "children": lambda parent_id=None, cursor=None: _cached(t, carta_children, parent_id, cursor),
+        "subtree": lambda root_id: _cached(t, carta_subtree, root_id),
+        "details": lambda rec_id: _cached(t, carta_node_details, rec_id),
+        "headcount_by_unit": lambda: _cached(t, carta_headcount_by_unit),
+        "create": lambda data: _write(t, carta_create, data),
+        "update": lambda rec_id, data: _write(t, carta_update, rec_id, data),
+        "delete": lambda rec_id: _write(t, carta_delete, rec_id),
+        "update_many": lambda ids, data: _write(t, carta_update_many, ids, data),
+        "delete_many": lambda ids: _write(t, carta_delete_many, ids),
     }
 
 def api_profil():
+    t = "profil_pk_wm"
+    return {
+        "list": lambda: _cached(t, profil_list),
+        "page": lambda cursor=None, limit=PAGE_SIZE, with_total=False, **filters: _cached(t, profil_page, cursor=cursor, limit=limit, with_total=with_total, **filters),
+        "search": lambda query, limit=PAGE_SIZE: _cached(t, profil_search, query, limit),
+        "export_csv": lambda path, query=None, **kw: _read(t, profil_export_csv, path, query, **kw),
+        "export_pdf": lambda path, query=None, **kw: _read(t, profil_export_pdf, path, query, **kw),
+        "changes": lambda cursor=None: _changes(t, profil_changes, cursor),
+        "import": lambda path, **kw: _write(t, profil_import_file, path, **kw),
+        "create": lambda data: _write(t, profil_create, data),
+        "update": lambda rec_id, data: _write(t, profil_update, rec_id, data),
+        "delete": lambda rec_id: _write(t, profil_delete, rec_id),
+        "update_many": lambda ids, data: _write(t, profil_update_many, ids, data),
+        "delete_many": lambda ids: _write(t, profil_delete_many, ids),
+        "dedupe_queue": lambda status="baru", limit=MAX_PAGE_SIZE: _with_conn(dedupe_queue, status, limit),
+        "dedupe_scan": lambda: _with_conn(dedupe_scan),
+        "dedupe_merge": lambda pair_id, keep_id=None, user=None: _merge_profil(pair_id, keep_id, user),
+        "dedupe_reject": lambda pair_id, user=None: _with_conn(dedupe_reject, pair_id, user),
+    }
+
+def _merge_profil(pair_id, keep_id=None, user=None):
+    # A merge also re-files engine-module records under the kept no_kp
+    try: return _write("profil_pk_wm", profil_merge, pair_id, keep_id, user)
+    finally:
+        for m in _ENGINE_MODULES.values():
+            if "no_kp" in m["cols"]: RESULT_CACHE.invalidate(m["table"])
+
+def api_module(key):
+    # Same surface as api_carta/api_profil for an engine module
+    t = _ENGINE_MODULES[key]["table"]; op = lambda name: module_op(key, name)
     return {
-        "list": lambda: _with_conn(profil_list),
-        "create": lambda data: _with_conn(profil_create, data),
-        "update": lambda rec_id, data: _with_conn(profil_update, rec_id, data),
-        "delete": lambda rec_id: _with_conn(profil_delete, rec_id),
+        "list": lambda: _cached(t, op("list")),
+        "page": lambda cursor=None, limit=PAGE_SIZE, with_total=False, order=None, desc=True, query=None: _cached(t, op("page"), cursor=cursor, limit=limit, with_total=with_total, order=order, desc=desc, query=query),
+        "search": lambda query, limit=PAGE_SIZE: _cached(t, op("search"), query, limit),
+        "export_csv": lambda path, query=None, **kw: _with_conn(op("export_csv"), path, query, **kw),
+        "export_pdf": lambda path, query=None, **kw: _with_conn(op("export_pdf"), path, query, **kw),
+        "changes": lambda cursor=None: _changes(t, op("changes"), cursor),
+        "create": lambda data: _write(t, op("create"), data),
+        "update": lambda rec_id, data: _write(t, op("update"), rec_id, data),
+        "delete": lambda rec_id: _write(t, op("delete"), rec_id),
+        "update_many": lambda ids, data: _write(t, op("update_many"), ids, data),
+        "delete_many": lambda ids: _write(t, op("delete_many"), ids),
     }
 
-def list_profil_records(unit=None,name=None,status=None):
-    if unit: return _with_conn(profil_list_by_unit, unit)
-    if name: return _with_conn(profil_search_by_name, name)
-    if status == "tidak_aktif": return _with_conn(profil_list_inactive)
-    return _with_conn(profil_list)
+def get_dashboard():
+    return _with_conn(dashboard_summary)
+
+def rebuild_dashboard():
+    try: return _with_conn(dashboard_rebuild)
+    finally: RESULT_CACHE.invalidate("carta_organisasi")   # headcount_by_unit reads the same counts
+
+def list_profil_records(unit=None,name=None,status=None,masuk_from=None,masuk_to=None):
+    # All given filters apply together (AND); see profil_filter
+    return _cached("profil_pk_wm", profil_records, unit=unit or None, name=name or None, status=status or None,
+                   masuk_from=masuk_from or None, masuk_to=masuk_to or None)
+
+def list_profil_records_page(unit=None,name=None,status=None,masuk_from=None,masuk_to=None,cursor=None,limit=PAGE_SIZE,order=None,desc=True):
+    return _cached("profil_pk_wm", profil_page, unit=unit or None, name=name or None, status=status or None,
+                   masuk_from=masuk_from or None, masuk_to=masuk_to or None, cursor=cursor, limit=limit, order=order, desc=desc)
+
+# ---------------- Data service ----------------
+# `--serve` runs the data layer headless behind a small asyncio HTTP/JSON endpoint so all
+# stations share one connection pool and one RESULT_CACHE. Protocol:
+#   POST /api/<name>              {"args": [...], "kwargs": {...}} -> {"result": ...} | {"error": ..., "type": ...}
+#   POST /export/<module>/<kind>  {"query": ...} -> file body (X-Rows: row count)
+#   GET  /health
+#   GET  /metrics                 Prometheus text exposition of METRICS, pool and cache
+# Clients with service.url set use ServiceClient for every call instead of MySQL.
+SERVICE_MODULES = {"carta": api_carta, "profil": api_profil}
+_FILE_CALLS = {"export_csv", "export_pdf", "import"}   # take a local path: not callable remotely
+_REMOTE_ERRORS = {"ValueError": ValueError, "PermissionError": PermissionError, "KeyError": KeyError}
+# Over the service these run as the user of the caller's auth.login session (X-SED-Session), never
+# as whoever the arguments name: users.delete's requestor is replaced by the session user
+_ADMIN_CALLS = {"users.create", "users.delete"}
+_LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+
+@lru_cache(maxsize=None)
+def local_calls() -> Dict[str, Any]:
+    # Every data call the GUI makes, by name
+    calls = {f"{m}.{k}": fn for m, factory in SERVICE_MODULES.items() for k, fn in factory().items() if k not in _FILE_CALLS}
+    calls.update({"auth.login": login_user, "users.create": create_user, "users.delete": delete_user,
+                  "profil.records": list_profil_records, "profil.records_page": list_profil_records_page,
+                  "dashboard.summary": get_dashboard, "dashboard.rebuild": rebuild_dashboard})
+    return calls
+
+def data_call(name, *args, **kwargs):
+    if SERVICE_CONFIG["url"]: return service_client().call(name, *args, **kwargs)
+    return local_calls()[name](*args, **kwargs)
+
+def module_api(module: str) -> Dict[str, Any]:
+    # MODULE_SPECS api dict: in-process, or proxies to the service with the same keys
+    if not SERVICE_CONFIG["url"]: return SERVICE_MODULES[module]()
+    client = service_client(); api = {}
+    for key in SERVICE_MODULES[module]():
+        if key in ("export_csv", "export_pdf"):
+            api[key] = lambda path, query=None, _k=key[7:], **kw: client.download(module, _k, path, query, **kw)
+        elif key not in _FILE_CALLS:
+            api[key] = lambda *a, _n=f"{module}.{key}", **kw: client.call(_n, *a, **kw)
+    return api
+
+class ServiceError(RuntimeError):
+    pass
+
+# Calls that only read (by the last part of the name): safe to resend after a dropped connection
+_READ_CALLS = {"list", "page", "search", "changes", "children", "subtree", "details", "headcount_by_unit",
+               "records", "records_page", "summary", "dedupe_queue", "login"}
+
+# Typed values JSON has no type for travel tagged, so service callers get the same types as in-process calls
+_JSON_TYPES = {"__datetime__": datetime.fromisoformat, "__date__": date.fromisoformat, "__decimal__": Decimal}
+
+def _json_default(o):
+    # A ResultSet goes over the wire as its column names once plus value arrays, not an object per row
+    if isinstance(o, ResultSet): return {"__columns__": list(o.columns), "rows": o.tuples}
+    if isinstance(o, Row): return dict(o)
+    if isinstance(o, datetime): return {"__datetime__": o.isoformat()}
+    if isinstance(o, date): return {"__date__": o.isoformat()}
+    if isinstance(o, Decimal): return {"__decimal__": str(o)}
+    return str(o)
+
+def _json_hook(d):
+    if "__columns__" in d: return ResultSet(d["__columns__"], d["rows"])
+    if len(d) == 1:
+        (tag, v), = d.items()
+        if tag in _JSON_TYPES: return _JSON_TYPES[tag](v)
+    return d
+
+class ServiceClient:
+    """HTTP/JSON client for `--serve`; one keep-alive connection per thread."""
+    def __init__(self, url, token="", timeout=60.0):
+        from urllib.parse import urlsplit
+        u = urlsplit(url); self.host = u.hostname or "127.0.0.1"; self.port = u.port or 80
+        self.token = token; self.timeout = timeout; self._local = threading.local()
+        self.session = None   # from auth.login; identifies the user for _ADMIN_CALLS
+
+    def _conn(self, fresh=False):
+        import http.client
+        c = getattr(self._local, "conn", None)
+        if c is None or fresh:
+            if c is not None: c.close()
+            c = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return c
+
+    def _request(self, path, payload, retry=True):
+        # retry: resend on a new connection when the old one drops before the response. Only for
+        # reads - a write may already have run on the server by then, so its error is raised instead.
+        import http.client
+        body = json.dumps(payload, default=_json_default).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token: headers["Authorization"] = f"Bearer {self.token}"
+        if self.session: headers["X-SED-Session"] = self.session
+        for attempt in (0, 1):
+            c = self._conn(fresh=attempt > 0)
+            try:
+                c.request("POST", path, body, headers)
+            except (ConnectionResetError, BrokenPipeError):
+                if attempt: raise
+                continue   # failed while sending (idle keep-alive closed): never reached the server
+            except OSError:
+                c.close(); self._local.conn = None; raise
+            try:
+                return c.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError):
+                if attempt or not retry: c.close(); self._local.conn = None; raise
+            except OSError:
+                c.close(); self._local.conn = None; raise
+
+    def call(self, name, *args, **kwargs):
+        t0 = time.perf_counter(); raw = b""; ok = False
+        try:
+            resp = self._request(f"/api/{name}", {"args": args, "kwargs": kwargs}, retry=name.rsplit(".", 1)[-1] in _READ_CALLS)
+            raw = resp.read() or b"{}"; data = json.loads(raw, object_hook=_json_hook)
+            if resp.status != 200:
+                raise _REMOTE_ERRORS.get(data.get("type"), ServiceError)(data.get("error") or f"HTTP {resp.status}")
+            ok = True; result = data.get("result")
+            if name == "auth.login" and isinstance(result, dict): self.session = result.pop("session", None)
+            return result
+        finally:
+            # Round trip as seen by this station (network + service queueing + the call itself)
+            elapsed = time.perf_counter() - t0; rows = _result_rows(name, data.get("result")) if ok else []
+            METRICS.observe(f"service.{name}", elapsed, len(rows), len(raw), error=not ok)
+            if elapsed * 1000 >= METRICS_CONFIG["slow_ms"]:
+                slow_log.warning("service.%s took %.0f ms (%d rows, %d bytes%s)", name, elapsed * 1000, len(rows), len(raw), "" if ok else ", failed")
+
+    def download(self, module, kind, path, query=None, progress=None, cancel=None, **kwargs):
+        # Server renders the export; the file streams to path.part and is renamed when complete
+        resp = self._request(f"/export/{module}/{kind}", {"query": query, "kwargs": kwargs})
+        if resp.status != 200:
+            data = json.loads(resp.read() or b"{}"); raise ServiceError(data.get("error") or f"HTTP {resp.status}")
+        total = int(resp.getheader("Content-Length") or 0) or None; done = 0; tmp = f"{path}.part"
+        try:
+            with open(tmp, "wb") as f:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        self._conn().close(); self._local.conn = None; raise ExportCancelled(path)
+                    chunk = resp.read(256 * 1024)
+                    if not chunk: break
+                    f.write(chunk); done += len(chunk)
+                    if progress: progress(done, total, f"{done / 1048576:,.1f} / {(total or 0) / 1048576:,.1f} MB")
+            os.replace(tmp, path)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        return int(resp.getheader("X-Rows") or 0)
+
+    def health(self) -> Dict[str, Any]:
+        import http.client
+        c = http.client.HTTPConnection(self.host, self.port, timeout=min(self.timeout, 5.0))
+        try: c.request("GET", "/health"); return json.loads(c.getresponse().read())
+        finally: c.close()
+
+_SERVICE_CLIENT: Optional[ServiceClient] = None
+
+def service_client() -> ServiceClient:
+    global _SERVICE_CLIENT
+    if _SERVICE_CLIENT is None:
+        _SERVICE_CLIENT = ServiceClient(SERVICE_CONFIG["url"], SERVICE_CONFIG["token"], SERVICE_CONFIG["timeout"])
+    return _SERVICE_CLIENT
+
+class DataService:
+    """asyncio HTTP/1.1 front for local_calls(); blocking data calls run on a thread pool sized to the DB pool."""
+    def __init__(self, host="127.0.0.1", port=8765, token=""):
+        self.host = host; self.port = port; self.token = token; self.calls = local_calls()
+        self._sessions = {}   # session token -> (user, expiry)
+        self._executor = ThreadPoolExecutor(max_workers=POOL_CONFIG["size"], thread_name_prefix="sed-svc")
+        self.server = None
+
+    async def start(self):
+        import asyncio
+        if not self.token and self.host not in _LOOPBACK:
+            raise PermissionError(f"Refusing to serve on {self.host} without service.token (only {', '.join(sorted(_LOOPBACK))} may run without one)")
+        self.server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]   # resolves port 0 (tests)
+        log.info("SED service listening on http://%s:%d", self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        async with self.server: await self.server.serve_forever()
+
+    async def close(self):
+        if self.server: self.server.close(); await self.server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _client(self, reader, writer):
+        import asyncio
+        try:
+            while True:   # keep-alive: several requests per connection
+                try: head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError): break
+                lines = head.decode("latin-1").split("\r\n")
+                try: method, target, _version = lines[0].split(" ", 2)
+                except ValueError: await self._send(writer, 400, {"error": "bad request"}); break
+                headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+                length = int(headers.get("content-length") or 0)
+                if length > SERVICE_MAX_BODY: await self._send(writer, 413, {"error": "request too large"}); break
+                body = await reader.readexactly(length) if length else b""
+                await self._dispatch(writer, method, target.split("?", 1)[0], headers, body)
+                if headers.get("connection", "").lower() == "close": break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, payload=None, raw=None, extra=None):
+        body = raw if raw is not None else json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}.get(status, "")
+        hdr = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body)}",
+               f"Content-Type: {'application/octet-stream' if raw is not None else 'application/json; charset=utf-8'}"]
+        hdr += [f"{k}: {v}" for k, v in (extra or {}).items()]
+        writer.write(("\r\n".join(hdr) + "\r\n\r\n").encode("latin-1") + body); await writer.drain()
+
+    async def _run(self, fn, *args, **kwargs):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def _dispatch(self, writer, method, path, headers, body):
+        if method == "GET" and path == "/health":
+            return await self._send(writer, 200, {"ok": True, "schema_version": SCHEMA_VERSION, "pool": pool_stats(), "cache": cache_stats()})
+        if method == "GET" and path == "/metrics":
+            body = metrics_text().encode("utf-8")
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+            return await writer.drain()
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            return await self._send(writer, 401, {"error": "unauthorized"})
+        try: req = json.loads(body or b"{}", object_hook=_json_hook)
+        except ValueError: return await self._send(writer, 400, {"error": "invalid JSON"})
+        if method == "POST" and path.startswith("/api/") and path[5:] in self.calls:
+            name = path[5:]; args = list(req.get("args", ()))
+            if name in _ADMIN_CALLS:
+                user = self._session_user(headers.get("x-sed-session"))
+                if not user or user["role"] not in ("host", "admin"):
+                    return await self._send(writer, 401, {"error": "login as host/admin required", "type": "PermissionError"})
+                if name == "users.delete": args[:1] = [user["username"]]
+            try:
+                result = await self._run(self.calls[name], *args, **req.get("kwargs", {}))
+                if name == "auth.login" and result:
+                    session = secrets.token_urlsafe(32); self._sessions[session] = (result, time.monotonic() + SERVICE_SESSION_TTL)
+                    result = dict(result, session=session)
+            except tuple(_REMOTE_ERRORS.values()) as e:
+                return await self._send(writer, 400, {"error": str(e), "type": type(e).__name__})
+            except Exception as e:
+                log.exception("Service call %s failed", path[5:])
+                return await self._send(writer, 500, {"error": str(e), "type": type(e).__name__})
+            return await self._send(writer, 200, {"result": result})
+        parts = path.strip("/").split("/")
+        if method == "POST" and len(parts) == 3 and parts[0] == "export" and parts[1] in SERVICE_MODULES and parts[2] in ("csv", "pdf"):
+            return await self._export(writer, parts[1], parts[2], req)
+        return await self._send(writer, 404, {"error": f"unknown endpoint {method} {path}"})
+
+    def _session_user(self, session):
+        now = time.monotonic()
+        for k in [k for k, (_u, exp) in self._sessions.items() if exp < now]: del self._sessions[k]
+        entry = self._sessions.get(session or "")
+        return entry[0] if entry else None
+
+    async def _export(self, writer, module, kind, req):
+        fd, tmp = tempfile.mkstemp(prefix="sed_export_", suffix=f".{kind}"); os.close(fd)
+        try:
+            fn = SERVICE_MODULES[module]()[f"export_{kind}"]
+            n = await self._run(fn, tmp, req.get("query"), **req.get("kwargs", {}))
+            size = os.path.getsize(tmp)
+            writer.write((f"HTTP/1.1 200 OK\r\nContent-Length: {size}\r\nContent-Type: application/octet-stream\r\n"
+                          f"X-Rows: {n}\r\n\r\n").encode("latin-1"))
+            with open(tmp, "rb") as f:
+                while True:
+                    chunk = f.read(256 * 1024)
+                    if not chunk: break
+                    writer.write(chunk); await writer.drain()
+        except Exception as e:
+            log.exception("Service export %s/%s failed", module, kind)
+            await self._send(writer, 500, {"error": str(e), "type": type(e).__name__})
+        finally:
+            try: os.remove(tmp)
+            except OSError: pass
+
+def serve(host=None, port=None):
+    import asyncio
+    if not ensure_schema():
+        print("Could not connect to DB"); return 1
+    host = host or SERVICE_CONFIG["host"]
+    if not SERVICE_CONFIG["token"] and host not in _LOOPBACK:
+        print(f"Refusing to serve on {host} without a token: set service.token in config.json"); return 1
+    async def _main():
+        svc = await DataService(host, SERVICE_CONFIG["port"] if port is None else port, SERVICE_CONFIG["token"]).start()
+        print(f"SED service listening on http://{svc.host}:{svc.port} (Ctrl+C to stop)")
+        start_metrics_dump()
+        try: await svc.serve_forever()
+        finally: await svc.close()
+    try: asyncio.run(_main())
+    except KeyboardInterrupt: log.info("SED service stopped")
+    return 0
 
 MODULE_SPECS = {
     "carta": {
         "title":"Carta Organisasi",
-        "api": api_carta(),
+        "api": module_api("carta"),
         "fields":[
             {"name":"id","label":"ID"},
             {"name":"nama","label":"Nama"},
             {"name":"jawatan","label":"Jawatan"},
             {"name":"unit","label":"Unit"}
         ],
-        "required":{"nama","jawatan"}
+        "required":{"nama","jawatan"},
+        "bulk_fields":[("unit","Unit"), ("jawatan","Jawatan"), ("supervisor_id","ID Penyelia")]
     },
     "profil": {
         "title":"Profil PK/WM",
-        "api": api_profil(),
+        "api": module_api("profil"),
         "fields":[
             {"name":"id","label":"ID"},
             {"name":"nama","label":"Nama"},
             {"name":"no_kp","label":"No KP"}
         ],
-        "required":{"nama","no_kp"}
+        "required":{"nama","no_kp"},
+        "bulk_fields":[("unit","Unit"), ("status","Status",PROFIL_STATUSES), ("pangkat","Pangkat"), ("tarikh_masuk","Tarikh Masuk")]
+    },
+    # Schema-driven modules: table, columns and indexes are declared here; see "Module engine"
+    "bkl": {
+        "title":"Input BKL",
+        "table":"bkl_input_table",
+        "columns":[
+            {"name":"no_rujukan","label":"No. Rujukan","type":"str","size":40,"required":True,"unique":True,"search":True},
+            {"name":"tarikh","label":"Tarikh","type":"date","required":True},
+            {"name":"nama","label":"Nama","type":"str","size":120,"search":True},
+            {"name":"no_kp","label":"No KP","type":"str","size":30,"search":True},
+            {"name":"unit","label":"Unit","type":"str","size":60},
+            {"name":"perkara","label":"Perkara","type":"text"},
+            {"name":"status","label":"Status","type":"enum","choices":("baru","dalam_tindakan","selesai")}
+        ],
+        "indexes":[("idx_bkl_tarikh", ("tarikh","id")), ("idx_bkl_unit", ("unit","id")), ("idx_bkl_nama", ("nama",)), ("idx_bkl_no_kp", ("no_kp",))],
+        "search_exact":"no_kp",
+        "bulk_fields":[("unit","Unit"), ("status","Status",("baru","dalam_tindakan","selesai"))]
+    },
+    "laporan_jenayah": {
+        "title":"Laporan Jenayah",
+        "table":"laporan_jenayah_table",
+        "columns":[
+            {"name":"no_laporan","label":"No. Laporan","type":"str","size":40,"required":True,"unique":True,"search":True},
+            {"name":"tarikh_laporan","label":"Tarikh Laporan","type":"date","required":True},
+            {"name":"jenis_jenayah","label":"Jenis Jenayah","type":"str","size":80,"required":True,"search":True},
+            {"name":"seksyen","label":"Seksyen","type":"str","size":40},
+            {"name":"lokasi","label":"Lokasi","type":"str","size":200,"search":True},
+            {"name":"unit","label":"Unit","type":"str","size":60},
+            {"name":"pegawai_penyiasat","label":"Pegawai Penyiasat","type":"str","size":120},
+            {"name":"status","label":"Status","type":"enum","choices":("dalam_siasatan","selesai","ditutup")}
+        ],
+        "indexes":[("idx_lj_tarikh", ("tarikh_laporan","id")), ("idx_lj_unit_status", ("unit","status","id")),
+                   ("idx_lj_jenis", ("jenis_jenayah",)), ("idx_lj_lokasi", ("lokasi",))],
+        "bulk_fields":[("unit","Unit"), ("status","Status",("dalam_siasatan","selesai","ditutup")), ("pegawai_penyiasat","Pegawai Penyiasat")]
+    },
+    "ganjaran_pk_wm": {
+        "title":"Ganjaran PK/WM",
+        "table":"ganjaran_pk_wm_table",
+        "columns":[
+            {"name":"no_kp","label":"No KP","type":"str","size":30,"required":True,"search":True},
+            {"name":"nama","label":"Nama","type":"str","size":120,"required":True,"search":True},
+            {"name":"jenis_ganjaran","label":"Jenis Ganjaran","type":"str","size":80,"required":True},
+            {"name":"amaun","label":"Amaun (RM)","type":"decimal"},
+            {"name":"tarikh","label":"Tarikh","type":"date"},
+            {"name":"catatan","label":"Catatan","type":"text"}
+        ],
+        "indexes":[("idx_gpw_no_kp", ("no_kp",)), ("idx_gpw_nama", ("nama",)), ("idx_gpw_tarikh", ("tarikh","id"))],
+        "search_exact":"no_kp",
+        "bulk_fields":[("jenis_ganjaran","Jenis Ganjaran"), ("tarikh","Tarikh")]
+    },
+    "rekod_ganjaran": {
+        "title":"Rekod Ganjaran",
+        "table":"rekod_ganjaran_table",
+        "columns":[
+            {"name":"no_rujukan","label":"No. Rujukan","type":"str","size":40,"required":True,"unique":True,"search":True},
+            {"name":"no_kp","label":"No KP","type":"str","size":30,"search":True},
+            {"name":"jenis","label":"Jenis","type":"str","size":80},
+            {"name":"amaun","label":"Amaun (RM)","type":"decimal"},
+            {"name":"tarikh_lulus","label":"Tarikh Lulus","type":"date"},
+            {"name":"status","label":"Status","type":"enum","choices":("dipohon","diluluskan","ditolak")}
+        ],
+        "indexes":[("idx_rg_no_kp", ("no_kp",)), ("idx_rg_status", ("status","id"))],
+        "search_exact":"no_kp",
+        "bulk_fields":[("status","Status",("dipohon","diluluskan","ditolak")), ("tarikh_lulus","Tarikh Lulus")]
+    },
+    "jurnal_sed": {
+        "title":"Jurnal SED",
+        "table":"jurnal_sed_table",
+        "columns":[
+            {"name":"tarikh","label":"Tarikh","type":"date","required":True},
+            {"name":"tajuk","label":"Tajuk","type":"str","size":200,"required":True,"search":True},
+            {"name":"kategori","label":"Kategori","type":"str","size":60,"search":True},
+            {"name":"catatan","label":"Catatan","type":"text"},
+            {"name":"dicatat_oleh","label":"Dicatat Oleh","type":"str","size":60}
+        ],
+        "indexes":[("idx_jurnal_tarikh", ("tarikh","id")), ("idx_jurnal_tajuk", ("tajuk",)), ("idx_jurnal_kategori", ("kategori",))],
+        "bulk_fields":[("kategori","Kategori")]
     }
 }
 
+for _key, _spec in MODULE_SPECS.items():
+    if "columns" not in _spec: continue
+    register_module(_key, _spec)
+    SERVICE_MODULES[_key] = lambda k=_key: api_module(k)
+    _spec.setdefault("fields", [{"name":"id","label":"ID"}] + [{"name":c["name"],"label":c["label"]} for c in _spec["columns"]])
+    _spec.setdefault("required", {c["name"] for c in _spec["columns"] if c.get("required")})
+    _spec["api"] = module_api(_key)
+
+# ---------------- Report pack ----------------
+# Several modules' CSV/PDF exports in one ZIP. The exports run concurrently on a thread pool, each
+# through its module api (own pooled connection, the replica, or a download from the service), and
+# every finished file is copied into the archive and deleted as soon as it completes.
+REPORT_PACK_KINDS = ("csv", "pdf")
+
+def _file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""): h.update(block)
+    return h.hexdigest()
+
+def export_report_pack(path, modules=None, kinds=REPORT_PACK_KINDS, workers=None, progress=None, cancel=None) -> Dict[str, Any]:
+    """Export `modules` (default: every MODULE_SPECS entry) in each of `kinds` into one ZIP at `path`.
+
+    manifest.json in the archive lists every file with its row count, size, sha256 and time; an
+    export that fails is recorded there with its error instead of aborting the pack. progress(done,
+    total, text) is called per finished file; setting `cancel` stops the running exports, discards
+    the archive and raises ExportCancelled. Returns the manifest.
+    """
+    keys = list(modules or MODULE_SPECS); kinds = list(kinds)
+    unknown = [k for k in keys if k not in MODULE_SPECS] + [k for k in kinds if k not in REPORT_PACK_KINDS]
+    if unknown: raise ValueError(f"Modul/format tidak dikenali: {', '.join(unknown)}")
+    jobs = [(k, kind) for k in keys for kind in kinds]
+    if not jobs: raise ValueError("Tiada modul dipilih")
+    workers = max(1, min(workers or REPORT_PACK_WORKERS, POOL_CONFIG["size"] - 1, len(jobs)))   # leave the GUI a connection
+    pdf_workers = max(1, (os.cpu_count() or 1) // workers)   # PDFs render in processes too; don't multiply the two
+    cancel = cancel or threading.Event()
+    manifest = {"generated_at": datetime.now().isoformat(timespec="seconds"), "schema_version": SCHEMA_VERSION,
+                "source": SERVICE_CONFIG["url"] or DB_CONFIG.get("path") or DB_CONFIG.get("database"), "files": [], "errors": 0}
+    tmpdir = tempfile.mkdtemp(prefix="sed_pack_"); tmp = f"{path}.part"; t0 = time.perf_counter()
+
+    def run(key, kind):
+        spec = MODULE_SPECS[key]; out = os.path.join(tmpdir, f"{key}.{kind}"); t = time.perf_counter()
+        kw = {"title": spec["title"], "workers": pdf_workers} if kind == "pdf" else {}
+        rows = spec["api"][f"export_{kind}"](out, None, cancel=cancel, **kw)
+        return out, rows, time.perf_counter() - t
+
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sed-pack")
+    try:
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            futs = {ex.submit(run, *job): job for job in jobs}
+            for n, f in enumerate(as_completed(futs), 1):
+                if cancel.is_set(): raise ExportCancelled(path)
+                key, kind = futs[f]; name = f"{key}.{kind}"
+                entry = {"module": key, "title": MODULE_SPECS[key]["title"], "kind": kind, "file": name}
+                try:
+                    out, rows, secs = f.result()
+                except ExportCancelled:
+                    raise
+                except Exception as e:
+                    log.warning("Report pack: %s failed: %s", name, e)
+                    entry["error"] = str(e); manifest["errors"] += 1
+                else:
+                    # PDFs are compressed already
+                    zf.write(out, name, compress_type=zipfile.ZIP_STORED if kind == "pdf" else zipfile.ZIP_DEFLATED)
+                    entry.update(rows=rows, bytes=os.path.getsize(out), sha256=_file_sha256(out), seconds=round(secs, 2))
+                    os.remove(out)
+                manifest["files"].append(entry)
+                if progress: progress(n, len(jobs), f"{n} / {len(jobs)} fail siap ({name})")
+            manifest["files"].sort(key=lambda e: jobs.index((e["module"], e["kind"])))
+            manifest["seconds"] = round(time.perf_counter() - t0, 2)
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False, default=str))
+        os.replace(tmp, path)
+    except BaseException:
+        cancel.set()   # stop exports still running
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    log.info("Report pack %s: %d file(s), %d error(s), %d worker(s), %.1fs", path, len(jobs) - manifest["errors"],
+             manifest["errors"], workers, manifest["seconds"])
+    return manifest
+
 # ---------------- Setup / Login / Main GUI ----------------
 class SetupWindow(ctk.CTkToplevel):
     def __init__(self, master, on_success=None):
@@ -560,28 +4273,122 @@ class SetupWindow(ctk.CTkToplevel):
             with open(CONFIG_PATH, "w", encoding="utf-8") as f: json.dump(data, f, indent=4, ensure_ascii=False)
         except Exception as e:
             messagebox.showerror("Gagal Simpan", f"Tidak dapat tulis config.json: {e}"); return
-        global DB_CONFIG
-        DB_CONFIG = load_config()
+        global DB_CONFIG, POOL_CONFIG
+        DB_CONFIG = load_config(); POOL_CONFIG = load_pool_config()
+        reset_pool(); RESULT_CACHE.clear()
         messagebox.showinfo("Simpan", "Konfigurasi disimpan. Teruskan ke aplikasi.")
         if callable(self.on_success): self.destroy(); self.on_success()
 
 class LoginWindow(ctk.CTkToplevel):
-    def __init__(self, master, on_success):
-        super().__init__(master); self.on_success = on_success; self.title("SED Login"); self.geometry("380x260"); self.resizable(False,False)
+    def __init__(self, master, on_success, db_ready=None):
+        # db_ready: Event set once the startup warm-up has finished; login waits for it
+        super().__init__(master); self.on_success = on_success; self.db_ready = db_ready; self.title("SED Login"); self.geometry("380x260"); self.resizable(False,False)
         ctk.set_appearance_mode("System"); ctk.set_default_color_theme("blue")
         ctk.CTkLabel(self, text="Log Masuk", font=ctk.CTkFont(size=20, weight="bold")).pack(pady=(16,8))
         frm = ctk.CTkFrame(self); frm.pack(fill="x", padx=16, pady=8)
         ctk.CTkLabel(frm, text="Username").grid(row=0,column=0,sticky="e",padx=6,pady=6); self.username = ctk.CTkEntry(frm); self.username.grid(row=0,column=1,sticky="ew",padx=6,pady=6); frm.grid_columnconfigure(1,weight=1)
         ctk.CTkLabel(frm, text="Password").grid(row=1,column=0,sticky="e",padx=6,pady=6); self.password = ctk.CTkEntry(frm, show="*"); self.password.grid(row=1,column=1,sticky="ew",padx=6,pady=6)
         self.msg = ctk.CTkLabel(self, text="", text_color="red"); self.msg.pack(pady=4)
-        btn = ctk.CTkButton(self, text="Masuk", command=self.try_login); btn.pack(pady=8)
+        self.btn = ctk.CTkButton(self, text="Masuk", command=self.try_login); self.btn.pack(pady=8)
         self.bind('<Return>', lambda e: self.try_login())
 
     def try_login(self):
-        user = login_user(self.username.get(), self.password.get())
+        if str(self.btn.cget("state")) == "disabled": return
+        self.btn.configure(state="disabled"); self.msg.configure(text="Menyemak...", text_color="gray")
+        get_worker().submit(self, self._login, self.username.get(), self.password.get(), on_done=self._login_done,
+                            on_error=lambda e: self._login_done(None))
+
+    def _login(self, username, password):
+        if self.db_ready is not None: self.db_ready.wait(POOL_CONFIG["timeout"] * 3)
+        return data_call("auth.login", username, password)
+
+    def _login_done(self, user):
+        self.btn.configure(state="normal"); self.msg.configure(text_color="red")
         if user: self.msg.configure(text="Berjaya"); self.after(200, lambda: (self.destroy(), self.on_success(user)))
         else: self.msg.configure(text="Username / Password salah.")
 
+class ReportPackWindow(ctk.CTkToplevel):
+    # Pick modules/formats, then export_report_pack on the DB worker behind a ProgressDialog
+    def __init__(self, master):
+        super().__init__(master); self.title("Pek Laporan"); self.resizable(False, False)
+        frm = ctk.CTkFrame(self); frm.pack(padx=10, pady=10, fill="both")
+        ctk.CTkLabel(frm, text="Modul").grid(row=0, column=0, sticky="w", padx=6, pady=(4,2))
+        self.modules = {k: tk.BooleanVar(value=True) for k in MODULE_SPECS}
+        for i, (k, var) in enumerate(self.modules.items(), 1):
+            ctk.CTkCheckBox(frm, text=MODULE_SPECS[k]["title"], variable=var).grid(row=i, column=0, sticky="w", padx=6, pady=2)
+        ctk.CTkLabel(frm, text="Format").grid(row=0, column=1, sticky="w", padx=12, pady=(4,2))
+        self.kinds = {k: tk.BooleanVar(value=k == "csv" or _reportlab() is not None or bool(SERVICE_CONFIG["url"])) for k in REPORT_PACK_KINDS}
+        for i, (k, var) in enumerate(self.kinds.items(), 1):
+            ctk.CTkCheckBox(frm, text=k.upper(), variable=var).grid(row=i, column=1, sticky="w", padx=12, pady=2)
+        ctk.CTkButton(self, text="Jana ZIP...", command=self.generate).pack(padx=10, pady=(0,10), fill="x")
+
+    def generate(self):
+        modules = [k for k, v in self.modules.items() if v.get()]; kinds = [k for k, v in self.kinds.items() if v.get()]
+        if not modules or not kinds: messagebox.showinfo("Pek Laporan", "Pilih sekurang-kurangnya satu modul dan satu format.", parent=self); return
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".zip", initialfile=f"laporan_{datetime.now():%Y%m}.zip", filetypes=[("ZIP","*.zip")])
+        if not path: return
+        dlg = ProgressDialog(self, "Pek Laporan")
+        def done(man):
+            dlg.destroy(); ok = [e for e in man["files"] if "error" not in e]
+            msg = f"{len(ok)} fail ({sum(e['rows'] for e in ok):,} baris) disimpan: {path}"
+            if man["errors"]: msg += "\n\nGagal:\n" + "\n".join(f"{e['file']}: {e['error']}" for e in man["files"] if "error" in e)
+            (messagebox.showwarning if man["errors"] else messagebox.showinfo)("Pek Laporan", msg, parent=self)
+        def failed(e):
+            dlg.destroy()
+            if isinstance(e, ExportCancelled): messagebox.showinfo("Pek Laporan", "Export dibatalkan.", parent=self)
+            else: messagebox.showerror("Pek Laporan", f"Gagal: {e}", parent=self)
+        get_worker().submit(dlg, export_report_pack, path, modules, kinds, progress=dlg.reporter(), cancel=dlg.cancel_event,
+                            on_done=done, on_error=failed)
+
+class DedupeReviewWindow(ctk.CTkToplevel):
+    # Merge queue from the PK/WM duplicate check: merge into either profile, or reject the pair
+    COLUMNS = [("score","Skor",60), ("keep_id","ID A",60), ("keep_nama","Nama A",180), ("keep_no_kp","No KP A",120), ("keep_unit","Unit A",90),
+               ("dup_id","ID B",60), ("dup_nama","Nama B",180), ("dup_no_kp","No KP B",120), ("dup_unit","Unit B",90), ("reason","Sebab",150)]
+
+    def __init__(self, master, user=None):
+        super().__init__(master); self.title("Semakan Pendua PK/WM"); self.geometry("1150x480")
+        self.user = user; self.api = MODULE_SPECS["profil"]["api"]
+        bar = ctk.CTkFrame(self); bar.pack(fill="x", padx=8, pady=(8,4))
+        for text, cmd in (("Gabung ke A", lambda: self.merge("keep_id")), ("Gabung ke B", lambda: self.merge("dup_id")),
+                          ("Bukan pendua", self.reject), ("Imbas semula", self.scan)):
+            ctk.CTkButton(bar, text=text, width=120, command=cmd).pack(side="left", padx=4)
+        self.status = ctk.CTkLabel(bar, text=""); self.status.pack(side="right", padx=8)
+        self.view = VirtualGrid(self, self.COLUMNS); self.view.pack(fill="both", expand=True, padx=8, pady=(0,8))
+        self.refresh()
+
+    def refresh(self):
+        def done(rows): self.view.set_rows(rows); self.status.configure(text=f"{len(rows):,} pasangan untuk disemak")
+        get_worker().submit(self, self.api["dedupe_queue"], on_done=done, key=("dedupe", id(self)),
+                            on_error=lambda e: messagebox.showerror("Pendua", f"Gagal: {e}", parent=self))
+
+    def _pair(self):
+        sel = self.view.selection()
+        if len(sel) != 1: messagebox.showinfo("Pendua", "Sila pilih satu pasangan", parent=self); return None
+        return self.view.row(sel[0])
+
+    def merge(self, side):
+        r = self._pair()
+        if r is None: return
+        other = "dup" if side == "keep_id" else "keep"
+        if not messagebox.askyesno("Gabung", f"Simpan {r[side[:-3] + '_nama']} (ID {r[side]}) dan padam {r[other + '_nama']} (ID {r[other + '_id']})?", parent=self): return
+        def done(res):
+            moved = sum(res["moved"].values())
+            self.status.configure(text=f"Digabung ke ID {res['keep_id']}" + (f", {moved} rekod dipindah" if moved else "")); self.refresh()
+        get_worker().submit(self, self.api["dedupe_merge"], r["id"], r[side], (self.user or {}).get("username"), on_done=done,
+                            on_error=lambda e: messagebox.showerror("Gabung", f"Gagal gabung: {e}", parent=self))
+
+    def reject(self):
+        r = self._pair()
+        if r is None: return
+        get_worker().submit(self, self.api["dedupe_reject"], r["id"], (self.user or {}).get("username"), on_done=lambda _: self.refresh(),
+                            on_error=lambda e: messagebox.showerror("Pendua", f"Gagal: {e}", parent=self))
+
+    def scan(self):
+        self.status.configure(text="Mengimbas...")
+        def done(r): self.status.configure(text=f"{r['profiles']:,} profil diimbas, {r['queued']:,} pasangan baru"); self.refresh()
+        get_worker().submit(self, self.api["dedupe_scan"], on_done=done,
+                            on_error=lambda e: messagebox.showerror("Pendua", f"Gagal imbas: {e}", parent=self))
+
 class MainApp(ctk.CTk):
     def __init__(self, user):
         super().__init__(); self.user=user; self.title("SED"); self.geometry("1100x700"); ctk.set_appearance_mode("System"); ctk.set_default_color_theme("blue")
@@ -599,6 +4406,8 @@ class MainApp(ctk.CTk):
             ctk.CTkButton(manage, text="Add User", command=self._add_user).pack(fill="x", pady=2)
             self.del_user = ctk.CTkEntry(manage, placeholder_text="username to delete"); self.del_user.pack(fill="x", pady=2)
             ctk.CTkButton(manage, text="Delete User", command=self._del_user).pack(fill="x", pady=2)
+            ctk.CTkButton(manage, text="Simpan Metrik", command=self._save_metrics).pack(fill="x", pady=(8,2))
+            ctk.CTkButton(manage, text="Semakan Pendua", command=lambda: DedupeReviewWindow(self, user)).pack(fill="x", pady=2)
 
         self.content = ctk.CTkFrame(self); self.content.pack(side='right', fill='both', expand=True)
 
@@ -609,31 +4418,59 @@ class MainApp(ctk.CTk):
         for key,spec in MODULE_SPECS.items():
             add_btn(spec['title'], lambda s=spec: self.build_crud_view(s))
 
-        add_btn("Rekod Profil", lambda: ReadOnlyList(self.content, list_profil_records, title="Rekod Profil", filters=[('unit','Unit'),('name','Nama')]))
+        add_btn("Papan Pemuka", lambda: DashboardFrame(self.content, can_rebuild=user.get("role") in ("host","admin")))
+        add_btn("Carta (Hierarki)", lambda: OrgChartFrame(self.content, MODULE_SPECS["carta"]["api"]))
+        add_btn("Rekod Profil", lambda: ReadOnlyList(self.content, lambda **kw: data_call("profil.records", **kw), title="Rekod Profil",
+                                                     filters=[('unit','Unit'),('name','Nama'),('status','Status',PROFIL_STATUSES),('masuk_from','Masuk dari'),('masuk_to','hingga')],
+                                                     page_fn=lambda **kw: data_call("profil.records_page", **kw), columns=PROFIL_RECORD_COLUMNS))
+        ctk.CTkButton(sidebar, text="Pek Laporan", command=lambda: ReportPackWindow(self)).pack(fill='x', padx=8, pady=4)
+
+        if get_replica():
+            self.replica_label = ctk.CTkLabel(sidebar, text="", anchor="w", font=ctk.CTkFont(size=11))
+            self.replica_label.pack(side="bottom", fill="x", padx=8, pady=6); self._replica_tick()
 
         buttons = [w for w in sidebar.winfo_children() if isinstance(w, ctk.CTkButton)]
         if buttons: buttons[0].invoke()
 
+    def _replica_tick(self):
+        r = get_replica(); oldest = min(r.synced_at.values(), default=None)
+        if r.last_error: text = "Luar talian" + (f" \u2014 data setakat {oldest:%d/%m %H:%M}" if oldest else "")
+        elif len(r.synced_at) < len(REPLICA_TABLES): text = "Replika: menyalin data awal..."
+        else: text = f"Replika dikemas kini {oldest:%H:%M:%S}"
+        self.replica_label.configure(text=text); self.after(5000, self._replica_tick)
+
     def _add_user(self):
         u = (self.new_user.get() or "").strip()
         p = (self.new_pw.get() or "").strip()
         r = (self.new_role.get() or "user").strip()
         if not u or not p: messagebox.showerror("Err","username/password required"); return
-        ok = create_user(u,p,r)
-        messagebox.showinfo("Create", "OK" if ok else "Failed or duplicate")
+        get_worker().submit(self, data_call, "users.create", u, p, r,
+                            on_done=lambda ok: messagebox.showinfo("Create", "OK" if ok else "Failed or duplicate"),
+                            on_error=lambda e: messagebox.showerror("Create", f"Failed: {e}"))
 
     def _del_user(self):
         target = (self.del_user.get() or "").strip()
         if not target: return
-        ok = delete_user(self.user.get("username"), target)
-        messagebox.showinfo("Delete", "OK" if ok else "Not allowed / not found")
+        get_worker().submit(self, data_call, "users.delete", self.user.get("username"), target,
+                            on_done=lambda ok: messagebox.showinfo("Delete", "OK" if ok else "Not allowed / not found"),
+                            on_error=lambda e: messagebox.showerror("Delete", f"Failed: {e}"))
+
+    def _save_metrics(self):
+        path = filedialog.asksaveasfilename(defaultextension=".prom", initialfile="sed_metrics.prom", filetypes=[("Prometheus text","*.prom"),("All","*.*")])
+        if not path: return
+        try: dump_metrics(path)
+        except OSError as e: messagebox.showerror("Metrik", f"Gagal simpan: {e}"); return
+        slowest = sorted(METRICS.snapshot().items(), key=lambda kv: kv[1]["p95_ms"], reverse=True)[:5]
+        summary = "\n".join(f"{k}: p95 {m['p95_ms']:.0f} ms, {m['calls']} panggilan" for k, m in slowest)
+        messagebox.showinfo("Metrik", f"Metrik disimpan ke {path}\n\n{summary}")
 
     def show(self, builder): 
         for w in self.content.winfo_children(): w.destroy()
         v = builder(); v.pack(fill='both', expand=True)
 
     def build_crud_view(self, spec):
-        def builder(): return CrudFrame(self.content, api=spec['api'], fields=spec['fields'], title=spec['title'], combos=spec.get('combos',{}), required=spec.get('required', set()))
+        def builder(): return CrudFrame(self.content, api=spec['api'], fields=spec['fields'], title=spec['title'], combos=spec.get('combos',{}), required=spec.get('required', set()),
+                                           bulk_fields=spec.get('bulk_fields'))
         return builder
 
 # ---------------- App entry ----------------
@@ -643,22 +4480,10 @@ def run():
     root = ctk.CTk()
     root.withdraw()
 
-    # Decide if setup is needed
-    need_setup = False
-    if not CONFIG_PATH.exists():
-        need_setup = True
-    else:
-        try:
-            conn = get_db_connection()
-            if not conn:
-                need_setup = True
-            else:
-                conn.close()
-        except Exception:
-            need_setup = True
+    timings = [("imports", time.perf_counter() - STARTUP_T0)]; t0 = time.perf_counter()
 
-    # Show setup
-    if need_setup:
+    # First run: nothing to connect to yet, so setup has to come first (the embedded backend needs none)
+    if not CONFIG_PATH.exists() and DB_CONFIG["backend"] != "sqlite":
         done = {"ok": False}
         def after_setup(): done["ok"] = True
         sw = SetupWindow(root, on_success=after_setup)
@@ -667,18 +4492,122 @@ def run():
             log.info("User cancelled setup. Exiting.")
             return
 
-    # Ensure schema (DB + tables + seed users)
-    try:
-        ensure_schema()
-    except Exception as e:
-        log.exception("Auto-init failed: %s", e)
-
     def on_success(user):
         app = MainApp(user); app.mainloop()
 
-    lw = LoginWindow(root, on_success)
-    root.deiconify()
+    # Show the login window straight away; connecting and the schema check run in the background
+    db_ready = threading.Event()
+    lw = LoginWindow(root, on_success, db_ready=db_ready)
+    root.deiconify(); root.update_idletasks()
+    timings.append(("login_shown", time.perf_counter() - t0))
+
+    def warm_up():
+        t0 = time.perf_counter(); steps = []
+        if start_replica(): steps.append(("replica_open", time.perf_counter() - t0))   # last snapshot, served before the server answers
+        if SERVICE_CONFIG["url"]:
+            # Client of a --serve instance: the service owns the schema, just check it is up
+            try: service_client().health(); ok = True
+            except Exception as e: log.error("Service %s unreachable: %s", SERVICE_CONFIG["url"], e); ok = None
+            finally: db_ready.set()
+            steps.append(("service_health", time.perf_counter() - t0))
+        else:
+            try:
+                ok = ensure_schema(prune=False, timings=steps)   # DB + tables + seed users, or one SELECT when current
+            except Exception as e:
+                log.exception("Auto-init failed: %s", e); ok = False   # offer SetupWindow; skip the prune below
+            finally:
+                db_ready.set()
+        if ok and not SERVICE_CONFIG["url"]:
+            try: _with_conn(prune_change_log)
+            except Exception as e: log.warning("change_log prune failed: %s", e)
+        log.info("Startup timing: %s | db warm-up %.0fms (%s)",
+                 ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in timings),
+                 (time.perf_counter() - t0) * 1000, ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in steps))
+        return ok
+
+    def warmed_up(ok):
+        if ok: return
+        if ok is None:
+            messagebox.showerror("SED", f"Tidak dapat sambung ke servis data {SERVICE_CONFIG['url']}.", parent=lw); return
+        # Saved settings no longer reach the server: offer setup, then warm up again
+        db_ready.clear()
+        sw = SetupWindow(root, on_success=lambda: get_worker().submit(lw, warm_up, on_done=warmed_up))
+        sw.transient(lw)
+
+    get_worker().submit(lw, warm_up, on_done=warmed_up)
+    start_metrics_dump()
     root.mainloop()
 
-if __name__ == "__main__":
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="SED Monolith v2")
+    ap.add_argument("--migrate", action="store_true", help="apply pending schema migrations and exit")
+    ap.add_argument("--check-indexes", action="store_true", help="EXPLAIN the list queries and report index usage")
+    ap.add_argument("--rebuild-dashboard", action="store_true", help="recount the dashboard summary table from carta/profil and exit")
+    ap.add_argument("--sync-replica", action="store_true", help="create or catch up the local replica file (replica.path) and exit")
+    ap.add_argument("--report-pack", metavar="ZIP", help="export modules as CSV/PDF into one ZIP with a manifest and exit; strftime codes allowed (laporan_%%Y%%m.zip)")
+    ap.add_argument("--modules", help="--report-pack: comma-separated module keys (default: all)")
+    ap.add_argument("--formats", default="csv,pdf", help="--report-pack: csv, pdf or csv,pdf (default)")
+    ap.add_argument("--dedupe", action="store_true", help="rescan PK/WM profiles for likely duplicates, queue them for review and exit")
+    ap.add_argument("--sqlite", metavar="PATH", help="use the embedded SQLite database at PATH instead of the configured backend")
+    ap.add_argument("--serve", action="store_true", help="run the headless HTTP/JSON data service instead of the GUI")
+    ap.add_argument("--host", help="--serve bind address (default: service.host in config.json)")
+    ap.add_argument("--port", type=int, help="--serve port (default: service.port in config.json)")
+    ap.add_argument("--metrics", metavar="PATH", help="write Prometheus metrics to PATH periodically and at exit (default: metrics.dump_path)")
+    ap.add_argument("--slow-ms", type=float, help="slow-query log threshold in ms (default: metrics.slow_ms in config.json)")
+    args = ap.parse_args(argv)
+    if args.sqlite:
+        DB_CONFIG.update(backend="sqlite", path=args.sqlite)
+    if args.metrics:
+        METRICS_CONFIG.update(dump_path=args.metrics, dump_interval=METRICS_CONFIG["dump_interval"] or 60.0)
+    if args.slow_ms is not None:
+        METRICS_CONFIG["slow_ms"] = max(0.0, args.slow_ms)
+    if args.serve:
+        return serve(args.host, args.port)
+    if args.sync_replica:
+        if not ensure_schema(): print("Could not connect to DB"); return 1
+        replica = start_replica(force=True)
+        if replica is None: print("Local replica unavailable (see log)"); return 1
+        out = replica.sync_all()
+        for t, info in replica.status()["tables"].items():
+            r = out.get(t) or {}
+            print(f"{t:<18} {info['rows']:>9,} rows  (+{r.get('upserts', 0):,} / -{r.get('deletes', 0):,})")
+        if replica.last_error: print(f"Sync failed: {replica.last_error}"); return 1
+        return 0
+    if args.report_pack:
+        if not SERVICE_CONFIG["url"] and not ensure_schema(): print("Could not connect to DB"); return 1
+        path = datetime.now().strftime(args.report_pack)
+        try:
+            man = export_report_pack(path, [k for k in (args.modules or "").split(",") if k] or None, [k for k in args.formats.split(",") if k],
+                                     progress=lambda done, total, text: print(f"[{done}/{total}] {text.rsplit('(', 1)[-1].rstrip(')')}", flush=True))
+        except ValueError as e:
+            print(e); return 2
+        for e in man["files"]:
+            print(f"{e['file']:<28} " + (f"FAILED: {e['error']}" if "error" in e else f"{e['rows']:>9,} rows {e['bytes'] / 1048576:>8.1f} MB {e['seconds']:>7.1f}s"))
+        print(f"{path}: {len(man['files']) - man['errors']} file(s), {man['errors']} error(s), {man['seconds']:.1f}s")
+        return 1 if man["errors"] else 0
+    if args.dedupe:
+        if not ensure_schema(): print("Could not connect to DB"); return 1
+        r = _with_conn(dedupe_scan)
+        print(f"{r['profiles']:,} profiles, {r['compared']:,} pairs compared ({r['skipped_blocks']} oversized blocks skipped), "
+              f"{r['found']:,} likely duplicates, {r['queued']:,} newly queued, {r['seconds']:.1f}s")
+        for q in _with_conn(dedupe_queue, "baru", 20):
+            print(f"  #{q['id']:<6} {q['score']:.2f}  {q['keep_id']} {q['keep_nama']} ({q['keep_no_kp']})  <->  {q['dup_id']} {q['dup_nama']} ({q['dup_no_kp']})")
+        return 0
+    if args.migrate or args.check_indexes or args.rebuild_dashboard:
+        ok = ensure_schema()
+        print(f"Schema version: {SCHEMA_VERSION}" if ok else "Could not connect to DB")
+        if ok and args.rebuild_dashboard:
+            r = rebuild_dashboard(); print(f"Dashboard rebuilt: {r['keys']} counts, {r['drifted']} corrected")
+        if ok and args.check_indexes:
+            results = _with_conn(check_query_plans)
+            for r in results:
+                print(f"{'OK  ' if r['ok'] else 'MISS'} {r['query']:<24} key={r['key']:<28} expected={r['expected']} type={r['type']} rows={r['rows']}")
+            ok = all(r["ok"] for r in results)
+        return 0 if ok else 1
     run()
+    return 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()   # PDF worker processes in the frozen (PyInstaller) build
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import SED_monolith_v2 as sed  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh SQLite database with the full schema; the shared pool and result cache start empty."""
+    monkeypatch.setitem(sed.DB_CONFIG, "backend", "sqlite")
+    monkeypatch.setitem(sed.DB_CONFIG, "path", str(tmp_path / "sed.db"))
+    monkeypatch.setitem(sed.SERVICE_CONFIG, "url", "")
+    sed.reset_pool(); sed.RESULT_CACHE.clear()
+    assert sed.ensure_schema()
+    yield tmp_path
+    sed.reset_pool(); sed.RESULT_CACHE.clear()
+
+
+@pytest.fixture
+def conn(db):
+    c = sed.get_db_connection()
+    yield c
+    c.close()
+
+
+def add_profil(conn, nama, no_kp, **data):
+    return sed.profil_create(conn, dict(data, nama=nama, no_kp=no_kp))
+
+
+def drift(conn):
+    # dashboard_counts kept by the write paths must match a full recount
+    return sed.dashboard_rebuild(conn)["drifted"]
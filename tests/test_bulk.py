@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import add_profil, drift, sed
+
+
+@pytest.fixture
+def profiles(conn):
+    return [add_profil(conn, f"Pegawai {i:02d}", f"9001{i:02d}-01-{i:04d}", unit=("Ops", "HQ", "Trafik")[i % 3],
+                       status="aktif" if i % 4 else "tidak_aktif", tarikh_masuk=f"2020-0{i % 9 + 1}-01") for i in range(30)]
+
+
+def test_profil_update_many_keeps_dashboard_counts(conn, profiles):
+    assert sed.profil_update_many(conn, profiles[:20], {"unit": "HQ", "status": "tidak_aktif", "tarikh_masuk": "01/06/2021"}) == 20
+    assert drift(conn) == 0
+    totals = sed.dashboard_summary(conn)["totals"]
+    assert (totals["profil"], totals["tidak_aktif"]) == (30, 20 + sum(1 for i in range(20, 30) if i % 4 == 0))
+    # Rows already holding the value still count as matched
+    assert sed.profil_update_many(conn, profiles[:5], {"unit": "HQ"}) == 5
+    assert drift(conn) == 0
+
+
+def test_profil_update_many_rejects_bad_status(conn, profiles):
+    with pytest.raises(ValueError):
+        sed.profil_update_many(conn, profiles, {"status": "bercuti"})
+
+
+def test_profil_delete_many_keeps_dashboard_counts(conn, profiles):
+    head = sed.changes_since(conn, "profil_pk_wm")["next_cursor"]
+    assert sed.profil_delete_many(conn, profiles[::2] + [10 ** 6]) == 15
+    assert drift(conn) == 0 and sed.dashboard_summary(conn)["totals"]["profil"] == 15
+    assert sorted(sed.changes_since(conn, "profil_pk_wm", head)["deletes"]) == sorted(profiles[::2])
+
+
+def test_carta_bulk_edit_and_delete(conn):
+    boss = sed.carta_create(conn, {"nama": "Ketua", "jawatan": "KPD", "unit": "HQ"})
+    staff = [sed.carta_create(conn, {"nama": f"Staf {i}", "jawatan": "ASP", "unit": "Ops", "supervisor_id": boss}) for i in range(6)]
+    under = sed.carta_create(conn, {"nama": "Bawahan", "jawatan": "SJN", "unit": "Ops", "supervisor_id": staff[0]})
+    assert sed.carta_update_many(conn, staff[:4], {"unit": "Trafik"}) == 4
+    assert drift(conn) == 0
+    with pytest.raises(ValueError):   # staff[0] would end up under its own subordinate
+        sed.carta_update_many(conn, staff[:2], {"supervisor_id": under})
+    assert sed.carta_delete_many(conn, staff[:3]) == 3
+    assert drift(conn) == 0
+    # The subordinate of a deleted record is detached, not deleted
+    assert len(sed.carta_ancestors(conn, under)) == 0 and sed.carta_subtree_size(conn, boss) == 3
@@ -0,0 +1,53 @@
+import json
+
+from conftest import add_profil, sed
+
+
+def test_config_sections_merge_and_coerce(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"pool": {"size": 0, "timeout": "2.5"}, "cache": {"ttl": "bukan nombor"},
+                                "service": {"url": "http://10.0.0.5:8765/", "token": None}}), encoding="utf-8")
+    monkeypatch.setattr(sed, "CONFIG_PATH", path)
+    assert sed.load_pool_config() == dict(sed.DEFAULT_POOL, size=1, timeout=2.5)
+    assert sed.load_cache_config() == sed.DEFAULT_CACHE   # one bad value keeps the section at its defaults
+    svc = sed.load_service_config()
+    assert svc["url"] == "http://10.0.0.5:8765" and svc["token"] == "" and svc["port"] == sed.DEFAULT_SERVICE["port"]
+    assert sed.load_replica_config() == sed.DEFAULT_REPLICA and sed.load_config()["backend"] == "mysql"
+
+
+def test_ttl_and_lru():
+    cache = sed.ResultCache(ttl=30, max_entries=2); loads = []
+    get = lambda k: cache.get_or_load("t", k, lambda: loads.append(k) or k)
+    get("a"); get("b"); get("a"); get("c"); get("b")
+    assert loads == ["a", "b", "c", "b"] and cache.stats["evictions"] == 2
+    off = sed.ResultCache(ttl=0)
+    off.get_or_load("t", "a", lambda: 1); assert off.snapshot()["entries"] == 0
+
+
+def test_a_load_racing_a_write_is_not_cached():
+    cache = sed.ResultCache()
+    def stale(): cache.invalidate("t"); return "old"
+    assert cache.get_or_load("t", "k", stale) == "old"
+    assert cache.get_or_load("t", "k", lambda: "new") == "new"
+
+
+def test_writes_through_the_api_invalidate_reads(db):
+    api = sed.api_profil()
+    assert len(api["list"]()) == 0
+    rec = api["create"]({"nama": "Ali bin Abu", "no_kp": "800101-01-0001"})
+    assert [r["id"] for r in api["list"]()] == [rec]
+    api["update"](rec, {"unit": "HQ"})
+    assert api["list"]()[0]["unit"] == "HQ" and api["page"]()["rows"][0]["unit"] == "HQ"
+    api["delete_many"]([rec])
+    assert len(api["list"]()) == 0 and len(api["search"]("Ali")) == 0
+
+
+def test_other_clients_writes_invalidate_on_change_poll(db):
+    api = sed.api_profil(); cursor = api["changes"]()["next_cursor"]
+    assert len(api["list"]()) == 0
+    conn = sed.get_db_connection()
+    try: add_profil(conn, "Ali bin Abu", "800101-01-0001")   # not through the API: the cache cannot know
+    finally: conn.close()
+    assert len(api["list"]()) == 0
+    api["changes"](cursor)
+    assert len(api["list"]()) == 1
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from conftest import drift, sed
+
+
+def _chain(conn, n):
+    # n records, each supervised by the previous one; returns their ids top first
+    ids, prev = [], None
+    for i in range(n):
+        prev = sed.carta_create(conn, {"nama": f"Aras {i}", "jawatan": "ASP", "unit": "Ops", "supervisor_id": prev}); ids.append(prev)
+    return ids
+
+
+def test_tree_queries(conn):
+    top, mid, low = _chain(conn, 3)
+    side = sed.carta_create(conn, {"nama": "Sisi", "jawatan": "SJN", "unit": "HQ", "supervisor_id": top})
+    assert [a["id"] for a in sed.carta_ancestors(conn, low)] == [mid, top]
+    assert sed.carta_subtree_size(conn, top) == 3
+    assert sorted(r["id"] for r in sed.carta_subtree(conn, top)) == sorted([top, mid, low, side])
+
+
+def test_reparent_under_own_subordinate_is_refused(conn):
+    top, mid, low = _chain(conn, 3)
+    assert sed.carta_would_cycle(conn, top, low) and sed.carta_would_cycle(conn, mid, mid)
+    assert not sed.carta_would_cycle(conn, low, top) and not sed.carta_would_cycle(conn, top, None)
+    with pytest.raises(ValueError):
+        sed.carta_update(conn, top, {"supervisor_id": low})
+    assert not conn.in_transaction and len(sed.carta_ancestors(conn, top)) == 0
+    with pytest.raises(ValueError):
+        sed.carta_update_many(conn, [top], {"supervisor_id": mid})
+    assert sed.carta_update(conn, low, {"supervisor_id": top}) and drift(conn) == 0
+
+
+def test_chain_past_max_depth_counts_as_a_cycle(conn, monkeypatch):
+    monkeypatch.setattr(sed, "CARTA_MAX_DEPTH", 5)
+    ids = _chain(conn, 8)
+    other = sed.carta_create(conn, {"nama": "Baru", "jawatan": "ASP", "unit": "Ops"})
+    assert sed.carta_would_cycle(conn, other, ids[-1])          # 7 levels above it: not proven to reach the top
+    assert not sed.carta_would_cycle(conn, other, ids[5])       # exactly CARTA_MAX_DEPTH levels
+    with pytest.raises(ValueError):
+        sed.carta_update(conn, other, {"supervisor_id": ids[-1]})
+    with pytest.raises(ValueError):
+        sed.carta_update_many(conn, [other], {"supervisor_id": ids[-1]})
+    assert sed.carta_update_many(conn, [other], {"supervisor_id": ids[2]}) == 1
+
+
+def test_concurrent_opposite_reparents_cannot_both_pass(db, monkeypatch):
+    conn = sed.get_db_connection()
+    try: a, b = [sed.carta_create(conn, {"nama": n, "jawatan": "ASP", "unit": "Ops"}) for n in "AB"]
+    finally: conn.close()
+    checked, release = threading.Event(), threading.Event(); walk = sed._carta_chain
+    def slow_walk(*args, **kwargs):
+        out = walk(*args, **kwargs)
+        if threading.current_thread().name == "first": checked.set(); release.wait(10)
+        return out
+    monkeypatch.setattr(sed, "_carta_chain", slow_walk)
+    results = {}
+    def reparent(rec, sup):
+        c = sed.get_db_connection()
+        try: results[rec] = sed.carta_update(c, rec, {"supervisor_id": sup})
+        except ValueError as e: results[rec] = e
+        finally: c.close()
+    first = threading.Thread(target=reparent, args=(a, b), name="first"); first.start()
+    assert checked.wait(10)
+    second = threading.Thread(target=reparent, args=(b, a), name="second"); second.start()
+    time.sleep(0.3); release.set(); first.join(10); second.join(10)
+    assert results[a] is True and isinstance(results[b], ValueError)
@@ -0,0 +1,37 @@
+from conftest import add_profil, sed
+
+
+def test_changes_since_reports_upserts_and_deletes(conn):
+    a = add_profil(conn, "Ali bin Abu", "800101-01-0001"); b = add_profil(conn, "Chong Wei", "800101-01-0002")
+    head = sed.changes_since(conn, "profil_pk_wm")
+    assert head["upserts"] == [] and head["deletes"] == [] and not head["reset"]
+    c = add_profil(conn, "Devi Raj", "800101-01-0003")
+    sed.profil_update(conn, a, {"unit": "HQ"}); sed.profil_delete(conn, b)
+    ch = sed.changes_since(conn, "profil_pk_wm", head["next_cursor"])
+    assert sorted(r["id"] for r in ch["upserts"]) == [a, c] and ch["deletes"] == [b]
+    assert {r["id"]: r["unit"] for r in ch["upserts"]}[a] == "HQ"
+    assert sed.changes_since(conn, "carta_organisasi", head["next_cursor"])["upserts"] == []
+    again = sed.changes_since(conn, "profil_pk_wm", ch["next_cursor"])
+    assert again["upserts"] == [] and again["deletes"] == [] and again["next_cursor"] == ch["next_cursor"]
+
+
+def test_changes_since_create_then_delete_is_a_delete(conn):
+    head = sed.changes_since(conn, "profil_pk_wm")["next_cursor"]
+    a = add_profil(conn, "Ali bin Abu", "800101-01-0001"); sed.profil_delete(conn, a)
+    ch = sed.changes_since(conn, "profil_pk_wm", head)
+    assert ch["upserts"] == [] and ch["deletes"] == [a]
+
+
+def test_changes_since_resets_when_too_far_behind(conn, monkeypatch):
+    head = sed.changes_since(conn, "profil_pk_wm")["next_cursor"]
+    monkeypatch.setattr(sed, "CHANGE_BATCH", 2)
+    for i in range(3): add_profil(conn, f"Pegawai {i}", f"800101-01-000{i}")
+    assert sed.changes_since(conn, "profil_pk_wm", head)["reset"]
+
+
+def test_changes_since_resets_when_the_cursor_was_pruned(conn):
+    head = sed.changes_since(conn, "profil_pk_wm")["next_cursor"]
+    for i in range(3): add_profil(conn, f"Pegawai {i}", f"800101-01-000{i}")
+    cur = conn.cursor(); cur.execute("DELETE FROM change_log"); conn.commit()
+    add_profil(conn, "Pegawai 9", "800101-01-0009")
+    assert sed.changes_since(conn, "profil_pk_wm", head)["reset"]
@@ -0,0 +1,40 @@
+from conftest import add_profil, drift, sed
+
+
+def _units(summary):
+    return {u["unit"]: (u["aktif"], u["tidak_aktif"]) for u in summary["profil_unit"]}
+
+
+def test_single_writes_keep_counts_in_step(conn):
+    a = add_profil(conn, "Ali bin Abu", "800101-01-0001", unit="Ops", tarikh_masuk="2020-01-15")
+    b = add_profil(conn, "Chong Wei", "800101-01-0002", unit="Ops", status="tidak_aktif")
+    c = add_profil(conn, "Devi Raj", "800101-01-0003", unit="HQ", tarikh_masuk="2020-01-31")
+    s = sed.dashboard_summary(conn)
+    assert _units(s) == {"Ops": (1, 1), "HQ": (1, 0)} and s["intake"][:1] == [{"bulan": "2020-01", "jumlah": 2}]
+    sed.profil_update(conn, a, {"unit": "HQ", "tarikh_masuk": "2021-02-01"})
+    sed.profil_update(conn, b, {"telefon": "013-1112222"})   # no counted column: no delta
+    sed.profil_delete(conn, c)
+    s = sed.dashboard_summary(conn)
+    assert _units(s) == {"Ops": (0, 1), "HQ": (1, 0)} and s["intake"] == [{"bulan": "2021-02", "jumlah": 1}, {"bulan": "", "jumlah": 1}]
+    assert s["totals"] == {"aktif": 1, "tidak_aktif": 1, "profil": 2, "carta": 0}
+    assert drift(conn) == 0
+
+
+def test_carta_and_bulk_writes_keep_counts_in_step(conn):
+    ids = [sed.carta_create(conn, {"nama": f"Pegawai {i}", "jawatan": "ASP", "unit": "Ops"}) for i in range(4)]
+    sed.carta_update(conn, ids[0], {"unit": "HQ"}); sed.carta_delete(conn, ids[1])
+    sed.carta_update_many(conn, ids[2:], {"unit": "Trafik"})
+    assert sed.dashboard_summary(conn)["carta_unit"] == [{"unit": "HQ", "jumlah": 1}, {"unit": "Trafik", "jumlah": 2}]
+    people = [add_profil(conn, f"Anggota {i}", f"800101-01-{i:04d}", unit="Ops") for i in range(5)]
+    sed.profil_update_many(conn, people[:3], {"status": "tidak_aktif"}); sed.profil_delete_many(conn, people[3:4])
+    s = sed.dashboard_summary(conn)
+    assert _units(s) == {"Ops": (1, 3)} and s["totals"]["carta"] == 3
+    assert drift(conn) == 0
+
+
+def test_rebuild_repairs_writes_made_outside_the_app(conn):
+    add_profil(conn, "Ali bin Abu", "800101-01-0001", unit="Ops")
+    cur = conn.cursor(); cur.execute("UPDATE profil_pk_wm SET unit='HQ'"); conn.commit()
+    assert _units(sed.dashboard_summary(conn)) == {"Ops": (1, 0)}
+    assert sed.dashboard_rebuild(conn) == {"keys": 2, "drifted": 2}
+    assert _units(sed.dashboard_summary(conn)) == {"HQ": (1, 0)} and drift(conn) == 0
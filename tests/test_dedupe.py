@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import add_profil, drift, sed
+
+
+def test_near_duplicates_are_queued_on_create(conn):
+    a = add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678", unit="Ops")
+    b = add_profil(conn, "Sitti Aminah Ahmad", "850101145678")
+    add_profil(conn, "Tan Ah Kow", "700202-10-1111")
+    queue = sed.dedupe_queue(conn)
+    assert [(p["keep_id"], p["dup_id"]) for p in queue] == [(a, b)]
+    assert queue[0]["score"] >= sed.DEDUPE_MIN_SCORE
+
+
+def test_scan_rebuilds_keys_without_requeueing(conn):
+    add_profil(conn, "Mohd Ali bin Ahmad", "800101-01-1111")
+    add_profil(conn, "Muhammad Ali Ahmad", "800101011111")
+    add_profil(conn, "Lim Mei Ling", "900303-07-2222")
+    assert len(sed.dedupe_queue(conn)) == 1
+    report = sed.dedupe_scan(conn)
+    assert (report["profiles"], report["found"], report["queued"]) == (3, 1, 0)
+
+
+def test_rejected_pair_stays_rejected(conn):
+    add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678")
+    add_profil(conn, "Sitti Aminah Ahmad", "850101145678")
+    pair = sed.dedupe_queue(conn)[0]["id"]
+    assert sed.dedupe_reject(conn, pair, user="alif")
+    assert not sed.dedupe_reject(conn, pair)
+    sed.dedupe_scan(conn)
+    assert len(sed.dedupe_queue(conn)) == 0 and len(sed.dedupe_queue(conn, status="ditolak")) == 1
+    with pytest.raises(ValueError):
+        sed.profil_merge(conn, pair)
+
+
+def test_merge_fills_blanks_and_moves_linked_records(conn):
+    keep = add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678", unit="Ops", tarikh_masuk="2015-03-01")
+    dup = add_profil(conn, "Sitti Aminah Ahmad", "850101145678", telefon="013-2223333", tarikh_masuk="2010-07-01")
+    ganjaran = sed._ENGINE_MODULES["ganjaran_pk_wm"]
+    sed.module_create(conn, ganjaran, {"no_kp": "850101145678", "nama": "Sitti Aminah Ahmad", "jenis_ganjaran": "Tunai"})
+    pair = sed.dedupe_queue(conn)[0]["id"]
+    head = sed.changes_since(conn, "profil_pk_wm")["next_cursor"]
+
+    result = sed.profil_merge(conn, pair, user="alif")
+    assert (result["keep_id"], result["dup_id"]) == (keep, dup)
+    assert result["filled"] == ["tarikh_masuk", "telefon"] and result["moved"] == {ganjaran["table"]: 1}
+    rows = sed.profil_list(conn)
+    assert len(rows) == 1 and rows[0]["telefon"] == "013-2223333" and str(rows[0]["tarikh_masuk"]) == "2010-07-01"
+    assert [r["no_kp"] for r in sed.module_list(conn, ganjaran)] == ["850101-14-5678"]
+    assert len(sed.dedupe_queue(conn)) == 0 and sed.dedupe_queue(conn, status="digabung")[0]["id"] == pair
+    ch = sed.changes_since(conn, "profil_pk_wm", head)
+    assert ch["deletes"] == [dup] and [r["id"] for r in ch["upserts"]] == [keep]
+    assert drift(conn) == 0
+    with pytest.raises(ValueError):
+        sed.profil_merge(conn, pair)
+
+
+def test_merge_keeps_the_chosen_profile(conn):
+    a = add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678")
+    b = add_profil(conn, "Sitti Aminah Ahmad", "850101145678", unit="HQ")
+    pair = sed.dedupe_queue(conn)[0]["id"]
+    with pytest.raises(ValueError):
+        sed.profil_merge(conn, pair, keep_id=10 ** 6)
+    assert sed.profil_merge(conn, pair, keep_id=b)["dup_id"] == a
+    assert [r["id"] for r in sed.profil_list(conn)] == [b]
+    assert drift(conn) == 0
+
+
+def _keys(conn, rec):
+    cur = conn.cursor(); cur.execute("SELECT COUNT(*) FROM profil_dedupe_keys WHERE profil_id=%s", (rec,))
+    return cur.fetchall()[0][0]
+
+
+def test_delete_drops_keys_and_pending_pairs(conn):
+    a = add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678")
+    b = add_profil(conn, "Sitti Aminah Ahmad", "850101145678")
+    assert len(sed.dedupe_queue(conn)) == 1 and _keys(conn, b) > 0
+    assert sed.profil_delete(conn, b)
+    assert len(sed.dedupe_queue(conn)) == 0 and _keys(conn, b) == 0 and _keys(conn, a) > 0
+    c = add_profil(conn, "Siti Aminah Ahmad", "850101 14 5678")
+    assert [(p["keep_id"], p["dup_id"]) for p in sed.dedupe_queue(conn)] == [(a, c)]
+
+
+def test_bulk_delete_drops_keys_and_pending_pairs_but_keeps_decisions(conn):
+    a = add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678")
+    b = add_profil(conn, "Sitti Aminah Ahmad", "850101145678")
+    rejected = sed.dedupe_queue(conn)[0]["id"]; sed.dedupe_reject(conn, rejected)
+    c = add_profil(conn, "Mohd Ali bin Ahmad", "800101-01-1111")
+    d = add_profil(conn, "Muhammad Ali Ahmad", "800101011111")
+    assert len(sed.dedupe_queue(conn)) == 1
+    assert sed.profil_delete_many(conn, [b, d]) == 2
+    assert len(sed.dedupe_queue(conn)) == 0 and _keys(conn, b) == _keys(conn, d) == 0
+    assert [p["id"] for p in sed.dedupe_queue(conn, status="ditolak")] == [rejected]
+    assert sed.dedupe_scan(conn)["queued"] == 0 and _keys(conn, a) > 0 and _keys(conn, c) > 0
@@ -0,0 +1,57 @@
+import csv
+
+import pytest
+
+from conftest import add_profil, drift, sed
+
+
+def _csv(path, rows, header=("nama", "no_kp", "unit", "status", "tarikh_masuk")):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f); w.writerow(header); w.writerows(rows)
+    return str(path)
+
+
+def test_import_counts_and_rejects(conn, db):
+    old = add_profil(conn, "Ali bin Abu", "800101-01-0001", unit="Ops")
+    path = _csv(db / "profil.csv", [
+        ("Ali bin Abu", "800101-01-0001", "HQ", "aktif", "2020-01-15"),     # updates the existing profile
+        ("Chong Wei", "800101-01-0002", "Ops", "", "15/01/2021"),
+        ("Devi Raj", "800101-01-0003", "Ops", "tidak aktif", ""),
+        ("", "800101-01-0004", "Ops", "", ""),                               # no nama
+        ("Eng Hock", "800101-01-0002", "Ops", "", ""),                       # no_kp repeated in the file
+        ("Farid", "800101-01-0005", "Ops", "bercuti", ""),                   # bad status
+        ("Gopal", "800101-01-0006", "Ops", "", "bukan tarikh"),              # bad date
+    ])
+    report = sed.profil_import_file(conn, path, batch_size=2)
+    assert (report["total"], report["inserted"], report["updated"]) == (7, 2, 1)
+    assert [r["baris"] for r in report["rejected"]] == [5, 6, 7, 8]
+    assert "nama" in report["rejected"][0]["sebab"] and "baris 3" in report["rejected"][1]["sebab"]
+    rows = {r["no_kp"]: r for r in sed.profil_list(conn)}
+    assert len(rows) == 3 and rows["800101-01-0001"]["id"] == old and rows["800101-01-0001"]["unit"] == "HQ"
+    assert rows["800101-01-0002"]["status"] == "aktif" and str(rows["800101-01-0002"]["tarikh_masuk"]) == "2021-01-15"
+    assert rows["800101-01-0003"]["status"] == "tidak_aktif"
+    assert drift(conn) == 0
+
+    out = sed.write_import_rejects(path, report["rejected"])
+    with open(out, newline="", encoding="utf-8-sig") as f:
+        assert [r["no_kp"] for r in csv.DictReader(f)] == ["800101-01-0004", "800101-01-0002", "800101-01-0005", "800101-01-0006"]
+
+
+def test_import_only_updates_columns_in_the_file(conn, db):
+    rec = add_profil(conn, "Ali bin Abu", "800101-01-0001", unit="Ops", telefon="012-3456789")
+    report = sed.profil_import_file(conn, _csv(db / "p.csv", [("Ali Abu", "800101-01-0001")], header=("nama", "no_kp")))
+    assert report["updated"] == 1
+    row = sed.profil_list(conn)[0]
+    assert (row["id"], row["nama"], row["unit"], row["telefon"]) == (rec, "Ali Abu", "Ops", "012-3456789")
+
+
+def test_import_without_required_column_is_refused(conn, db):
+    with pytest.raises(ValueError):
+        sed.profil_import_file(conn, _csv(db / "p.csv", [("Ali",)], header=("nama",)))
+
+
+def test_import_queues_near_duplicates(conn, db):
+    add_profil(conn, "Siti Aminah binti Ahmad", "850101-14-5678")
+    report = sed.profil_import_file(conn, _csv(db / "p.csv", [("Sitti Aminah Ahmad", "850101145678", "Ops", "", "")]))
+    assert report["inserted"] == 1 and report["duplicates"] == 1
+    assert len(sed.dedupe_queue(conn)) == 1
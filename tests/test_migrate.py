@@ -0,0 +1,66 @@
+import pytest
+
+from conftest import sed
+
+
+@pytest.fixture
+def blank(tmp_path, monkeypatch):
+    """A connection to an empty SQLite database (no schema yet)."""
+    monkeypatch.setitem(sed.DB_CONFIG, "backend", "sqlite")
+    monkeypatch.setitem(sed.DB_CONFIG, "path", str(tmp_path / "sed.db"))
+    sed.reset_pool(); sed.RESULT_CACHE.clear()
+    c = sed.get_db_connection()
+    yield c
+    c.close(); sed.reset_pool()
+
+
+def _schema(conn):
+    cur = conn.cursor(); cur.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%%' ORDER BY 1, 2")
+    objects = cur.fetchall(); columns = {}
+    for kind, name, _tbl in objects:
+        if kind == "table":
+            cur.execute("SELECT name FROM pragma_table_info(%s)", (name,)); columns[name] = sorted(r[0] for r in cur.fetchall())
+    return objects, columns
+
+
+def _fresh_schema(tmp_path, monkeypatch):
+    monkeypatch.setitem(sed.DB_CONFIG, "path", str(tmp_path / "fresh.db")); sed.reset_pool()
+    c = sed.get_db_connection()
+    try: sed.migrate(c); return _schema(c)
+    finally: c.close()
+
+
+@pytest.mark.parametrize("start", range(1, sed.SCHEMA_VERSION))
+def test_migrate_from_each_older_version(blank, start, tmp_path, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(sed, "MIGRATIONS", sed.MIGRATIONS[:start])
+        assert sed.migrate(blank) == start
+    assert not sed.schema_is_current(blank)
+    cur = blank.cursor()
+    cur.execute("INSERT INTO profil_pk_wm (nama, no_kp, unit, status) VALUES (%s,%s,%s,%s)", ("Ali bin Abu", "800101-01-0001", "Ops", "aktif"))
+    cur.execute("INSERT INTO profil_pk_wm (nama, no_kp, unit, status) VALUES (%s,%s,%s,%s)", ("Aly bin Abu", "800101010001", "Ops", "aktif"))
+    cur.execute("INSERT INTO carta_organisasi (nama, jawatan, unit) VALUES (%s,%s,%s)", ("Chong Wei", "ASP", "HQ")); blank.commit()
+
+    assert sed.migrate(blank) == sed.SCHEMA_VERSION and sed.schema_is_current(blank)
+    assert sed.migrate(blank) == sed.SCHEMA_VERSION   # nothing left to apply
+    if start < 8: assert sed.dashboard_rebuild(blank)["drifted"] == 0   # migration 8 counted the rows already there
+    else: sed.dashboard_rebuild(blank)                                   # raw inserts after it: the counts cannot know
+    totals = sed.dashboard_summary(blank)["totals"]
+    assert (totals["profil"], totals["aktif"], totals["carta"]) == (2, 2, 1)
+    assert len(sed.dedupe_queue(blank)) == 1
+    assert sed.profil_list(blank)[0]["updated_at"] is not None
+    upgraded = _schema(blank)
+    assert upgraded == _fresh_schema(tmp_path, monkeypatch)
+
+
+def test_schema_is_current_on_a_fresh_file(blank):
+    assert not sed.schema_is_current(blank)
+    assert sed.migrate(blank) == sed.SCHEMA_VERSION and sed.schema_is_current(blank)
+
+
+def test_query_plan_check_runs_on_sqlite(conn):
+    results = sed.check_query_plans(conn)
+    assert [r["query"] for r in results] == [name for name, sql, *_ in sed.PLAN_CHECKS if "MATCH(" not in sql]
+    assert all(r["key"] for r in results)
+    by_name = {r["query"]: r for r in results}
+    assert by_name["carta subordinates"]["ok"] and by_name["changes_since"]["ok"]
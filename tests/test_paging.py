@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import add_profil, sed
+
+
+def _walk(fetch, **kw):
+    ids, cursor = [], None
+    while True:
+        page = fetch(cursor=cursor, **kw)
+        ids += [r["id"] for r in page["rows"]]; cursor = page["next_cursor"]
+        if not cursor: return ids, page
+
+
+@pytest.fixture
+def profiles(conn):
+    return [add_profil(conn, f"Pegawai {i:02d}", f"9001{i:02d}-01-{i:04d}", unit="Ops" if i % 2 else "HQ",
+                       pangkat=None if i % 3 == 0 else f"P{i % 4}") for i in range(25)]
+
+
+def test_keyset_pages_cover_every_row_once(conn, profiles):
+    ids, page = _walk(lambda **kw: sed.profil_page(conn, **kw), limit=7, with_total=True)
+    assert ids == sorted(profiles, reverse=True) and page["total"] == 25
+
+
+@pytest.mark.parametrize("desc", [True, False])
+def test_keyset_pages_sorted_by_nullable_column(conn, profiles, desc):
+    ids, _ = _walk(lambda **kw: sed.profil_page(conn, **kw), order="pangkat", desc=desc, limit=5)
+    assert sorted(ids) == sorted(profiles)
+    rows = {r["id"]: r for r in sed.profil_list(conn)}
+    # NULLs first ascending and last descending, ties broken by id
+    key = lambda i: (rows[i]["pangkat"] is not None, rows[i]["pangkat"] or "", i)
+    assert ids == sorted(profiles, key=key, reverse=desc)
+
+
+def test_cursor_from_another_sort_order_is_refused(conn, profiles):
+    cursor = sed.profil_page(conn, order="nama", limit=5)["next_cursor"]
+    with pytest.raises(ValueError):
+        sed.profil_page(conn, cursor=cursor, order="unit")
+
+
+def test_carta_pages_and_bad_cursor(conn):
+    ids = [sed.carta_create(conn, {"nama": f"Staf {i}", "jawatan": "ASP", "unit": "Ops"}) for i in range(12)]
+    walked, page = _walk(lambda **kw: sed.carta_page(conn, **kw), limit=5, with_total=True)
+    assert walked == ids[::-1] and page["total"] == 12
+    with pytest.raises(ValueError):
+        sed.carta_page(conn, cursor="bukan-kursor")
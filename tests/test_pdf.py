@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from conftest import sed
+
+pytest.importorskip("reportlab")
+pypdf = pytest.importorskip("pypdf")
+
+
+@pytest.fixture
+def carta(conn):
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO carta_organisasi (nama, jawatan, unit) VALUES (%s,%s,%s)",
+                    [(f"Pegawai {i:03d}", "ASP", "Ops") for i in range(150)])
+    conn.commit()
+    return 150
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    # One core here: pretend to have two, and lower the thresholds so 150 rows take the parallel path
+    monkeypatch.setattr(sed.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(sed, "PDF_SAMPLE_ROWS", 20)
+    monkeypatch.setattr(sed, "PDF_ROWS_PER_PART", 50)
+    monkeypatch.setattr(sed, "PDF_PARALLEL_MIN", 10)
+
+
+def _files(d):
+    return sorted(p.name for p in d.iterdir() if not p.name.startswith("sed.db"))
+
+
+def _pages(path):
+    return [p.extract_text() for p in pypdf.PdfReader(str(path)).pages]
+
+
+def test_parallel_parts_merge_in_order(conn, carta, parallel, tmp_path, caplog):
+    out = tmp_path / "carta.pdf"
+    assert sed.carta_export_pdf(conn, str(out)) == carta and "2 worker(s)" in caplog.text
+    pages = _pages(out); n = len(pages)
+    assert n >= 3 and "Pegawai 149" in pages[0] and "Pegawai 000" in pages[-1]
+    assert all(f"Muka {k} / {n}" in text for k, text in enumerate(pages, 1))
+    assert _files(tmp_path) == ["carta.pdf"]
+
+
+def test_parallel_and_serial_render_the_same_pages(conn, carta, parallel, tmp_path, monkeypatch):
+    sed.carta_export_pdf(conn, str(tmp_path / "a.pdf"))
+    monkeypatch.setattr(sed, "PDF_PARALLEL_MIN", 10 ** 6)
+    sed.carta_export_pdf(conn, str(tmp_path / "b.pdf"))
+    strip = lambda pages: [t.split("Dijana:")[0] for t in pages]
+    assert strip(_pages(tmp_path / "a.pdf")) == strip(_pages(tmp_path / "b.pdf"))
+
+
+def test_cancel_leaves_no_files(conn, carta, parallel, tmp_path):
+    cancel = threading.Event(); cancel.set()
+    with pytest.raises(sed.ExportCancelled):
+        sed.carta_export_pdf(conn, str(tmp_path / "carta.pdf"), cancel=cancel)
+    assert _files(tmp_path) == []
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+from conftest import add_profil, sed
+
+
+@pytest.fixture
+def profiles(conn):
+    data = [("Ali bin Abu", "Ops", "aktif", "2020-01-15"), ("Aliya Zainal", "Ops", "tidak_aktif", "2021-03-01"),
+            ("Alias Omar", "HQ", "aktif", "2021-06-30"), ("Chong Wei", "Ops", "aktif", None), ("Devi Raj", "HQ", "tidak_aktif", "2019-12-31")]
+    return {n: add_profil(conn, n, f"800101-01-{i:04d}", unit=u, status=s, tarikh_masuk=d) for i, (n, u, s, d) in enumerate(data)}
+
+
+def _names(rows):
+    return sorted(r["nama"] for r in rows)
+
+
+def test_filters_combine(conn, profiles):
+    assert _names(sed.profil_records(conn, unit="Ops", name="Ali")) == ["Ali bin Abu", "Aliya Zainal"]
+    assert _names(sed.profil_records(conn, unit="Ops", name="Ali", status="aktif")) == ["Ali bin Abu"]
+    assert _names(sed.profil_records(conn, masuk_from="01/01/2021", masuk_to=date(2021, 6, 30))) == ["Alias Omar", "Aliya Zainal"]
+    assert _names(sed.profil_records(conn, status="tidak_aktif", masuk_to="2020-12-31")) == ["Devi Raj"]
+
+
+def test_filtered_pages_match_records(conn, profiles):
+    ids, cursor = [], None
+    while True:
+        page = sed.profil_page(conn, unit="Ops", limit=2, cursor=cursor, with_total=True)
+        ids += [r["id"] for r in page["rows"]]; cursor = page["next_cursor"]
+        if not cursor: break
+    assert ids == [r["id"] for r in sed.profil_records(conn, unit="Ops")] and page["total"] == 3
+
+
+def test_name_wildcards_are_literal_and_bad_input_refused(conn, profiles):
+    assert _names(sed.profil_records(conn, name="%Wei")) == []
+    assert _names(sed.profil_records(conn, name="_hong")) == []
+    with pytest.raises(ValueError):
+        sed.profil_records(conn, status="bercuti")
+    with pytest.raises(ValueError):
+        sed.profil_records(conn, masuk_from="2021-01-01", masuk_to="2020-01-01")
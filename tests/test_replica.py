@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from conftest import add_profil, sed
+
+
+@pytest.fixture
+def replica(db, monkeypatch):
+    rep = sed.LocalReplica(str(db / "replica.db"), interval=3600)
+    monkeypatch.setattr(sed, "_REPLICA", rep)
+    yield rep
+    rep.close()
+
+
+def _local_ids(rep):
+    return sorted(r["id"] for r in rep.run(sed.profil_list))
+
+
+def test_sync_pulls_upserts_and_deletes(conn, replica):
+    a = add_profil(conn, "Ali bin Abu", "800101-01-0001"); b = add_profil(conn, "Chong Wei", "800101-01-0002")
+    assert replica.sync_table("profil_pk_wm") == {"upserts": 2, "deletes": 0} and _local_ids(replica) == [a, b]
+    sed.profil_update(conn, a, {"unit": "HQ"}); sed.profil_delete(conn, b)
+    assert replica.sync_table("profil_pk_wm") == {"upserts": 1, "deletes": 1}
+    assert [(r["id"], r["unit"]) for r in replica.run(sed.profil_list)] == [(a, "HQ")]
+    assert replica.sync_table("profil_pk_wm") == {"upserts": 0, "deletes": 0}
+
+
+def test_pruned_change_log_falls_back_to_comparing_ids(conn, replica):
+    a = add_profil(conn, "Ali bin Abu", "800101-01-0001"); b = add_profil(conn, "Chong Wei", "800101-01-0002")
+    replica.sync_table("profil_pk_wm")
+    sed.profil_delete(conn, a); sed.prune_change_log(conn, days=-1)
+    c = add_profil(conn, "Devi Raj", "800101-01-0003")
+    assert replica.sync_table("profil_pk_wm") == {"upserts": 1, "deletes": 1} and _local_ids(replica) == [b, c]
+
+
+def test_reads_come_from_the_replica_once_synced(db, replica):
+    api = sed.api_profil(); conn = sed.get_db_connection()
+    try: add_profil(conn, "Ali bin Abu", "800101-01-0001")   # not through the API: no reconcile
+    finally: conn.close()
+    assert len(api["list"]()) == 1                              # never synced: read from the server
+    replica.sync_all(); sed.RESULT_CACHE.clear()
+    conn = sed.get_db_connection()
+    try: add_profil(conn, "Chong Wei", "800101-01-0002")
+    finally: conn.close()
+    assert len(api["list"]()) == 1                              # served by the replica, which has not pulled it yet
+    rec = api["create"]({"nama": "Devi Raj", "no_kp": "800101-01-0003"})
+    assert rec in [r["id"] for r in api["list"]()] and len(api["list"]()) == 3
+
+
+def test_a_write_during_a_sync_is_read_back(db, replica, monkeypatch):
+    replica.sync_all(); api = sed.api_profil()
+    pulled, release = threading.Event(), threading.Event(); pull = replica._pull_rows
+    def slow_pull(*args):
+        n = pull(*args)
+        if threading.current_thread().name == "sync" and not pulled.is_set(): pulled.set(); release.wait(10)
+        return n
+    monkeypatch.setattr(replica, "_pull_rows", slow_pull)
+    sync = threading.Thread(target=replica.sync_table, args=("profil_pk_wm",), name="sync"); sync.start()
+    assert pulled.wait(10)                                      # the first pass has read the server; the lock is held
+    rec = api["create"]({"nama": "Ali bin Abu", "no_kp": "800101-01-0001"})
+    assert [r["id"] for r in api["list"]()] == [rec]            # read from the server until the replica has it
+    assert not replica.serves("profil_pk_wm", sed.profil_list)
+    release.set(); sync.join(10)
+    assert replica.serves("profil_pk_wm", sed.profil_list) and _local_ids(replica) == [rec]
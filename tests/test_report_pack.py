@@ -0,0 +1,53 @@
+import hashlib
+import json
+import threading
+import zipfile
+
+import pytest
+
+from conftest import add_profil, sed
+
+
+@pytest.fixture
+def data(conn):
+    for i in range(3): add_profil(conn, f"Anggota {i}", f"800101-01-{i:04d}", unit="Ops")
+    sed.carta_create(conn, {"nama": "Chong Wei", "jawatan": "ASP", "unit": "HQ"})
+
+
+def test_manifest_lists_every_file(db, data):
+    path = db / "pek.zip"
+    manifest = sed.export_report_pack(str(path), ["carta", "profil", "bkl"], kinds=("csv",), workers=2)
+    assert [(e["file"], e["rows"]) for e in manifest["files"]] == [("carta.csv", 1), ("profil.csv", 3), ("bkl.csv", 0)]
+    assert manifest["errors"] == 0 and manifest["schema_version"] == sed.SCHEMA_VERSION
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == ["bkl.csv", "carta.csv", "manifest.json", "profil.csv"]
+        assert json.loads(zf.read("manifest.json"))["files"] == manifest["files"]
+        for e in manifest["files"]:
+            body = zf.read(e["file"])
+            assert len(body) == e["bytes"] and hashlib.sha256(body).hexdigest() == e["sha256"]
+    assert not (db / "pek.zip.part").exists()
+
+
+def test_a_failed_export_is_recorded_not_fatal(db, data, monkeypatch):
+    def broken(*a, **kw): raise RuntimeError("cakera penuh")
+    monkeypatch.setitem(sed.MODULE_SPECS["profil"]["api"], "export_csv", broken)
+    manifest = sed.export_report_pack(str(db / "pek.zip"), ["carta", "profil"], kinds=("csv",))
+    assert manifest["errors"] == 1 and manifest["files"][1] == {"module": "profil", "title": "Profil PK/WM", "kind": "csv",
+                                                                 "file": "profil.csv", "error": "cakera penuh"}
+    with zipfile.ZipFile(db / "pek.zip") as zf:
+        assert sorted(zf.namelist()) == ["carta.csv", "manifest.json"]
+
+
+def test_cancel_discards_the_archive(db, data):
+    cancel = threading.Event()
+    with pytest.raises(sed.ExportCancelled):
+        sed.export_report_pack(str(db / "pek.zip"), kinds=("csv",), workers=1, cancel=cancel, progress=lambda *a: cancel.set())
+    assert not (db / "pek.zip").exists() and not (db / "pek.zip.part").exists()
+
+
+def test_unknown_module_or_kind_is_refused(db):
+    with pytest.raises(ValueError):
+        sed.export_report_pack(str(db / "pek.zip"), ["tiada"])
+    with pytest.raises(ValueError):
+        sed.export_report_pack(str(db / "pek.zip"), kinds=("xlsx",))
+    assert not (db / "pek.zip").exists()
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import add_profil, sed
+
+
+@pytest.fixture
+def profiles(conn):
+    names = ["Mohd Ali bin Ahmad", "Ahmad Ismail", "Ismail bin Ahmad", "Ahmad Zaki", "Khalid Zain", "Alia Ismail"]
+    return {n: add_profil(conn, n, f"8001{i:02d}-01-{i:04d}", unit="Ops") for i, n in enumerate(names)}
+
+
+def _names(rows):
+    return sorted(r["nama"] for r in rows)
+
+
+def test_every_word_must_start_a_word(conn, profiles):
+    assert _names(sed.profil_search(conn, "Ali")) == ["Alia Ismail", "Mohd Ali bin Ahmad"]
+    assert _names(sed.profil_search(conn, "ahmad ismail")) == ["Ahmad Ismail", "Ismail bin Ahmad"]
+    assert _names(sed.profil_search(conn, "Ismail Ali")) == ["Alia Ismail"]
+    assert _names(sed.profil_search(conn, "hmad")) == []
+    assert _names(sed.profil_search(conn, "800103")) == ["Ahmad Zaki"]
+
+
+def test_fulltext_and_like_paths_use_the_same_words():
+    sql, params = sed._search_sql("t", ("a", "b"), "Ahmad Ismail", fulltext=True)
+    assert "MATCH(a,b)" in sql and params == ["+Ahmad* +Ismail*"] * 2
+    sql, params = sed._search_sql("t", ("a", "b"), "Bo Ismail", fulltext=True)   # "Bo" is below FT_MIN_TOKEN
+    assert sql.count(" AND ") == 1 and params == ["Bo%", "% Bo%"] * 2 + ["Ismail%", "% Ismail%"] * 2
+
+
+def test_search_results_page_past_the_limit(conn):
+    ids = [add_profil(conn, f"Pegawai {i:02d} bin Abu", f"9001{i:02d}-01-{i:04d}") for i in range(12)]
+    add_profil(conn, "Chong Wei", "700101-01-0001")
+    seen, cursor = [], None
+    while True:
+        page = sed.profil_page(conn, query="bin", limit=5, cursor=cursor, with_total=True)
+        seen += [r["id"] for r in page["rows"]]; cursor = page["next_cursor"]
+        if not cursor: break
+    assert seen == ids[::-1] and page["total"] == 12
+    named = sed.profil_page(conn, query="abu", order="nama", desc=False, limit=100)["rows"]
+    assert [r["id"] for r in named] == ids
+
+
+def test_carta_and_module_pages_filter_by_query(conn):
+    sed.carta_create(conn, {"nama": "Mohd Ali", "jawatan": "ASP", "unit": "Ops"})
+    sed.carta_create(conn, {"nama": "Chong Wei", "jawatan": "KPD", "unit": "HQ"})
+    assert _names(sed.carta_page(conn, query="ali")["rows"]) == ["Mohd Ali"]
+    jurnal = sed._ENGINE_MODULES["jurnal_sed"]
+    sed.module_create(conn, jurnal, {"tarikh": "2024-01-02", "tajuk": "Rondaan malam"})
+    sed.module_create(conn, jurnal, {"tarikh": "2024-01-03", "tajuk": "Mesyuarat unit"})
+    assert [r["tajuk"] for r in sed.module_page(conn, jurnal, query="ronda")["rows"]] == ["Rondaan malam"]
+    assert len(sed.module_page(conn, jurnal)["rows"]) == 2
+
+
+def test_api_search_goes_through_the_cache(db, profiles):
+    api = sed.api_profil()
+    assert _names(api["search"]("Ali")) == ["Alia Ismail", "Mohd Ali bin Ahmad"]
+    assert _names(api["page"](query="zain")["rows"]) == ["Khalid Zain"]
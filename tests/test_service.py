@@ -0,0 +1,76 @@
+import asyncio
+import json
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import sed
+
+
+@pytest.fixture
+def service(db):
+    """DataService on an ephemeral loopback port, run on its own event loop thread."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True); thread.start()
+    svc = asyncio.run_coroutine_threadsafe(sed.DataService("127.0.0.1", 0).start(), loop).result(10)
+    yield sed.ServiceClient(f"http://127.0.0.1:{svc.port}", timeout=10)
+
+    async def stop():
+        # Keep-alive connections still wait on their next request; end them before the loop goes
+        await svc.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks: t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop); thread.join(10); loop.close()
+
+
+def test_round_trip(service):
+    assert service.health()["ok"]
+    a = service.call("profil.create", {"nama": "Mohd Ali bin Ahmad", "no_kp": "800101-01-1111", "unit": "Ops"})
+    b = service.call("profil.create", {"nama": "Chong Wei", "no_kp": "800101-01-2222", "unit": "HQ"})
+    page = service.call("profil.page", limit=1, with_total=True)
+    assert isinstance(page["rows"], sed.ResultSet) and page["total"] == 2
+    assert [r["id"] for r in page["rows"]] == [b]
+    assert [r["id"] for r in service.call("profil.page", cursor=page["next_cursor"], limit=1)["rows"]] == [a]
+    assert [r["nama"] for r in service.call("profil.search", "Ali")] == ["Mohd Ali bin Ahmad"]
+    assert service.call("profil.update_many", [a, b], {"status": "tidak_aktif"}) == 2
+    assert service.call("dashboard.summary")["totals"]["tidak_aktif"] == 2
+    assert service.call("dashboard.rebuild")["drifted"] == 0
+
+
+def test_typed_values_keep_their_type(service):
+    rec = service.call("profil.create", {"nama": "Siti Aminah", "no_kp": "850101-14-5678", "tarikh_masuk": date(2010, 7, 1)})
+    remote = service.call("profil.list")[0]; local = sed.local_calls()["profil.list"]()[0]
+    assert remote["id"] == rec and remote["tarikh_masuk"] == date(2010, 7, 1) and isinstance(remote["created_at"], datetime)
+    assert dict(remote) == dict(local)
+    assert service.call("profil.records", masuk_from=date(2010, 1, 1))[0]["id"] == rec
+
+
+def test_wire_codec():
+    value = {"d": date(2024, 2, 29), "t": datetime(2024, 2, 29, 8, 30, 0, 250000), "n": Decimal("12.50"),
+             "rows": sed.ResultSet(["id", "tarikh"], [(1, date(2024, 1, 2))]), "plain": {"__date__": "x", "other": 1}}
+    back = json.loads(json.dumps(value, default=sed._json_default), object_hook=sed._json_hook)
+    assert back["d"] == value["d"] and back["t"] == value["t"] and back["n"] == Decimal("12.50")
+    assert back["rows"][0]["tarikh"] == date(2024, 1, 2) and back["plain"] == {"__date__": "x", "other": 1}
+
+
+def test_errors_come_back_as_the_same_type(service):
+    with pytest.raises(ValueError):
+        service.call("profil.update_many", [1], {"status": "bercuti"})
+
+
+def test_admin_calls_need_a_login_session(service):
+    with pytest.raises(PermissionError):
+        service.call("users.create", "baru", "baru123")
+    assert service.call("auth.login", "alif", "alif123")["role"] == "host" and service.session
+    assert service.call("users.create", "baru", "baru123")
+    assert service.call("users.delete", "admin", "baru")   # requestor is the session user, whatever is sent
+    assert not service.call("users.delete", "admin", "alif")
+
+
+def test_refuses_open_bind_without_token(db):
+    with pytest.raises(PermissionError):
+        asyncio.run(sed.DataService("0.0.0.0", 0).start())
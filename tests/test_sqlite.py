@@ -0,0 +1,48 @@
+from datetime import date, datetime
+
+from conftest import add_profil, sed
+
+
+def test_mysql_ddl_is_translated():
+    stmts = sed.SQLITE.ddl("""
+        CREATE TABLE IF NOT EXISTS t (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            nama VARCHAR(120) NOT NULL,
+            status ENUM('aktif','tidak_aktif') DEFAULT 'aktif',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_nama (nama(20)),
+            FULLTEXT INDEX ft_nama (nama)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    assert "INTEGER PRIMARY KEY AUTOINCREMENT" in stmts[0] and "ENUM" not in stmts[0] and "ENGINE" not in stmts[0]
+    assert "VARCHAR(120) COLLATE NOCASE" in stmts[0]
+    assert "CREATE INDEX IF NOT EXISTS t__idx_nama ON t (nama)" in stmts
+    assert not any("ft_nama" in s for s in stmts) and any("trg_t_updated_at_touch" in s for s in stmts)
+
+
+def test_placeholders_and_percent_escapes():
+    assert sed._qmark("SELECT * FROM t WHERE a=%s AND b LIKE 'x%%'") == "SELECT * FROM t WHERE a=? AND b LIKE 'x%'"
+
+
+def test_typed_columns_and_case_insensitive_match(conn):
+    rec = add_profil(conn, "Ali bin Abu", "800101-01-0001", tarikh_masuk=date(2020, 1, 15))
+    row = sed.profil_list(conn)[0]
+    assert row["tarikh_masuk"] == date(2020, 1, 15) and isinstance(row["created_at"], datetime)
+    cur = conn.cursor(); cur.execute("SELECT id FROM profil_pk_wm WHERE nama=%s", ("ALI BIN ABU",))
+    assert cur.fetchall() == [(rec,)]
+
+
+def test_upsert_and_touch_trigger(conn):
+    sql = sed.SQLITE.upsert_sql("profil_pk_wm", ["nama", "no_kp"], ["nama"], "no_kp")
+    cur = conn.cursor()
+    cur.execute(sql, ("Ali", "800101-01-0001"))
+    cur.execute("SELECT updated_at FROM profil_pk_wm"); before = cur.fetchall()[0][0]
+    cur.execute(sql, ("Ali bin Abu", "800101-01-0001"))
+    cur.execute("SELECT nama, updated_at FROM profil_pk_wm")
+    rows = cur.fetchall()
+    assert len(rows) == 1 and rows[0][0] == "Ali bin Abu" and rows[0][1] >= before
+
+
+def test_schema_is_current_after_ensure_schema(conn):
+    assert sed.schema_is_current(conn)
+    assert sed.dialect_of(conn) is sed.SQLITE